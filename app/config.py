@@ -19,6 +19,7 @@ class SettingsEnv(BaseSettings):
 
     # 外部APIキー
     deepseek_api_key: str
+    gemini_api_key: str = ""
     hatena_consumer_key: str
     hatena_consumer_secret: str
     hatena_access_token: str
@@ -42,6 +43,13 @@ class SettingsAi(BaseSettings):
     model: str = "deepseek-chat"
     temperature: float = 1.3
     max_len_content: int = 1500
+    chunk_token_budget: int = 120_000
+    max_concurrency: int = 4
+    max_fee_usd: float | None = None
+    fallback_models: list[str] = []
+    hedge_after_sec: float | None = None
+    request_timeout_sec: float | None = 300
+    retries_per_model: int = 1
 
     @classmethod
     @lru_cache()
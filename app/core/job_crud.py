@@ -0,0 +1,94 @@
+import logging
+from datetime import timedelta
+from typing import Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from app.models.jobs import FAILED, QUEUED, RUNNING, SUCCEEDED, Job
+from app.models.users import utc_now
+
+logger = logging.getLogger(__name__)
+
+# 一括更新はDB側の条件だけで判定する（セッション内のオブジェクトとは比較しない）
+NO_SYNC = {"synchronize_session": False}
+
+
+def create_job(db: Session, job_id: str, upload_dir: str, preset_categories: list[str], fresh: bool) -> Job:
+    """ジョブをキューに追加"""
+    job = Job(id=job_id, upload_dir=upload_dir, preset_categories=preset_categories, fresh=fresh)
+    db.add(job)
+    db.commit()
+    return job
+
+
+def get_job(job_id: str, db: Session) -> Optional[Job]:
+    """IDでジョブ取得"""
+    return db.get(Job, job_id)
+
+
+def requeue_stale_jobs(db: Session, lease_seconds: float, max_attempts: int) -> None:
+    """locked_atが期限切れの実行中ジョブ（ワーカーの停止・再起動）をキューに戻す。試行回数を超えたものは失敗にする"""
+    expired = Job.status == RUNNING, Job.locked_at < utc_now() - timedelta(seconds=lease_seconds)
+    failed = db.execute(
+        update(Job)
+        .where(*expired, Job.attempts >= max_attempts)
+        .values(status=FAILED, error="ワーカーが応答しなくなったため中止しました。", finished_at=utc_now()),
+        execution_options=NO_SYNC,
+    ).rowcount
+    requeued = db.execute(
+        update(Job).where(*expired).values(status=QUEUED, locked_by=None), execution_options=NO_SYNC
+    ).rowcount
+    db.commit()
+    if failed or requeued:
+        logger.warning(f"期限切れの実行中ジョブ: 再実行{requeued}件、失敗{failed}件")
+
+
+def claim_next_job(db: Session, worker_id: str, lease_seconds: float, max_attempts: int) -> Optional[Job]:
+    """最も古い待機中のジョブを実行中にして返す
+
+    ほかのワーカーと取り合いになっても、status=queuedを条件にした更新が1件だけ成功するため二重に実行されない
+    """
+    requeue_stale_jobs(db, lease_seconds, max_attempts)
+    candidates = db.scalars(select(Job.id).where(Job.status == QUEUED).order_by(Job.created_at).limit(5)).all()
+    for job_id in candidates:
+        claimed = db.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.status == QUEUED)
+            .values(status=RUNNING, locked_by=worker_id, locked_at=utc_now(), attempts=Job.attempts + 1),
+            execution_options=NO_SYNC,
+        ).rowcount
+        db.commit()
+        if claimed:
+            return db.get(Job, job_id, populate_existing=True)
+    return None
+
+
+def heartbeat(db: Session, job_id: str, worker_id: str) -> bool:
+    """実行中であることを記録（locked_atの更新）。リースを失っていた（ほかのワーカーに移った）場合はFalse"""
+    updated = db.execute(
+        update(Job).where(Job.id == job_id, Job.locked_by == worker_id).values(locked_at=utc_now()),
+        execution_options=NO_SYNC,
+    ).rowcount
+    db.commit()
+    return bool(updated)
+
+
+def finish_job(db: Session, job_id: str, worker_id: str, result: dict) -> None:
+    db.execute(
+        update(Job)
+        .where(Job.id == job_id, Job.locked_by == worker_id)
+        .values(status=SUCCEEDED, result=result, error=None, locked_by=None, finished_at=utc_now()),
+        execution_options=NO_SYNC,
+    )
+    db.commit()
+
+
+def fail_job(db: Session, job_id: str, worker_id: str, error: str, retry: bool) -> None:
+    """retry=Trueの場合はキューに戻し、Falseの場合は失敗として終了"""
+    values = {"status": QUEUED} if retry else {"status": FAILED, "finished_at": utc_now()}
+    db.execute(
+        update(Job).where(Job.id == job_id, Job.locked_by == worker_id).values(**values, error=error, locked_by=None),
+        execution_options=NO_SYNC,
+    )
+    db.commit()
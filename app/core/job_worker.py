@@ -0,0 +1,158 @@
+import asyncio
+import logging
+import os
+import shutil
+import socket
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+
+from fastapi.encoders import jsonable_encoder
+
+from app.core import job_crud
+from app.core.pipeline import config_dict, summarize_and_post
+from app.database import SessionLocal
+from app.models.jobs import Job
+
+logger = logging.getLogger(__name__)
+
+jobs_config = config_dict.get("jobs") or {}
+UPLOAD_DIR = Path(jobs_config.get("upload_dir", "outputs/jobs"))
+
+
+async def run_upload_job(job: Job) -> dict:
+    """保存済みのアップロードファイルで要約・投稿を行う"""
+    paths = sorted(Path(job.upload_dir).glob("*/*"))
+    return await summarize_and_post(paths, job.preset_categories, job.fresh)
+
+
+class JobWorkerPool:
+    """jobsテーブルから待機中のジョブを取り出し、最大concurrency件まで並行して実行する
+
+    DB操作は同期セッションのためスレッドで実行する。同じプロセスでジョブが追加された場合はnotify()ですぐに起こし、
+    ほかのプロセスで追加されたジョブはpoll_intervalごとの確認で拾う
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable,
+        run_job: Callable[[Job], Awaitable[dict]] = run_upload_job,
+        concurrency: int = 2,
+        poll_interval: float = 2.0,
+        lease_seconds: float = 600,
+        max_attempts: int = 3,
+    ):
+        self.session_factory = session_factory
+        self.run_job = run_job
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._wakeup = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+
+    def _call(self, fn, *args):
+        with self.session_factory() as db:
+            return fn(db, *args)
+
+    async def _db(self, fn, *args):
+        return await asyncio.to_thread(self._call, fn, *args)
+
+    def notify(self) -> None:
+        self._wakeup.set()
+
+    def start(self) -> None:
+        base_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._tasks = [asyncio.create_task(self._run(f"{base_id}:{n}")) for n in range(self.concurrency)]
+        logger.info(f"ジョブワーカーを{self.concurrency}個起動しました。")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _run(self, worker_id: str) -> None:
+        while True:
+            try:
+                job = await self._db(job_crud.claim_next_job, worker_id, self.lease_seconds, self.max_attempts)
+            except Exception:
+                logger.exception("ジョブの取得中にエラーが発生しました。")
+                job = None
+
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except TimeoutError:
+                    pass
+                continue
+
+            await self._execute(job, worker_id)
+
+    async def _heartbeat(self, job: Job, worker_id: str, task: asyncio.Task) -> None:
+        """リースを延長し続ける。延長できなくなった場合はtask（ジョブの実行）をキャンセルして終わる
+
+        DBの更新の失敗は1回までは次の周期で再試行する（続けて失敗するとリースが切れるため中断）
+        """
+        failures = 0
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                held = await self._db(job_crud.heartbeat, job.id, worker_id)
+            except Exception as e:
+                failures += 1
+                logger.warning(f"ジョブ{job.id}のハートビートに失敗しました（{failures}回目）: {e!r}")
+                if failures < 2:
+                    continue
+                reason = "ハートビートが続けて失敗した"
+            else:
+                if held:
+                    failures = 0
+                    continue
+                reason = "リースがほかのワーカーに移った"
+            logger.error(f"ジョブ{job.id}を中断します（{reason}ため。リースが切れた後に再実行されます）。")
+            task.cancel()
+            return
+
+    async def _execute(self, job: Job, worker_id: str) -> None:
+        logger.warning(f"ジョブ{job.id}を実行します（{job.attempts}回目）。")
+        heartbeat = asyncio.create_task(self._heartbeat(job, worker_id, asyncio.current_task()))
+        try:
+            result = await self.run_job(job)
+        except asyncio.CancelledError:
+            if not heartbeat.done():
+                raise  # ワーカーの停止
+            asyncio.current_task().uncancel()  # ハートビートによる中断。DBの状態はリース切れの処理に任せる
+            return
+        except Exception as e:
+            error = e
+        else:
+            error = None
+        finally:
+            heartbeat.cancel()  # 以降のDB更新の途中でキャンセルされないよう先に止める
+
+        if error is not None:
+            retry = job.attempts < self.max_attempts
+            logger.error(f"ジョブ{job.id}が失敗しました（再実行: {retry}）: {error!r}")
+            await self._db(job_crud.fail_job, job.id, worker_id, repr(error), retry)
+            if not retry:
+                shutil.rmtree(job.upload_dir, ignore_errors=True)
+        else:
+            await self._db(job_crud.finish_job, job.id, worker_id, jsonable_encoder(result))
+            shutil.rmtree(job.upload_dir, ignore_errors=True)
+            logger.warning(f"ジョブ{job.id}が完了しました。")
+
+
+def worker_pool_from_config(session_factory: Callable) -> JobWorkerPool:
+    """config.yamlのjobsから作成"""
+    return JobWorkerPool(
+        session_factory,
+        concurrency=jobs_config.get("concurrency", 2),
+        poll_interval=jobs_config.get("poll_interval_sec", 2),
+        lease_seconds=jobs_config.get("lease_sec", 600),
+        max_attempts=jobs_config.get("max_attempts", 3),
+    )
+
+
+# アプリケーション全体で共有するワーカープール（lifespanで起動・停止）
+worker_pool = worker_pool_from_config(SessionLocal)
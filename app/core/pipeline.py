@@ -0,0 +1,85 @@
+import logging
+from functools import partial
+from pathlib import Path
+
+import yaml
+from fastapi import UploadFile
+
+from app.config import (
+    DEBUG,
+    SettingsAi,
+    SettingsEnv,
+    get_ai_settings,
+    get_env_settings,
+    get_hatena_secrets,
+    get_llm_config,
+)
+from cha2hatena import LlmConfig, blog_post, json_loader
+from cha2hatena.conversation_cache import cache_from_config
+from cha2hatena.llm.failover import FailoverClient
+from cha2hatena.llm.llm_stats import configure_pricing
+from cha2hatena.llm.map_reduce import MapReduceSummarizer
+from cha2hatena.llm.rate_limiter import configure_limits
+from cha2hatena.llm.response_cache import response_cache_from_config
+from cha2hatena.post_index import idempotency_key, post_index_from_config
+
+logger = logging.getLogger(__name__)
+
+with open("config.yaml", encoding="utf-8") as f:
+    config_dict = yaml.safe_load(f)
+loader_config = config_dict.get("loader") or {}
+conversation_cache = cache_from_config(config_dict)
+response_cache = response_cache_from_config(config_dict)
+post_index = post_index_from_config(config_dict)
+configure_limits(config_dict)
+configure_pricing(config_dict)
+
+
+def create_summarizer(
+    llm_config: LlmConfig, ai_settings: SettingsAi, env_settings: SettingsEnv, fresh: bool
+) -> MapReduceSummarizer:
+    return MapReduceSummarizer(
+        llm_config,
+        partial(
+            FailoverClient,
+            fallback_models=ai_settings.fallback_models,
+            api_keys={"deepseek": env_settings.deepseek_api_key, "gemini": env_settings.gemini_api_key},
+            hedge_after=ai_settings.hedge_after_sec,
+            timeout=ai_settings.request_timeout_sec,
+            retries_per_model=ai_settings.retries_per_model,
+        ),
+        token_budget=ai_settings.chunk_token_budget,
+        max_concurrency=ai_settings.max_concurrency,
+        max_fee_usd=ai_settings.max_fee_usd,
+        response_cache=response_cache,
+        force_refresh=fresh,
+    )
+
+
+async def load_conversation(files: list[UploadFile] | list[Path]) -> str:
+    return await json_loader(
+        files,
+        streaming=loader_config.get("streaming", False),
+        parallel=loader_config.get("parallel", False),
+        max_workers=loader_config.get("max_workers"),
+        cache=conversation_cache,
+    )
+
+
+async def summarize_and_post(files: list[UploadFile] | list[Path], preset_categories: list[str], fresh: bool) -> dict:
+    """会話ログの読み込みから要約・はてなブログへの投稿までを行う（ジョブのワーカー用）"""
+    env_settings = get_env_settings()
+    ai_settings = get_ai_settings()
+    llm_config = get_llm_config(env_settings, ai_settings)
+
+    llm_config.conversation = await load_conversation(files)
+    summarizer = create_summarizer(llm_config, ai_settings, env_settings, fresh)
+    llm_outputs, _ = await summarizer.get_summary()
+    return await blog_post(
+        **llm_outputs,
+        hatena_secret_keys=get_hatena_secrets(env_settings),
+        preset_categories=preset_categories,
+        is_draft=DEBUG,
+        index=post_index,  # ジョブの再実行で記事を重複させない
+        idempotency_key=idempotency_key(llm_config.conversation, llm_config.model),
+    )
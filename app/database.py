@@ -3,6 +3,7 @@ import os
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
+from app.models import jobs  # noqa: F401  create_allの対象に含めるため
 from app.models.users import Base
 from app.config import DEBUG
 
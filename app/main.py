@@ -1,4 +1,5 @@
 import logging
+from contextlib import asynccontextmanager
 from pathlib import Path
 
 from fastapi import FastAPI, Request
@@ -7,10 +8,31 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 
 from app.config import DEBUG
+from app.core.job_worker import worker_pool
+from cha2hatena.hatenablog_poster import atompub
+from cha2hatena.json_loader import shutdown_process_pool
+from cha2hatena.llm.client_registry import registry as llm_clients
 
 logger = logging.getLogger(__name__)
 
-app = FastAPI(debug=DEBUG, docs_url="/docs" if DEBUG else None, redoc_url="/redocs" if DEBUG else None)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # バックグラウンドジョブのワーカーを起動
+    worker_pool.start()
+    yield
+    await worker_pool.stop()
+    # 共有しているLLMのAPIクライアントの接続を閉じる
+    await llm_clients.aclose()
+    # はてなブログのセッションを閉じる
+    await atompub.aclose()
+    # 並列読み込み用のプロセスプールを停止
+    shutdown_process_pool()
+
+
+app = FastAPI(
+    lifespan=lifespan, debug=DEBUG, docs_url="/docs" if DEBUG else None, redoc_url="/redocs" if DEBUG else None
+)
 
 # app/__init__.py があるディレクトリの絶対パスを取得
 current_dir = Path(__file__).parent
@@ -34,11 +56,13 @@ async def force_https_redirect(request: Request, call_next):
     return await call_next(request)
 
 
-from app.routers import auth, users, views
+from app.routers import analytics, auth, jobs, users, views
 
 app.include_router(views.router)
+app.include_router(jobs.router)
 app.include_router(auth.router)
 app.include_router(users.router)
+app.include_router(analytics.router)
 if DEBUG:
     from app.routers import dev
 
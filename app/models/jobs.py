@@ -0,0 +1,47 @@
+from datetime import datetime
+from uuid import uuid4
+
+from sqlalchemy import JSON, String, Text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.models.users import Base, utc_now
+
+# ジョブの状態
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+def new_job_id() -> str:
+    return uuid4().hex
+
+
+class Job(Base):
+    """要約・投稿のバックグラウンドジョブ。複数のuvicornワーカーでこのテーブルをキューとして共有する"""
+
+    __tablename__ = "jobs"
+
+    id: Mapped[str] = mapped_column(String(32), primary_key=True, default=new_job_id)
+    status: Mapped[str] = mapped_column(String(20), default=QUEUED, index=True)
+
+    # 入力（アップロードされたファイルの保存先）
+    upload_dir: Mapped[str] = mapped_column(Text)
+    preset_categories: Mapped[list] = mapped_column(JSON, default=list)
+    fresh: Mapped[bool] = mapped_column(default=False)
+
+    # 出力
+    result: Mapped[dict | None] = mapped_column(JSON, nullable=True)
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
+
+    # 実行中のワーカー。locked_atが古いまま残っている場合はワーカーが落ちたとみなして再実行
+    attempts: Mapped[int] = mapped_column(default=0)
+    locked_by: Mapped[str | None] = mapped_column(String(100), nullable=True)
+    locked_at: Mapped[datetime | None] = mapped_column(nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(default=utc_now, index=True)
+    updated_at: Mapped[datetime] = mapped_column(default=utc_now, onupdate=utc_now)
+    finished_at: Mapped[datetime | None] = mapped_column(nullable=True)
+
+    def __repr__(self) -> str:
+        return f"Job(id={self.id!r}, status={self.status!r}, attempts={self.attempts!r})"
@@ -0,0 +1,33 @@
+from datetime import datetime
+from functools import cache
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, Query
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.pipeline import config_dict
+from app.core.security import get_current_active_user
+from app.models.users import User
+from cha2hatena.run_records import RunRecordStore, run_record_store_from_config
+
+router = APIRouter(prefix="/analytics", tags=["analytics"])
+
+
+@cache
+def run_records() -> RunRecordStore:
+    """CLIと共有している実行記録のDB"""
+    return run_record_store_from_config(config_dict)
+
+
+@router.get("/costs")
+async def read_costs(
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    since: datetime | None = None,
+    window_days: Annotated[int | None, Query(ge=1)] = None,
+):
+    """実行記録のモデル・AI・日ごとの料金と月額の見込み"""
+    from cha2hatena import analytics  # NumPyを起動時に読み込まないよう、集計するときだけ読み込む
+
+    history = await run_in_threadpool(lambda: analytics.RunHistory.from_store(run_records(), since))
+    window_days = window_days or (config_dict.get("records") or {}).get("window_days", 30)
+    return analytics.cost_report(history, window_days)
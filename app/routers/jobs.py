@@ -0,0 +1,92 @@
+import shutil
+from pathlib import Path
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from app.core import job_crud
+from app.core.job_worker import UPLOAD_DIR, worker_pool
+from app.core.security import get_current_active_user
+from app.database import get_db
+from app.models.jobs import FAILED, SUCCEEDED, Job, new_job_id
+from app.models.users import User
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+def job_status(job: Job) -> dict:
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "attempts": job.attempts,
+        "error": job.error,
+        "created_at": job.created_at,
+        "updated_at": job.updated_at,
+        "finished_at": job.finished_at,
+    }
+
+
+def get_job_or_404(job_id: str, db: Session) -> Job:
+    job = job_crud.get_job(job_id, db)
+    if job is None:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, "ジョブが見つかりません")
+    return job
+
+
+def save_uploads(files: list[UploadFile], upload_dir: Path) -> None:
+    """アップロードをチャンクごとにディスクへ書き出す（ファイル全体をメモリに読み込まない）"""
+    for i, file in enumerate(files):
+        # ファイル名からAIの種類を判定するため元の名前のまま、並び順を保つよう番号のディレクトリに保存
+        file_dir = upload_dir / f"{i:03d}"
+        file_dir.mkdir(parents=True)
+        with (file_dir / Path(file.filename or "upload.json").name).open("wb") as f:
+            shutil.copyfileobj(file.file, f, UPLOAD_CHUNK_SIZE)
+
+
+@router.post("", status_code=status.HTTP_202_ACCEPTED)
+async def create_job(
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    db: Annotated[Session, Depends(get_db)],
+    files: list[UploadFile] = File(),
+    preset_categories: list[str] = Form([]),
+    fresh: bool = Form(False),
+):
+    """アップロードを保存してジョブを登録し、すぐにジョブIDを返す（要約・投稿はワーカーが実行）
+
+    ファイルの書き出しとDBの更新はブロッキングするためスレッドで実行する
+    """
+    job_id = new_job_id()
+    upload_dir = UPLOAD_DIR / job_id
+    await run_in_threadpool(save_uploads, files, upload_dir)
+    job = await run_in_threadpool(job_crud.create_job, db, job_id, str(upload_dir), preset_categories, fresh)
+    worker_pool.notify()
+    return job_status(job)
+
+
+@router.get("/{job_id}")
+def read_job(
+    job_id: str,
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    db: Annotated[Session, Depends(get_db)],
+):
+    """ジョブの状態"""
+    return job_status(get_job_or_404(job_id, db))
+
+
+@router.get("/{job_id}/result")
+def read_job_result(
+    job_id: str,
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    db: Annotated[Session, Depends(get_db)],
+):
+    """完了したジョブの投稿結果。未完了の場合は409"""
+    job = get_job_or_404(job_id, db)
+    if job.status == FAILED:
+        raise HTTPException(status.HTTP_409_CONFLICT, f"ジョブは失敗しました: {job.error}")
+    if job.status != SUCCEEDED:
+        raise HTTPException(status.HTTP_409_CONFLICT, f"ジョブはまだ完了していません（{job.status}）")
+    return job.result
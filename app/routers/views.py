@@ -1,22 +1,33 @@
+import json
 import logging
+from typing import Annotated
 
-import yaml
 from fastapi import APIRouter, Depends, File, Form, Request, UploadFile
-from fastapi.responses import HTMLResponse
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import HTMLResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from pydantic import ValidationError
 
-from app.config import DEBUG, get_hatena_secrets, get_llm_config
-from cha2hatena import DeepseekClient, LlmConfig, blog_post, json_loader
+from app.config import (
+    DEBUG,
+    SettingsAi,
+    SettingsEnv,
+    get_ai_settings,
+    get_env_settings,
+    get_hatena_secrets,
+    get_llm_config,
+)
+from app.core.pipeline import create_summarizer, load_conversation, post_index
+from app.core.security import get_current_active_user
+from app.models.users import User
+from cha2hatena import LlmConfig, blog_post
+from cha2hatena.llm.rate_limiter import limiter_metrics
+from cha2hatena.post_index import idempotency_key
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-with open("config.yaml", encoding="utf-8") as f:
-    config_dict = yaml.safe_load(f)
-
-
 templates = Jinja2Templates(directory="app/templates")
 
 
@@ -26,18 +37,85 @@ async def read_item(request: Request):
     return templates.TemplateResponse("top.html", {"request": request})
 
 
+def sse(event: str, data) -> str:
+    """Server-Sent Eventsの1イベント"""
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data), ensure_ascii=False)}\n\n"
+
+
 @router.post("/")
 async def generate(
     files: list[UploadFile] = File(),
     preset_categories: list[str] = Form([]),
     llm_config: LlmConfig = Depends(get_llm_config),
     hatena_secret_keys: dict = Depends(get_hatena_secrets),
+    ai_settings: SettingsAi = Depends(get_ai_settings),
+    env_settings: SettingsEnv = Depends(get_env_settings),
+    fresh: bool = Form(False),
 ):
-    
-    llm_config.conversation = await json_loader(files)
-    llm_outputs, _ = await DeepseekClient(llm_config).get_summary()
+
+    llm_config.conversation = await load_conversation(files)
+    summarizer = create_summarizer(llm_config, ai_settings, env_settings, fresh)
+    llm_outputs, _ = await summarizer.get_summary()
     hatena_response: dict = await blog_post(
-        **llm_outputs, hatena_secret_keys=hatena_secret_keys, preset_categories=preset_categories, is_draft=DEBUG
+        **llm_outputs,
+        hatena_secret_keys=hatena_secret_keys,
+        preset_categories=preset_categories,
+        is_draft=DEBUG,
+        index=post_index,
+        idempotency_key=idempotency_key(llm_config.conversation, llm_config.model),
     )
 
     return hatena_response
+
+
+@router.post("/stream")
+async def generate_stream(
+    files: list[UploadFile] = File(),
+    preset_categories: list[str] = Form([]),
+    llm_config: LlmConfig = Depends(get_llm_config),
+    hatena_secret_keys: dict = Depends(get_hatena_secrets),
+    ai_settings: SettingsAi = Depends(get_ai_settings),
+    env_settings: SettingsEnv = Depends(get_env_settings),
+    fresh: bool = Form(False),
+):
+    """POST / と同じ処理を行い、生成途中の要約をServer-Sent Eventsで逐次返す
+
+    イベント: progress（状況）、partial（生成途中のtitle・content・categories）、
+    summary（検証済みの要約）、result（はてなブログの投稿結果）、error
+    """
+    llm_config.conversation = await load_conversation(files)
+    summarizer = create_summarizer(llm_config, ai_settings, env_settings, fresh)
+
+    async def events():
+        try:
+            llm_outputs = None
+            async for event, payload in summarizer.stream_summary():
+                if event == "done":
+                    llm_outputs, _ = payload
+                    yield sse("summary", llm_outputs)
+                else:
+                    yield sse(event, payload)
+
+            yield sse("progress", {"message": "はてなブログへ投稿しています。"})
+            hatena_response: dict = await blog_post(
+                **llm_outputs,
+                hatena_secret_keys=hatena_secret_keys,
+                preset_categories=preset_categories,
+                is_draft=DEBUG,
+                index=post_index,
+                idempotency_key=idempotency_key(llm_config.conversation, llm_config.model),
+            )
+            yield sse("result", hatena_response)
+        except Exception as e:
+            logger.exception("ストリーミング中にエラーが発生しました。")
+            yield sse("error", {"message": str(e)})
+
+    # プロキシでバッファリングされないようにする
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(events(), media_type="text/event-stream", headers=headers)
+
+
+@router.get("/metrics/llm")
+async def llm_metrics(current_user: Annotated[User, Depends(get_current_active_user)]):
+    """LLM APIのリミッターごとの待ち行列の長さ・待機時間"""
+    return limiter_metrics()
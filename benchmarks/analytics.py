@@ -0,0 +1,57 @@
+import time
+
+import numpy as np
+
+from cha2hatena import analytics
+from cha2hatena.llm.llm_stats import TokenStats
+
+"""100万行の合成データでの料金の集計時間を、1行ずつTokenStatsで計算する場合と比べる
+    uv run python -m benchmarks.analytics"""
+
+ROWS = 1_000_000
+SAMPLE = 20_000  # 1行ずつの計算はこの行数だけ計測して全体を推定する
+
+
+def synthetic_history(n: int) -> analytics.RunHistory:
+    """1年分・4モデルの実行記録を乱数で作成"""
+    rng = np.random.default_rng(0)
+    models = np.array(["gemini-2.5-flash", "gemini-2.5-pro", "deepseek-chat", "deepseek-reasoner"])
+    sources = np.array(["ChatGPT", "Claude", "Gemini"])
+    input_tokens = rng.integers(1_000, 400_000, n)
+    output_tokens = rng.integers(100, 8_000, n)
+    return analytics.RunHistory(
+        timestamp=np.datetime64("2024-01-01T00:00:00") + rng.integers(0, 365 * 86400, n).astype("timedelta64[s]"),
+        model=models[rng.integers(0, len(models), n)],
+        source=sources[rng.integers(0, len(sources), n)],
+        input_tokens=input_tokens,
+        thoughts_tokens=rng.integers(0, 2_000, n),
+        output_tokens=output_tokens,
+        input_letter_count=input_tokens * 2,
+        output_letter_count=output_tokens * 2,
+    )
+
+
+def main():
+    history = synthetic_history(ROWS)
+
+    start = time.perf_counter()
+    analytics.cost_report(history)
+    vectorized = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(SAMPLE):
+        _ = TokenStats(
+            int(history.input_tokens[i]),
+            int(history.thoughts_tokens[i]),
+            int(history.output_tokens[i]),
+            0,
+            0,
+            str(history.models[history.model_codes[i]]),
+        ).total_fee
+    per_row = (time.perf_counter() - start) / SAMPLE * ROWS
+
+    print(f"{ROWS:,}行: NumPy {vectorized:.2f}秒 / 1行ずつ（推定） {per_row:.2f}秒")
+
+
+if __name__ == "__main__":
+    main()
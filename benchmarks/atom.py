@@ -0,0 +1,43 @@
+import timeit
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from cha2hatena import atom
+from cha2hatena.hatenablog_poster import parse_response, xml_unparser
+
+"""投稿リクエストのXMLの組み立て・応答の解析の速さを、ElementTree版（hatenablog_poster）と比べる
+    uv run python -m benchmarks.atom"""
+
+NUMBER = 2000
+
+
+def best(func) -> float:
+    """3回計測したうちの最短の1件あたりの時間（秒）"""
+    return min(timeit.repeat(func, number=NUMBER, repeat=3)) / NUMBER
+
+
+def main():
+    entry = {
+        "title": "タイトル & <タグ>",
+        "content": "本文" * 500,
+        "categories": ["Python", "AtomPub", "LLM"],
+        "preset_categories": ["ブログ"],
+        "author": "user",
+        "updated": datetime(2025, 6, 1, 12, 0, 0, tzinfo=timezone(timedelta(hours=9))),
+        "is_draft": True,
+    }
+    links = (
+        '<link rel="edit" href="https://blog.hatena.ne.jp/u/u.hatenablog.com/atom/entry/1"/>'
+        '<link rel="alternate" type="text/html" href="https://u.hatenablog.com/entry/1"/>'
+    )
+    text = xml_unparser(**entry).replace("<title", links + "<title", 1)
+    response = SimpleNamespace(text=text, status_code=201)
+
+    render_et, render_fast = best(lambda: xml_unparser(**entry)), best(lambda: atom.render_entry(**entry))
+    parse_et, parse_fast = best(lambda: parse_response(response)), best(lambda: atom.parse_entry(text, 201))
+    print(f"render: ElementTree {render_et * 1e6:.1f}µs / テンプレート {render_fast * 1e6:.1f}µs")
+    print(f"parse : ElementTree {parse_et * 1e6:.1f}µs / 1回の走査 {parse_fast * 1e6:.1f}µs")
+
+
+if __name__ == "__main__":
+    main()
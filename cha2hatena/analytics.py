@@ -0,0 +1,215 @@
+import csv
+import logging
+from collections.abc import Iterable
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from .llm.llm_stats import price_table
+from .run_records import CSV_COLUMNS, RunRecordStore
+
+logger = logging.getLogger(__name__)
+
+DAYS_PER_MONTH = 30  # 月額の見込みの計算用
+
+_NUMERIC_COLUMNS = ("input_tokens", "thoughts_tokens", "output_tokens", "input_letter_count", "output_letter_count")
+
+
+class RunHistory:
+    """実行記録を列ごとのNumPy配列で持つ
+
+    modelとsource（AIの種類）は、名前の配列（models・sources）と各行の番号（model_codes・source_codes）で持つ
+    """
+
+    def __init__(
+        self,
+        timestamp,
+        model,
+        source,
+        input_tokens,
+        thoughts_tokens,
+        output_tokens,
+        input_letter_count,
+        output_letter_count,
+        recorded_fee=None,
+    ):
+        self.timestamp = np.asarray(timestamp, dtype="datetime64[s]")
+        self.models, self.model_codes = np.unique(np.asarray(model, dtype=str), return_inverse=True)
+        self.sources, self.source_codes = np.unique(np.asarray(source, dtype=str), return_inverse=True)
+        self.input_tokens = np.asarray(input_tokens, dtype=np.int64)
+        self.thoughts_tokens = np.asarray(thoughts_tokens, dtype=np.int64)
+        self.output_tokens = np.asarray(output_tokens, dtype=np.int64)
+        self.input_letter_count = np.asarray(input_letter_count, dtype=np.int64)
+        self.output_letter_count = np.asarray(output_letter_count, dtype=np.int64)
+        # 実行時に記録した料金（USD）。料金表の改定前の記録との比較用
+        self.recorded_fee = (
+            np.full(len(self.timestamp), np.nan) if recorded_fee is None else np.asarray(recorded_fee, dtype=float)
+        )
+
+    def __len__(self) -> int:
+        return len(self.timestamp)
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[dict]) -> "RunHistory":
+        """RunRecordStore.rows()の形（RunRecordの属性名）の記録から作成"""
+        rows = list(rows)
+        return cls(
+            [row["timestamp"] for row in rows],
+            [row["model"] or "" for row in rows],
+            [row["ai_name"] or "" for row in rows],
+            *([row[name] or 0 for row in rows] for name in _NUMERIC_COLUMNS),
+            recorded_fee=[row["total_fee_usd"] for row in rows],
+        )
+
+    @classmethod
+    def from_store(cls, store: RunRecordStore, since: datetime | None = None) -> "RunHistory":
+        """実行記録のDBから作成"""
+        return cls.from_rows(store.rows(since))
+
+    @classmethod
+    def from_csv(cls, path: Path) -> "RunHistory":
+        """record.csvから作成。列ごとにまとめて型を変換する"""
+        attrs = {attr: [] for attr in CSV_COLUMNS.values()}
+        with Path(path).open(newline="", encoding="utf-8-sig") as f:
+            for row in csv.DictReader(f):
+                if not row.get("timestamp"):
+                    continue
+                for column, attr in CSV_COLUMNS.items():
+                    attrs[attr].append(row.get(column) or "")
+
+        def numbers(attr: str, dtype) -> np.ndarray:
+            values = np.asarray(attrs[attr], dtype=str)
+            return np.where(values == "", "0", values).astype(float).astype(dtype)
+
+        return cls(
+            np.asarray(attrs["timestamp"], dtype="datetime64[us]"),
+            attrs["model"],
+            attrs["ai_name"],
+            *(numbers(name, np.int64) for name in _NUMERIC_COLUMNS),
+            recorded_fee=numbers("total_fee_usd", float),
+        )
+
+
+def fees(history: RunHistory) -> dict[str, np.ndarray]:
+    """各行の料金（USD）と、料金区分が高い方になったかどうか（TokenStatsと同じ料金表）
+
+    Geminiの料金区分は入力トークン数で決まり、入力・出力（思考を含む）の両方に適用される。
+    記録は1回の実行の合計のため、map-reduceで分割して要約した実行は高めに試算されることがある。
+    キャッシュヒットしたトークン数は記録していないため、DeepSeekはキャッシュミスの料金で試算する
+    """
+    return price_table().batch_fees(
+        history.models, history.model_codes, history.input_tokens, history.thoughts_tokens, history.output_tokens
+    )
+
+
+def tokens_per_letter(history: RunHistory) -> dict[str, np.ndarray]:
+    """各行の1文字あたりのトークン数（文字数が0の行はnan）"""
+
+    def ratio(tokens: np.ndarray, letters: np.ndarray) -> np.ndarray:
+        return np.divide(tokens, letters, out=np.full(len(tokens), np.nan), where=letters > 0)
+
+    return {
+        "input": ratio(history.input_tokens, history.input_letter_count),
+        "output": ratio(history.output_tokens, history.output_letter_count),
+    }
+
+
+def _ratio(numerator: float, denominator: float) -> float | None:
+    return float(numerator / denominator) if denominator else None
+
+
+def cost_report(history: RunHistory, window_days: int = 30) -> dict:
+    """料金・トークン数の集計（JSONに変換できる辞書）
+
+    月額の見込みは、最後の実行からwindow_days日前までの料金の1日平均×30日
+    """
+    n = len(history)
+    fee = fees(history)
+    total = fee["total"]
+    over = fee["over_threshold"]
+    # 1文字あたりのトークン数は文字数を記録した行だけで計算する
+    input_counted = np.where(history.input_letter_count > 0, history.input_tokens, 0)
+    output_counted = np.where(history.output_letter_count > 0, history.output_tokens, 0)
+
+    def grouped(codes: np.ndarray, names: np.ndarray) -> dict:
+        k = len(names)
+        runs = np.bincount(codes, minlength=k)
+        spend = np.bincount(codes, weights=total, minlength=k)
+        sums = {
+            name: np.bincount(codes, weights=getattr(history, name), minlength=k).astype(np.int64)
+            for name in _NUMERIC_COLUMNS
+        }
+        counted = np.bincount(codes, weights=input_counted, minlength=k)
+        return {
+            str(names[i]): {
+                "runs": int(runs[i]),
+                "fee_usd": float(spend[i]),
+                "input_tokens": int(sums["input_tokens"][i]),
+                "thoughts_tokens": int(sums["thoughts_tokens"][i]),
+                "output_tokens": int(sums["output_tokens"][i]),
+                "input_tokens_per_letter": _ratio(counted[i], sums["input_letter_count"][i]),
+            }
+            for i in range(k)
+        }
+
+    days, day_codes = np.unique(history.timestamp.astype("datetime64[D]"), return_inverse=True)
+    by_day = np.bincount(day_codes, weights=total, minlength=len(days))
+
+    report = {
+        "runs": n,
+        "start": None,
+        "end": None,
+        "total_fee_usd": float(total.sum()),
+        "recorded_fee_usd": float(np.nansum(history.recorded_fee)),
+        "tokens": {
+            "input": int(history.input_tokens.sum()),
+            "thoughts": int(history.thoughts_tokens.sum()),
+            "output": int(history.output_tokens.sum()),
+        },
+        "tokens_per_letter": {
+            "input": _ratio(input_counted.sum(), history.input_letter_count.sum()),
+            "output": _ratio(output_counted.sum(), history.output_letter_count.sum()),
+        },
+        "by_model": grouped(history.model_codes, history.models),
+        "by_source": grouped(history.source_codes, history.sources),
+        "by_day": {str(day): float(spend) for day, spend in zip(days, by_day)},
+        "over_tier_threshold": {"runs": int(over.sum()), "fee_usd": float(total[over].sum())},
+        "window_days": window_days,
+        "projected_monthly_usd": 0.0,
+    }
+    if n:
+        end = history.timestamp.max()
+        in_window = history.timestamp > end - np.timedelta64(window_days, "D")
+        report["start"] = str(history.timestamp.min())
+        report["end"] = str(end)
+        report["projected_monthly_usd"] = float(total[in_window].sum() / window_days * DAYS_PER_MONTH)
+    return report
+
+
+def format_report(report: dict) -> str:
+    """cost_reportの結果をターミナル向けの表に"""
+    lines = [
+        f"実行記録 {report['runs']:,}件（{report['start']} 〜 {report['end']}）",
+        (
+            f"料金合計 ${report['total_fee_usd']:.4f}（記録時の料金 ${report['recorded_fee_usd']:.4f}）"
+            f"  月額の見込み ${report['projected_monthly_usd']:.4f}（直近{report['window_days']}日から）"
+        ),
+        (
+            f"料金区分の閾値を超えた実行 {report['over_tier_threshold']['runs']:,}件"
+            f"（${report['over_tier_threshold']['fee_usd']:.4f}）"
+        ),
+    ]
+    for title, key in (("モデル", "by_model"), ("AI", "by_source")):
+        lines += [
+            "",
+            f"{title:<24} {'件数':>8} {'入力トークン':>14} {'出力トークン':>14} {'料金(USD)':>12} {'トークン/文字':>12}",
+        ]
+        for name, group in sorted(report[key].items(), key=lambda item: -item[1]["fee_usd"]):
+            per_letter = group["input_tokens_per_letter"]
+            lines.append(
+                f"{name or '(不明)':<24} {group['runs']:>8,} {group['input_tokens']:>14,} "
+                f"{group['output_tokens'] + group['thoughts_tokens']:>14,} {group['fee_usd']:>12.4f} "
+                f"{'-' if per_letter is None else f'{per_letter:.3f}':>12}"
+            )
+    return "\n".join(lines)
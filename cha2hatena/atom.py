@@ -0,0 +1,178 @@
+import xml.etree.ElementTree as ET
+from collections.abc import Iterable, Iterator, Sequence
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+ATOM_NS = "http://www.w3.org/2005/Atom"
+APP_NS = "http://www.w3.org/2007/app"
+
+_ENTRY = f"{{{ATOM_NS}}}entry"
+_TITLE = f"{{{ATOM_NS}}}title"
+_AUTHOR = f"{{{ATOM_NS}}}author"
+_NAME = f"{{{ATOM_NS}}}name"
+_CONTENT = f"{{{ATOM_NS}}}content"
+_UPDATED = f"{{{ATOM_NS}}}updated"
+_LINK = f"{{{ATOM_NS}}}link"
+_CATEGORY = f"{{{ATOM_NS}}}category"
+_CONTROL = f"{{{APP_NS}}}control"
+_DRAFT = f"{{{APP_NS}}}draft"
+
+JST = timezone(timedelta(hours=9))
+
+_ENTRY_OPEN = f'<entry xmlns="{ATOM_NS}" xmlns:app="{APP_NS}">'
+
+
+def escape_text(text: str) -> str:
+    """要素のテキストのエスケープ（ElementTreeと同じ）"""
+    if "&" in text:
+        text = text.replace("&", "&amp;")
+    if "<" in text:
+        text = text.replace("<", "&lt;")
+    if ">" in text:
+        text = text.replace(">", "&gt;")
+    return text
+
+
+def escape_attr(text: str) -> str:
+    """属性値のエスケープ（ElementTreeと同じく改行・タブも文字参照にする）"""
+    text = escape_text(text)
+    if '"' in text:
+        text = text.replace('"', "&quot;")
+    if "\r" in text:
+        text = text.replace("\r", "&#13;")
+    if "\n" in text:
+        text = text.replace("\n", "&#10;")
+    if "\t" in text:
+        text = text.replace("\t", "&#09;")
+    return text
+
+
+def _element(tag: str, text: str | None, attrs: str = "") -> str:
+    # ElementTreeと同じく、空のテキストは空要素にする
+    if text:
+        return f"<{tag}{attrs}>{escape_text(text)}</{tag}>"
+    return f"<{tag}{attrs} />"
+
+
+def render_entry(
+    title: str,
+    content: str,
+    categories: Sequence[str],
+    preset_categories: Sequence[str] = (),
+    author: str | None = None,
+    updated: datetime | None = None,
+    is_draft: bool = False,
+) -> str:
+    """はてなブログ投稿リクエストのXML。hatenablog_poster.xml_unparserと同じ出力を、ElementTreeを作らずに文字列で組み立てる"""
+    if updated is None:
+        updated = datetime.now(JST)
+    elif updated.tzinfo is None:
+        updated = updated.replace(tzinfo=JST)  # timezoneなしの場合JST
+
+    return "".join(
+        [
+            _ENTRY_OPEN,
+            _element("title", title),
+            _element("updated", updated.isoformat()),
+            "<author>",
+            _element("name", author),
+            "</author>",
+            _element("content", content, ' type="text/x-markdown"'),
+            "<app:control><app:draft>",
+            "yes" if is_draft else "no",
+            "</app:draft><app:preview>no</app:preview></app:control>",
+            *(f'<category term="{escape_attr(cat)}" />' for cat in (*categories, *preset_categories)),
+            "</entry>",
+        ]
+    )
+
+
+def entry_to_dict(entry: ET.Element, status_code: int | None = None) -> dict[str, Any]:
+    """entry要素の子要素を1回だけ走査して、parse_responseと同じ辞書にする"""
+    found = {}  # 最初に見つかった要素のテキスト（テキストがなければNone）
+    link_edit = link_alternate = None
+    categories = []
+    for child in entry:
+        tag = child.tag
+        if tag == _CATEGORY:
+            if term := child.get("term", ""):
+                categories.append(term)
+        elif tag == _LINK:
+            rel = child.get("rel")
+            if rel == "edit" and link_edit is None:
+                link_edit = child.get("href", "")
+            elif rel == "alternate" and link_alternate is None:
+                link_alternate = child.get("href", "")
+        elif tag in found:
+            continue
+        elif tag == _AUTHOR or tag == _CONTROL:
+            elem = child.find(_NAME if tag == _AUTHOR else _DRAFT)
+            if elem is not None:
+                found[tag] = elem.text
+        else:
+            found[tag] = child.text
+
+    # 要素がなければ空文字、テキストのない要素はNone（safe_findと同じ）
+    link_edit = link_edit or ""
+    return {
+        "status_code": status_code,
+        "title": found.get(_TITLE, ""),
+        "author": found.get(_AUTHOR, ""),
+        "content": found.get(_CONTENT, ""),
+        "time": datetime.fromisoformat(found.get(_UPDATED, "")),
+        "link_edit": link_edit,
+        "link_edit_user": link_edit.replace("atom/entry/", "edit?entry="),
+        "link_alternate": link_alternate or "",
+        "categories": categories,
+        "is_draft": found.get(_CONTROL, "") == "yes",
+    }
+
+
+def parse_entry(xml: str | bytes, status_code: int | None = None) -> dict[str, Any]:
+    """AtomPubの応答（entry）を解析"""
+    return entry_to_dict(ET.fromstring(xml), status_code)
+
+
+class FeedParser:
+    """Atomのフィード（またはentry単体）を逐次解析し、読み終えたentryを1件ずつ取り出す
+
+    ブログのアーカイブのような大きなフィードも、ページ全体の木を保持せずに1回の走査で処理する。
+    フィードのrel="next"のリンクはnext_urlに入る
+    """
+
+    def __init__(self):
+        self._parser = ET.XMLPullParser(events=("start", "end"))
+        self._depth = 0
+        self.next_url: str | None = None
+
+    def feed(self, data: str | bytes) -> list[dict]:
+        """断片を追加し、読み終えたentryを返す"""
+        self._parser.feed(data)
+        return self._drain()
+
+    def close(self) -> list[dict]:
+        """入力の終端。XMLが閉じていなければParseError"""
+        self._parser.close()
+        return self._drain()
+
+    def _drain(self) -> list[dict]:
+        entries = []
+        for event, elem in self._parser.read_events():
+            if event == "start":
+                self._depth += 1
+                continue
+            self._depth -= 1
+            if elem.tag == _ENTRY:
+                entries.append(entry_to_dict(elem))
+                elem.clear()  # 読み終えたentryは捨ててメモリを抑える
+            elif elem.tag == _LINK and self._depth == 1 and elem.get("rel") == "next":
+                self.next_url = elem.get("href")
+        return entries
+
+
+def iter_entries(chunks: Iterable[str | bytes]) -> Iterator[dict]:
+    """フィードの断片からentryを1件ずつ返す"""
+    parser = FeedParser()
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    yield from parser.close()
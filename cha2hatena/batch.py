@@ -0,0 +1,116 @@
+import asyncio
+import json
+import logging
+import time
+from collections.abc import Awaitable, Callable
+from datetime import datetime
+from pathlib import Path
+
+from pydantic import BaseModel, Field
+
+from . import json_stream
+from .watermark import conversation_key
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_SUFFIXES = {".json", ".txt"}
+
+
+class BatchItem(BaseModel):
+    """1回の要約・投稿にまとめる会話ログ"""
+
+    name: str
+    paths: list[Path]
+
+
+class BatchResult(BaseModel):
+    item: BatchItem
+    status: str = Field(description="ok / skipped / failed")
+    seconds: float
+    record: dict = Field(default_factory=dict, description="record.csvの1行")
+    error: str = ""
+
+
+def scan_exports(input_dir: Path) -> list[Path]:
+    """input_dir直下の会話ログ（.json/.txt）"""
+    return sorted(p for p in input_dir.iterdir() if p.is_file() and p.suffix in SUPPORTED_SUFFIXES)
+
+
+def export_conversation_key(path: Path) -> str:
+    """エクスポートの会話を識別するキー。metadataがなければファイル名"""
+    if path.suffix == ".json":
+        try:
+            metadata = json_stream.read_metadata(path).get("metadata")
+        except (OSError, UnicodeDecodeError, json.JSONDecodeError):
+            metadata = None
+        if key := conversation_key(metadata):
+            return key
+    return path.stem
+
+
+def group_exports(paths: list[Path], group_by: str) -> list[BatchItem]:
+    """会話ごと（同じ会話の再エクスポートは最新のファイルのみ）、またはエクスポートした日ごとにまとめる"""
+    groups: dict[str, list[Path]] = {}
+    if group_by == "conversation":
+        for path in paths:
+            groups.setdefault(export_conversation_key(path), []).append(path)
+        items = []
+        for group in groups.values():
+            latest = max(group, key=lambda p: p.stat().st_mtime)
+            if len(group) > 1:
+                logger.warning(f"同じ会話のエクスポートが{len(group)}件あるため、最新の{latest.name}のみ使用します。")
+            items.append(BatchItem(name=latest.stem, paths=[latest]))
+        return items
+    if group_by == "day":
+        for path in paths:
+            day = datetime.fromtimestamp(path.stat().st_mtime).strftime("%Y-%m-%d")
+            groups.setdefault(day, []).append(path)
+        return [BatchItem(name=day, paths=group) for day, group in sorted(groups.items())]
+    raise ValueError(f"group_byはconversationかdayを指定してください: {group_by}")
+
+
+async def run_batch(
+    items: list[BatchItem], pipeline: Callable[[BatchItem], Awaitable[dict | None]], concurrency: int = 2
+) -> list[BatchResult]:
+    """itemsごとにpipelineを最大concurrency件まで並行実行。失敗はその項目だけにとどめる"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_one(item: BatchItem) -> BatchResult:
+        async with semaphore:
+            logger.warning(f"[{item.name}] 処理を開始します: {', '.join(p.name for p in item.paths)}")
+            start = time.monotonic()
+            try:
+                record = await pipeline(item)
+            except Exception as e:
+                logger.error(f"[{item.name}] 失敗しました: {e!r}")
+                logger.info("詳細: ", exc_info=True)
+                return BatchResult(item=item, status="failed", seconds=time.monotonic() - start, error=repr(e))
+            status = "ok" if record is not None else "skipped"
+            return BatchResult(item=item, status=status, seconds=time.monotonic() - start, record=record or {})
+
+    return await asyncio.gather(*(run_one(item) for item in items))
+
+
+def format_summary(results: list[BatchResult], elapsed: float) -> str:
+    """項目ごとの結果とスループット・料金の集計表"""
+    header = f"{'項目':<24} {'状態':<8} {'秒':>7} {'入力トークン':>12} {'出力トークン':>12} {'料金(USD)':>10}  タイトル"
+    lines = [header, "-" * len(header)]
+    for r in results:
+        lines.append(
+            f"{r.item.name[:24]:<24} {r.status:<8} {r.seconds:>7.1f} {r.record.get('input_tokens', 0):>12,} "
+            f"{r.record.get('output_tokens', 0):>12,} {r.record.get('total_fee (USD)', 0):>10.4f}  "
+            f"{r.record.get('entry_title', r.error)}"
+        )
+
+    counts = {status: sum(r.status == status for r in results) for status in ("ok", "skipped", "failed")}
+    total_fee = sum(r.record.get("total_fee (USD)", 0) for r in results)
+    total_tokens = sum(r.record.get("input_tokens", 0) + r.record.get("output_tokens", 0) for r in results)
+    per_minute = len(results) / elapsed * 60 if elapsed > 0 else 0.0
+    lines += [
+        "-" * len(header),
+        (
+            f"合計 {len(results)}件（成功 {counts['ok']} / 新しい会話なし {counts['skipped']} / 失敗 {counts['failed']}）"
+            f"  経過 {elapsed:.1f}秒  {per_minute:.1f}件/分  {total_tokens:,}トークン  料金 ${total_fee:.4f}"
+        ),
+    ]
+    return "\n".join(lines)
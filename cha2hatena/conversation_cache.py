@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from fastapi import UploadFile  # 型ヒントのみ。CLIではfastapiを読み込まない
+
+from .json_stream import CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = 1  # 整形処理を変更したら上げる（古いキャッシュを無効化）
+
+
+async def file_digest(path: Path | UploadFile) -> str:
+    """ファイル内容のSHA-256（全体をメモリに載せずに計算）"""
+    h = hashlib.sha256()
+    if isinstance(path, Path):
+        with path.open("rb") as f:
+            while chunk := f.read(CHUNK_SIZE):
+                h.update(chunk)
+    else:
+        await path.seek(0)
+        while chunk := await path.read(CHUNK_SIZE):
+            h.update(chunk)
+        await path.seek(0)
+    return h.hexdigest()
+
+
+class ConversationCache:
+    """正規化済みの会話（convert_to_strの結果）をファイル内容のハッシュで保存するディスクキャッシュ
+
+    1エントリ1ファイル。ヒット時に更新時刻を進め、合計サイズが上限を超えたら古いものから削除する（LRU）
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int = 100 * 1024 * 1024):
+        self.cache_dir = Path(cache_dir)  # ディレクトリは最初の保存時に作る
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(digest: str, ai_name: str) -> str:
+        # 話者名はAIの名前で変わるためキーに含める
+        return f"v{CACHE_VERSION}-{ai_name}-{digest}"
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def get(self, key: str) -> tuple[list, str | None] | None:
+        """(logs, timestamp)を返す。ない場合はNone"""
+        path = self._entry_path(key)
+        try:
+            entry = json.loads(path.read_text(encoding="utf-8"))
+            os.utime(path)  # LRU用に最終利用時刻を更新
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.misses += 1
+            logger.info(f"会話キャッシュ: ミス {key[:24]}...")
+            return None
+
+        self.hits += 1
+        logger.info(f"会話キャッシュ: ヒット {key[:24]}... ({len(entry['logs'])}件)")
+        return entry["logs"], entry["timestamp"]
+
+    def put(self, key: str, logs: list, timestamp: str | None) -> None:
+        path = self._entry_path(key)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path.write_text(json.dumps({"logs": logs, "timestamp": timestamp}, ensure_ascii=False), "utf-8")
+            os.replace(tmp_path, path)  # 書き込み途中のファイルを他プロセスに読ませない
+        except OSError:
+            logger.warning("会話キャッシュを保存できませんでした。", exc_info=True)
+            tmp_path.unlink(missing_ok=True)
+            return
+        self.evict()
+
+    def evict(self) -> None:
+        """合計サイズが上限以下になるまで最終利用時刻の古いエントリを削除"""
+        entries = []
+        for path in self.cache_dir.glob("*.json"):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return
+        for _, size, path in sorted(entries):
+            path.unlink(missing_ok=True)
+            total -= size
+            logger.debug(f"会話キャッシュから削除: {path.name}")
+            if total <= self.max_bytes:
+                break
+
+
+def cache_from_config(config: dict) -> ConversationCache | None:
+    """config.yamlのcache.conversationsから作成。無効の場合はNone"""
+    cache_config = (config.get("cache") or {}).get("conversations") or {}
+    if not cache_config.get("enabled", False):
+        return None
+    return ConversationCache(
+        Path(cache_config.get("dir", "outputs/cache/conversations")),
+        max_bytes=int(cache_config.get("max_mb", 100) * 1024 * 1024),
+    )
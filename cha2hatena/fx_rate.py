@@ -0,0 +1,98 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+def fetch_yahoo_usd_jpy() -> float:
+    """ヤフーファイナンスからドル円レートを取得（ブロッキング）。yfinance・pandasは呼び出し時に読み込む"""
+    import yfinance as yf
+
+    return float(yf.Ticker("USDJPY=X").history(period="1d").Close.iloc[0])
+
+
+class FxRateProvider:
+    """ドル円レートをディスクにキャッシュして返す
+
+    有効期限内はキャッシュ、期限切れの場合は古い値を返しつつrefresh()で取り直す（stale-while-revalidate）。
+    キャッシュがない場合だけ取得を待つ。fixed_rateを指定するとネットワークもキャッシュも使わない（テスト用）
+    """
+
+    def __init__(
+        self,
+        cache_path: Path,
+        ttl_seconds: float = 24 * 3600,
+        fixed_rate: float | None = None,
+        fetcher: Callable[[], float] = fetch_yahoo_usd_jpy,
+    ):
+        self.cache_path = Path(cache_path)
+        self.ttl_seconds = ttl_seconds
+        self.fixed_rate = fixed_rate
+        self.fetcher = fetcher
+        self._lock = threading.Lock()
+
+    def _read(self) -> tuple[float, float] | None:
+        """(レート, 取得時刻)"""
+        try:
+            entry = json.loads(self.cache_path.read_text(encoding="utf-8"))
+            return float(entry["rate"]), float(entry["fetched_at"])
+        except (FileNotFoundError, json.JSONDecodeError, KeyError, TypeError, ValueError):
+            return None
+
+    def _write(self, rate: float) -> None:
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.cache_path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps({"rate": rate, "fetched_at": time.time()}), encoding="utf-8")
+        os.replace(tmp_path, self.cache_path)
+
+    def is_stale(self) -> bool:
+        """キャッシュがない、または有効期限切れ"""
+        if self.fixed_rate is not None:
+            return False
+        cached = self._read()
+        return cached is None or time.time() - cached[1] > self.ttl_seconds
+
+    def refresh(self) -> float | None:
+        """レートを取り直してキャッシュを更新。同時に呼ばれた場合は1回だけ取得し、失敗時はNone"""
+        if self.fixed_rate is not None:
+            return self.fixed_rate
+        with self._lock:
+            if not self.is_stale():
+                return self._read()[0]  # ほかのスレッドが更新済み
+            try:
+                rate = self.fetcher()
+            except Exception as e:
+                logger.error(f"為替レートを取得できませんでした: {e!r}")
+                logger.info("詳細: ", exc_info=True)
+                return None
+            try:
+                self._write(rate)
+            except OSError:
+                logger.warning("為替レートのキャッシュを保存できませんでした。", exc_info=True)
+            logger.debug(f"為替レートを更新しました: {rate}")
+            return rate
+
+    def get(self) -> float | None:
+        """ドル円レート。キャッシュがあれば期限切れでもすぐに返し、なければ取得する"""
+        if self.fixed_rate is not None:
+            return self.fixed_rate
+        if (cached := self._read()) is not None:
+            if time.time() - cached[1] > self.ttl_seconds:
+                logger.debug("為替レートのキャッシュが期限切れのため、前回の値を使って更新します。")
+            return cached[0]
+        return self.refresh()
+
+
+def fx_rate_from_config(config: dict) -> FxRateProvider:
+    """config.yamlのfxから作成"""
+    fx_config = config.get("fx") or {}
+    return FxRateProvider(
+        Path(fx_config.get("cache_file", "outputs/cache/usdjpy.json")),
+        ttl_seconds=fx_config.get("ttl_hours", 24) * 3600,
+        fixed_rate=fx_config.get("fixed_rate"),
+    )
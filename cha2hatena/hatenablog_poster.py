@@ -1,12 +1,15 @@
+import asyncio
 import logging
 import xml.etree.ElementTree as ET
 from datetime import datetime, timedelta, timezone
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
-import httpx
-from authlib.integrations.httpx_client import AsyncOAuth1Client
-from requests import Response
-from requests_oauthlib import OAuth1Session
+from . import atom
+from .post_index import PostIndex
+
+if TYPE_CHECKING:
+    import httpx
+    from requests import Response
 
 logger = logging.getLogger(__name__)
 
@@ -32,7 +35,10 @@ def xml_unparser(
     updated: datetime | None = None,
     is_draft: bool = False,
 ) -> str:
-    """はてなブログ投稿リクエストの形式へ変換"""
+    """はてなブログ投稿リクエストの形式へ変換（ElementTree版）
+
+    投稿ではatom.render_entryを使う。この関数は出力が同じことを確かめるテスト・ベンチマークの比較用に残している
+    """
 
     logger.debug(f"{'=' * 25}xml_unparserの処理開始{'=' * 25}")
 
@@ -72,25 +78,129 @@ def xml_unparser(
     return ET.tostring(ROOT, encoding="unicode")
 
 
-async def hatena_oauth(xml_str: str, hatena_secret_keys: dict) -> httpx.Response:
-    """はてなブログへ投稿"""
-
-    URL = hatena_secret_keys.pop("hatena_entry_url")
-    async with AsyncOAuth1Client(**hatena_secret_keys, force_include_body=True) as oauth:
-        response = await oauth.post(
-            URL, content=xml_str.encode("utf-8"), headers={"Content-Type": "application/xml; charset=utf-8"}
+def oauth_httpx():
+    """authlibのAsyncOAuth1Clientが使うhttpxモジュール（新しいauthlibはhttpx2、なければhttpx）"""
+    try:
+        import httpx2
+    except ImportError:
+        import httpx as httpx2
+    return httpx2
+
+
+class AtomPubClient:
+    """はてなアカウントごとにOAuth1セッション（AsyncOAuth1Client）を1つだけ作成して使い回す
+
+    投稿ごとのTCP/TLS接続を避け、keep-aliveの接続プールで複数の投稿を並行して送る。
+    セッションは初回の投稿時に作成し、aclose()でまとめて閉じる（FastAPIのlifespan終了時やCLIの終了時）
+    """
+
+    def __init__(self, max_connections: int = 10, **client_kwargs):
+        self.max_connections = max_connections
+        self.client_kwargs = client_kwargs  # AsyncOAuth1Client（httpx.AsyncClient）へ渡す引数。テストではtransport
+        self._sessions: dict[tuple[str, ...], object] = {}
+        self._lock = asyncio.Lock()
+
+    def session(self, hatena_secret_keys: dict):
+        """アカウントのAsyncOAuth1Client。hatena_secret_keysは変更しない"""
+        credentials = {k: v for k, v in hatena_secret_keys.items() if k != "hatena_entry_url"}
+        key = tuple(credentials.get(k, "") for k in ("client_id", "client_secret", "token", "token_secret"))
+        if key not in self._sessions:
+            from authlib.integrations.httpx_client import AsyncOAuth1Client  # 読み込みが重いため投稿時に読み込む
+
+            logger.debug(f"はてなブログのセッションを作成: ...{key[2][-5:]}")
+            limits = oauth_httpx().Limits(
+                max_connections=self.max_connections, max_keepalive_connections=self.max_connections
+            )
+            self._sessions[key] = AsyncOAuth1Client(
+                **credentials, force_include_body=True, limits=limits, **self.client_kwargs
+            )
+        return self._sessions[key]
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    async def post(self, xml_str: str, hatena_secret_keys: dict) -> "httpx.Response":
+        """hatena_entry_urlへエントリーをPOST"""
+        return await self._send("POST", hatena_secret_keys["hatena_entry_url"], xml_str, hatena_secret_keys)
+
+    async def put(self, link_edit: str, xml_str: str, hatena_secret_keys: dict) -> "httpx.Response":
+        """投稿済みのエントリー（link_edit）をPUTで更新"""
+        return await self._send("PUT", link_edit, xml_str, hatena_secret_keys)
+
+    async def _send(self, method: str, url: str, xml_str: str, hatena_secret_keys: dict) -> "httpx.Response":
+        oauth = self.session(hatena_secret_keys)
+        return await oauth.request(
+            method, url, content=xml_str.encode("utf-8"), headers={"Content-Type": "application/xml; charset=utf-8"}
         )
 
-        logger.debug(f"Status: {response.status_code}")
-        if response.status_code == 201:
-            logger.warning("✓ はてなブログへ投稿成功")
-        else:
-            logger.error("✗ リクエスト中にエラー発生。はてなブログへ投稿できませんでした。")
+    async def aclose(self) -> None:
+        """保持しているセッションの接続をすべて閉じる"""
+        async with self._lock:
+            sessions, self._sessions = self._sessions, {}
+        for session in sessions.values():
+            try:
+                await session.aclose()
+            except Exception:
+                logger.warning("はてなブログのセッションを閉じる際にエラーが発生しました。", exc_info=True)
+        if sessions:
+            logger.debug(f"{len(sessions)}個のはてなブログのセッションを閉じました。")
+
+
+# アプリケーション全体で共有するクライアント
+atompub = AtomPubClient()
+
+
+async def hatena_oauth(
+    xml_str: str, hatena_secret_keys: dict, client: AtomPubClient | None = None, link_edit: str | None = None
+) -> "httpx.Response":
+    """はてなブログへ投稿。link_editを指定した場合は投稿済みのエントリーを更新"""
+
+    client = client if client is not None else atompub
+    if link_edit:
+        response = await client.put(link_edit, xml_str, hatena_secret_keys)
+    else:
+        response = await client.post(xml_str, hatena_secret_keys)
+
+    logger.debug(f"Status: {response.status_code}")
+    if response.status_code == 201:
+        logger.warning("✓ はてなブログへ投稿成功")
+    elif response.status_code == 200:
+        logger.warning("✓ はてなブログの記事を更新")
+    else:
+        logger.error("✗ リクエスト中にエラー発生。はてなブログへ投稿できませんでした。")
     return response
 
 
-def parse_response(response: Response) -> dict[str, Any]:
-    """投稿結果を取得"""
+async def send_entry(
+    xml_str: str,
+    hatena_secret_keys: dict,
+    client: AtomPubClient | None = None,
+    index: PostIndex | None = None,
+    idempotency_key: str | None = None,
+) -> "httpx.Response":
+    """idempotency_keyが投稿済みの索引にあれば既存の記事を更新し、なければ新規投稿する"""
+    existing = index.get(idempotency_key) if index is not None and idempotency_key else None
+    if existing and existing.get("link_edit"):
+        logger.warning(f"同じ会話・モデルの要約は投稿済みのため、既存の記事を更新します: {existing['link_alternate']}")
+        response = await hatena_oauth(xml_str, hatena_secret_keys, client, link_edit=existing["link_edit"])
+        if response.status_code != 404:
+            return response
+        logger.warning("投稿済みの記事が見つからないため、新しく投稿します。")
+        index.discard(idempotency_key)
+    return await hatena_oauth(xml_str, hatena_secret_keys, client)
+
+
+def record_post(index: PostIndex | None, idempotency_key: str | None, result: dict) -> None:
+    """投稿・更新に成功した記事を索引に記録"""
+    if index is not None and idempotency_key and result["status_code"] in (200, 201):
+        index.put(idempotency_key, result)
+
+
+def parse_response(response: "Response") -> dict[str, Any]:
+    """投稿結果を取得（ElementTree版）
+
+    投稿ではatom.parse_entryを使う。この関数は結果が同じことを確かめるテスト・ベンチマークの比較用に残している
+    """
 
     # 名前空間
     NS = {"atom": "http://www.w3.org/2005/Atom", "app": "http://www.w3.org/2007/app"}
@@ -131,8 +241,14 @@ async def blog_post(
     author: str | None = None,
     updated: datetime | None = None,
     is_draft: bool = False,
+    client: AtomPubClient | None = None,
+    index: PostIndex | None = None,
+    idempotency_key: str | None = None,
 ) -> dict:
-    xml_entry = xml_unparser(title, content, categories, preset_categories, author, updated, is_draft)
-    res = await hatena_oauth(xml_entry, hatena_secret_keys)
+    """投稿結果を辞書で返す。indexとidempotency_keyを指定した場合、投稿済みの記事は新規投稿せずにPUTで更新"""
+    xml_entry = atom.render_entry(title, content, categories, preset_categories, author, updated, is_draft)
+    res = await send_entry(xml_entry, hatena_secret_keys, client, index, idempotency_key)
 
-    return parse_response(res)
+    result = atom.parse_entry(res.content, res.status_code)
+    record_post(index, idempotency_key, result)
+    return result
@@ -1,12 +1,48 @@
+from __future__ import annotations
+
+import asyncio
 import json
 import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from fastapi import UploadFile  # 型ヒントのみ。CLIではfastapiを読み込まない
 
-from fastapi import UploadFile
+from . import json_stream
+from .conversation_cache import ConversationCache, file_digest
+from .watermark import WatermarkStore, conversation_key
 
 logger = logging.getLogger(__name__)
 
+_process_pool: ProcessPoolExecutor | None = None
+
+
+def get_process_pool(max_workers: int | None = None) -> ProcessPoolExecutor:
+    """並列読み込み用のプロセスプールを取得（初回のみ作成）
+
+    max_workersは作成時だけ使う。作り直す場合はshutdown_process_pool()のあとに呼ぶ
+    """
+    global _process_pool
+    if _process_pool is None:
+        # スレッド併用中のforkを避ける（Windowsはspawnのみ）
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        _process_pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context(method))
+    elif max_workers is not None and max_workers != _process_pool._max_workers:
+        logger.debug(f"プロセスプールは作成済みのため、max_workers={max_workers}は無視します。")
+    return _process_pool
+
+
+def shutdown_process_pool() -> None:
+    """プロセスプールを停止（FastAPIのlifespan終了時やCLIの終了時）。作成していなければ何もしない"""
+    global _process_pool
+    pool, _process_pool = _process_pool, None
+    if pool is not None:
+        pool.shutdown(cancel_futures=True)
+
 
 ### ユーティリティ関数
 def ai_names_from_paths(paths: list[Path | UploadFile]) -> list:
@@ -51,6 +87,14 @@ def get_agent(message: dict, ai_name: str) -> str:
     return agent
 
 
+def format_message(message: dict, timestamp: str | None, ai_name: str) -> str:
+    """1件のメッセージをログの1ブロックに"""
+    agent = get_agent(message, ai_name)
+
+    text = message.get("say", "").replace("\n\n", "\n")
+    return f"date: {timestamp} \nagent: {agent}\n[message]\n{text} \n\n {'-' * 50}\n"
+
+
 def convert_to_str(messages: dict, ai_name: str) -> tuple[list, datetime | None]:
     """jsonの本丸を処理"""
 
@@ -74,60 +118,263 @@ def convert_to_str(messages: dict, ai_name: str) -> tuple[list, datetime | None]
                 if previous_dt - msg_dt > timedelta(hours=3):
                     break
 
-        agent = get_agent(message, ai_name)
-
-        text = message.get("say", "").replace("\n\n", "\n")
-        logs.append(f"date: {timestamp} \nagent: {agent}\n[message]\n{text} \n\n {'-' * 50}\n")
+        logs.append(format_message(message, timestamp, ai_name))
 
         if timestamp:
             previous_dt = msg_dt
     return logs, timestamp
 
 
-async def json_loader(paths: list[Path | UploadFile]) -> str:
-    """複数のjsonファイルをstrに"""
+def convert_since(messages: list, ai_name: str, since: datetime) -> tuple[list, str | None]:
+    """ウォーターマーク（投稿済みの最新時刻）より新しいメッセージだけを処理。既読に達した時点で打ち切る"""
 
-    logger.warning(f"{len(paths)}個のjsonファイルの読み込みを開始します")
+    logs = []
+    timestamp = None
 
-    conversations = []
-    ai_names = ai_names_from_paths(paths)
+    # 逆順
+    for message in reversed(messages):
+        timestamp = message.get("time", None)
+        if timestamp and datetime.strptime(timestamp, json_stream.DT_FORMAT) <= since:
+            break
+        logs.append(format_message(message, timestamp, ai_name))
 
-    # ファイルごとのループ
-    for idx, (path, ai_name) in enumerate(zip(paths, ai_names), 1):
-        filename = path.name if isinstance(path, Path) else path.filename
-        logger.warning(f"{idx}個目のファイルを読み込みます: {filename}")
+    logger.warning(f"{len(messages)}件中{len(logs)}件の新しいメッセージを処理中...")
+    return logs, timestamp
 
-        if isinstance(path, Path):
-            raw_text = path.read_text(encoding="utf-8")
-        else:
-            raw_text = (await path.read()).decode("utf-8")
-        try:
-            data = json.loads(raw_text)
-            messages = data["messages"]
 
-            # 会話の抽出→文字列へ
-            try:
-                logs, timestamp = convert_to_str(messages, ai_name)
-            except KeyError as e:
-                raise KeyError(f"エラー： jsonファイルの構成を確認してください - {path}") from e
+def latest_time(messages: list) -> datetime | None:
+    """時刻付きメッセージのうち最後のものの時刻"""
+    for message in reversed(messages):
+        if timestamp := message.get("time", None):
+            return datetime.strptime(timestamp, json_stream.DT_FORMAT)
+    return None
+
+
+def format_conversation(logs: list, timestamp: str | None, idx: int, filename: str) -> str:
+    """convert_to_strの結果を1つの会話テキストに整形"""
+    if timestamp is None:
+        logger.warning(f"{filename}の会話履歴に時刻情報がありません。すべての会話を取得しました。")
+
+    logs.append(f"{'=' * 20} {idx}個目の会話 {'=' * 20}\n\n")
+    conversation = "\n".join(logs[::-1])  # 順番を戻す
+    logger.warning(
+        f"{len(logs) - 1}件の発言を取得: {filename}\n"
+        f"{'=' * 25}最初のメッセージ{'=' * 25}\n{logs[-2][:100]}\n"
+        f"{'=' * 25}最後のメッセージ{'=' * 25}\n{logs[0][:100]}\n"
+        f"{'=' * 60}"
+    )
+    return conversation
+
+
+def plain_conversation(raw_text: str, idx: int) -> str:
+    """JSONでないファイルはそのまま会話として扱う"""
+    return f"{'=' * 20} {idx}個目の会話 {'=' * 20}\n\n" + raw_text
+
+
+async def read_text(path: Path | UploadFile) -> str:
+    if isinstance(path, Path):
+        return path.read_text(encoding="utf-8")
+    await path.seek(0)
+    return (await path.read()).decode("utf-8")
+
+
+def extract_logs(raw_text: str, ai_name: str, filename: str) -> tuple[list, str | None] | None:
+    """ファイル全体のテキストから(logs, timestamp)を抽出。JSONでない場合はNone"""
+    try:
+        data = json.loads(raw_text)
+    except json.JSONDecodeError:
+        return None
+
+    messages = data["messages"]
+
+    # 会話の抽出→文字列へ
+    try:
+        return convert_to_str(messages, ai_name)
+    except KeyError as e:
+        raise KeyError(f"エラー： jsonファイルの構成を確認してください - {filename}") from e
 
-            if timestamp is None:
-                print(f"{filename}の会話履歴に時刻情報がありません。すべての会話を取得しました。")
 
-            logs.append(f"{'=' * 20} {idx}個目の会話 {'=' * 20}\n\n")
-            conversation = "\n".join(logs[::-1])  # 順番を戻す
-            logger.warning(f"{len(logs) - 1}件の発言を取得: {filename}")
-            print(f"{'=' * 25}最初のメッセージ{'=' * 25}\n{logs[-2][:100]}")
-            print(f"{'=' * 25}最後のメッセージ{'=' * 25}\n{logs[0][:100]}")
-            print("=" * 60)
+def text_to_conversation(raw_text: str, idx: int, ai_name: str, filename: str) -> str:
+    """ファイル全体のテキストから会話を抽出"""
+    result = extract_logs(raw_text, ai_name, filename)
+    if result is None:
+        return plain_conversation(raw_text, idx)
+    return format_conversation(*result, idx, filename)
 
+
+async def stream_logs(path: Path | UploadFile, ai_name: str, filename: str) -> tuple[list, str | None] | None:
+    """ファイルを逐次読み込み、必要な範囲のメッセージだけから(logs, timestamp)を抽出。JSONでない場合はNone"""
+    try:
+        messages, _, total = await json_stream.load_messages(path)
+    except json.JSONDecodeError:
+        return None
+
+    logger.debug(f"全{total}件のメッセージのうち{len(messages)}件を保持: {filename}")
+    try:
+        return convert_to_str(messages, ai_name)
+    except KeyError as e:
+        raise KeyError(f"エラー： jsonファイルの構成を確認してください - {filename}") from e
+
+
+async def since_last_post_logs(
+    path: Path | UploadFile, ai_name: str, filename: str, watermarks: WatermarkStore, streaming: bool = False
+) -> tuple[list, str | None] | None:
+    """ウォーターマークより新しいメッセージから(logs, timestamp)を抽出し、今回の最新時刻を保留。JSONでない場合はNone
+
+    ウォーターマークがない会話（初回）は通常どおりconvert_to_strで抽出する。
+    キーは読み込み後のmetadataで決める（ストリーミングでmetadataがmessagesより後にあった場合は読み直す）
+    """
+    if streaming:
+        window_since = None
+
+        def window_factory(top_level: dict):
+            nonlocal window_since
+            window_since = watermarks.get(conversation_key(top_level.get("metadata", {})) or filename)
+            return json_stream.SinceWindow(window_since) if window_since else json_stream.MessageWindow()
+
+        try:
+            messages, top_level, _ = await json_stream.load_messages(path, window_factory)
+            since = watermarks.get(conversation_key(top_level.get("metadata", {})) or filename)
+            if messages and since != window_since:
+                logger.debug(f"metadataがmessagesより後にあるため、確定したキーで読み直します: {filename}")
+                messages, top_level, _ = await json_stream.load_messages(path, lambda _: window_factory(top_level))
+        except json.JSONDecodeError:
+            return None
+        metadata = top_level.get("metadata", {})
+    else:
+        try:
+            data = json.loads(await read_text(path))
         except json.JSONDecodeError:
-            conversation = f"{'=' * 20} {idx}個目の会話 {'=' * 20}\n\n"
-            conversation += path.read_text(encoding="utf-8")
+            return None
+        messages, metadata = data["messages"], data.get("metadata", {})
 
-        conversations.append(conversation)
-        ai_names.append(ai_name)
+    key = conversation_key(metadata) or filename
+    since = watermarks.get(key)
+    try:
+        logs, timestamp = convert_since(messages, ai_name, since) if since else convert_to_str(messages, ai_name)
+    except KeyError as e:
+        raise KeyError(f"エラー： jsonファイルの構成を確認してください - {filename}") from e
+
+    if (latest := latest_time(messages)) is not None:
+        watermarks.stage(key, latest)
+    return logs, timestamp
+
+
+async def cache_lookup(
+    cache: ConversationCache | None, path: Path | UploadFile, ai_name: str
+) -> tuple[str | None, tuple[list, str | None] | None]:
+    """(キャッシュキー, キャッシュ済みの(logs, timestamp))。キャッシュを使わない場合は(None, None)"""
+    if cache is None:
+        return None, None
+    key = cache.make_key(await file_digest(path), ai_name)
+    return key, cache.get(key)
+
+
+async def parallel_conversations(
+    paths: list[Path | UploadFile],
+    ai_names: list,
+    filenames: list,
+    max_workers: int | None = None,
+    cache: ConversationCache | None = None,
+) -> list[str]:
+    """ファイルを並行して読み込み、解析をプロセスプールで実行。結果は入力順"""
+    lookups = await asyncio.gather(*(cache_lookup(cache, path, ai_name) for path, ai_name in zip(paths, ai_names)))
+    misses = [i for i, (_, cached) in enumerate(lookups) if cached is None]
+
+    raw_texts = await asyncio.gather(
+        *(
+            asyncio.to_thread(paths[i].read_text, encoding="utf-8")
+            if isinstance(paths[i], Path)
+            else read_text(paths[i])
+            for i in misses
+        )
+    )
+
+    loop = asyncio.get_running_loop()
+    pool = get_process_pool(max_workers)
+    results = await asyncio.gather(
+        *(
+            loop.run_in_executor(pool, extract_logs, raw_text, ai_names[i], filenames[i])
+            for i, raw_text in zip(misses, raw_texts)
+        )
+    )
+
+    extracted = {i: cached for i, (_, cached) in enumerate(lookups) if cached is not None}
+    conversations = [None] * len(paths)
+    for i, raw_text, result in zip(misses, raw_texts, results):
+        if result is None:
+            conversations[i] = plain_conversation(raw_text, i + 1)
+            continue
+        key = lookups[i][0]
+        if key is not None:
+            cache.put(key, *result)
+        extracted[i] = result
+
+    for i, result in sorted(extracted.items()):
+        conversations[i] = format_conversation(*result, i + 1, filenames[i])
+    return conversations
+
+
+async def json_loader(
+    paths: list[Path | UploadFile],
+    streaming: bool = False,
+    parallel: bool = False,
+    max_workers: int | None = None,
+    cache: ConversationCache | None = None,
+    watermarks: WatermarkStore | None = None,
+) -> str:
+    """複数のjsonファイルをstrに
+
+    streaming=Trueの場合はファイル全体をメモリに載せず、要約に使う範囲のメッセージだけを保持する
+    parallel=Trueの場合はファイル全体を並行して読み込み、プロセスプールで処理する（streamingより優先）
+    cacheを渡した場合は内容が同じファイルの抽出結果を再利用する
+    watermarksを渡した場合は前回の投稿以降のメッセージだけを抽出する（parallel・cacheは使わない）
+    """
+
+    logger.warning(f"{len(paths)}個のjsonファイルの読み込みを開始します")
+
+    conversations = []
+    ai_names = ai_names_from_paths(paths)
+    filenames = [path.name if isinstance(path, Path) else path.filename for path in paths]
+    hits_before = cache.hits if cache is not None else 0
+
+    if parallel and watermarks is None:
+        conversations = await parallel_conversations(paths, ai_names, filenames, max_workers, cache)
+    else:
+        # ファイルごとのループ
+        for idx, (path, ai_name, filename) in enumerate(zip(paths, ai_names, filenames), 1):
+            logger.warning(f"{idx}個目のファイルを読み込みます: {filename}")
+
+            raw_text = None
+            if watermarks is not None:
+                # 結果がウォーターマークに依存するため会話キャッシュは使わない
+                result = await since_last_post_logs(path, ai_name, filename, watermarks, streaming)
+            else:
+                key, result = await cache_lookup(cache, path, ai_name)
+                if result is None:
+                    if streaming:
+                        result = await stream_logs(path, ai_name, filename)
+                    else:
+                        raw_text = await read_text(path)
+                        result = extract_logs(raw_text, ai_name, filename)
+                    if result is not None and key is not None:
+                        cache.put(key, *result)
+
+            if result is None:
+                raw_text = raw_text if raw_text is not None else await read_text(path)
+                conversations.append(plain_conversation(raw_text, idx))
+                continue
+            if not result[0]:
+                logger.warning(f"前回の投稿以降の新しいメッセージはありません: {filename}")
+                continue
+
+            conversations.append(format_conversation(*result, idx, filename))
 
+    if cache is not None and watermarks is None:
+        hits = cache.hits - hits_before
+        logger.warning(
+            f"会話キャッシュ: {len(paths)}件中{hits}件ヒット（累計 ヒット{cache.hits}件/ミス{cache.misses}件）"
+        )
     logger.warning(f"☑ {len(paths)}件のjsonファイルをテキストに変換しました。\n")
 
     return "\n\n\n".join(conversations)
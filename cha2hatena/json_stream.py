@@ -0,0 +1,287 @@
+from __future__ import annotations
+
+import codecs
+import json
+import logging
+from collections.abc import AsyncIterator, Callable
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from fastapi import UploadFile  # 型ヒントのみ。CLIではfastapiを読み込まない
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024  # 1回に読み込むバイト数
+DT_FORMAT = "%Y/%m/%d %H:%M:%S"
+MAX_GAP = timedelta(hours=3)
+
+_MISSING = object()
+
+
+class MessagesStreamParser:
+    """トップレベルのJSONオブジェクトを逐次解析し、`messages`配列の要素を1件ずつ取り出す"""
+
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._buf = ""
+        self._pos = 0
+        self._state = "start"
+        self._key = None
+        self.metadata = {}  # messages以外のトップレベルの値
+        self.found_messages = False
+
+    def feed(self, text: str) -> list[dict]:
+        """テキストの断片を追加し、読み終えたメッセージを返す"""
+        return self._parse(text, eof=False)
+
+    def close(self) -> list[dict]:
+        """入力の終端。JSONが閉じていなければJSONDecodeError"""
+        items = self._parse("", eof=True)
+        if self._state != "end":
+            raise json.JSONDecodeError("JSONが途中で終了しています", self._buf, self._pos)
+        return items
+
+    def _parse(self, text: str, eof: bool) -> list[dict]:
+        # 読み終えた部分を捨ててからバッファに追加
+        self._buf = self._buf[self._pos :] + text
+        self._pos = 0
+        items = []
+        while self._step(items, eof):
+            pass
+        return items
+
+    def _error(self, msg: str):
+        raise json.JSONDecodeError(msg, self._buf, self._pos)
+
+    def _skip_ws(self) -> str | None:
+        buf, pos = self._buf, self._pos
+        while pos < len(buf) and buf[pos] in " \t\r\n":
+            pos += 1
+        self._pos = pos
+        return buf[pos] if pos < len(buf) else None
+
+    def _decode(self, eof: bool):
+        """現在位置のJSON値を1つ読み取る。データが足りない場合は_MISSING"""
+        try:
+            value, end = self._decoder.raw_decode(self._buf, self._pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            return _MISSING
+        if end == len(self._buf) and not eof:
+            return _MISSING  # 数値などが断片の境界で切れている可能性
+        self._pos = end
+        return value
+
+    def _step(self, items: list, eof: bool) -> bool:
+        ch = self._skip_ws()
+        if ch is None:
+            return False
+        state = self._state
+
+        if state == "start":
+            if ch != "{":
+                self._error("トップレベルがJSONオブジェクトではありません")
+            self._pos += 1
+            self._state = "first_key"
+        elif state in ("first_key", "key"):
+            if ch == "}" and state == "first_key":
+                self._pos += 1
+                self._state = "end"
+                return True
+            if ch != '"':
+                self._error("キーが文字列ではありません")
+            key = self._decode(eof)
+            if key is _MISSING:
+                return False
+            self._key = key
+            self._state = "colon"
+        elif state == "colon":
+            if ch != ":":
+                self._error("':'が必要です")
+            self._pos += 1
+            self._state = "value"
+        elif state == "value":
+            if self._key == "messages" and ch == "[":
+                self._pos += 1
+                self.found_messages = True
+                self._state = "first_item"
+            else:
+                value = self._decode(eof)
+                if value is _MISSING:
+                    return False
+                self.metadata[self._key] = value
+                self._state = "next_key"
+        elif state in ("first_item", "item"):
+            if ch == "]" and state == "first_item":
+                self._pos += 1
+                self._state = "next_key"
+                return True
+            value = self._decode(eof)
+            if value is _MISSING:
+                return False
+            items.append(value)
+            self._state = "item_sep"
+        elif state == "item_sep":
+            if ch == ",":
+                self._state = "item"
+            elif ch == "]":
+                self._state = "next_key"
+            else:
+                self._error("','または']'が必要です")
+            self._pos += 1
+        elif state == "next_key":
+            if ch == ",":
+                self._state = "key"
+            elif ch == "}":
+                self._state = "end"
+            else:
+                self._error("','または'}'が必要です")
+            self._pos += 1
+        else:
+            self._error("余分なデータがあります")
+        return True
+
+
+class MessageWindow:
+    """convert_to_strが保持する範囲のメッセージだけを逐次的に残す
+
+    convert_to_strは最新のメッセージから遡り、「最新と別の日付」かつ「次のメッセージまで3時間以上空いた」
+    メッセージで打ち切る。打ち切り候補（3時間以上空いたメッセージ）のうち、最新の候補と別の日付を持つ
+    直近の候補より前は最終的に不要になるため破棄する。
+    """
+
+    def __init__(self):
+        self.messages = []  # 先頭は打ち切り候補の場合がある
+        self.count = 0
+        self._last_ts = None  # (位置, datetime) 直近の時刻付きメッセージ
+        self._cut = None  # (位置, date) 最新の打ち切り候補
+        self._last_dt = None  # 最後のメッセージの時刻
+
+    def append(self, message: dict) -> None:
+        self.count += 1
+        timestamp = message.get("time", None)
+        msg_dt = datetime.strptime(timestamp, DT_FORMAT) if timestamp else None
+
+        if msg_dt is not None and self._last_ts is not None:
+            pos, previous_dt = self._last_ts
+            if msg_dt - previous_dt > MAX_GAP:
+                self._add_cut(pos, previous_dt.date())
+
+        self.messages.append(message)
+        if msg_dt is not None:
+            self._last_ts = (len(self.messages) - 1, msg_dt)
+        self._last_dt = msg_dt
+
+    def _add_cut(self, pos: int, date) -> None:
+        if self._cut is not None and self._cut[1] != date:
+            # ひとつ前の候補より前は、最新の日付がどちらであっても使われない
+            drop = self._cut[0]
+            del self.messages[:drop]
+            pos -= drop
+        self._cut = (pos, date)
+
+    def window(self) -> list[dict] | None:
+        """convert_to_strへ渡すメッセージ列。最後のメッセージに時刻がない場合は全件が必要なためNone"""
+        if self._last_dt is None:
+            return None
+        if self._cut is not None and self._cut[1] != self._last_dt.date():
+            return self.messages[self._cut[0] :]
+        return self.messages
+
+
+class SinceWindow:
+    """ウォーターマークより新しいメッセージだけを逐次的に残す
+
+    convert_sinceと同じ結果になるよう、直近の既読メッセージを先頭に1件だけ保持する
+    """
+
+    def __init__(self, since: datetime):
+        self.since = since
+        self.messages = []
+        self.count = 0
+
+    def append(self, message: dict) -> None:
+        self.count += 1
+        timestamp = message.get("time", None)
+        if timestamp and datetime.strptime(timestamp, DT_FORMAT) <= self.since:
+            self.messages = [message]
+            return
+        self.messages.append(message)
+
+    def window(self) -> list[dict]:
+        return self.messages
+
+
+def read_metadata(path: Path, chunk_size: int | None = None) -> dict:
+    """messages以外のトップレベルの値だけを逐次読み込みで取り出す（メッセージは保持しない）
+
+    metadataを読んだ時点で読み込みをやめる。messagesより後にある場合は最後まで読む
+    """
+    parser = MessagesStreamParser()
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    with path.open("rb") as f:
+        while chunk := f.read(chunk_size or CHUNK_SIZE):
+            parser.feed(decoder.decode(chunk))
+            if "metadata" in parser.metadata:
+                return parser.metadata
+    parser.feed(decoder.decode(b"", final=True))
+    parser.close()
+    return parser.metadata
+
+
+async def iter_text_chunks(path: Path | UploadFile, chunk_size: int | None = None) -> AsyncIterator[str]:
+    """ファイルをUTF-8テキストの断片として順に返す"""
+    chunk_size = chunk_size or CHUNK_SIZE
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    if isinstance(path, Path):
+        with path.open("rb") as f:
+            while chunk := f.read(chunk_size):
+                yield decoder.decode(chunk)
+    else:
+        await path.seek(0)
+        while chunk := await path.read(chunk_size):
+            yield decoder.decode(chunk)
+    yield decoder.decode(b"", final=True)
+
+
+async def _iter_messages(path: Path | UploadFile, parser: MessagesStreamParser) -> AsyncIterator[dict]:
+    async for text in iter_text_chunks(path):
+        for message in parser.feed(text):
+            yield message
+    for message in parser.close():
+        yield message
+
+
+async def load_messages(
+    path: Path | UploadFile, window_factory: Callable[[dict], MessageWindow | SinceWindow] | None = None
+) -> tuple[list[dict], dict, int]:
+    """ストリーミングで読み込み、convert_to_str（またはconvert_since）に必要なメッセージだけを返す
+
+    Args:
+        window_factory: 最初のメッセージの直前までに読んだトップレベルの値（metadata等）を受け取り、
+            使用するウィンドウを返す（messagesより後にある値は含まれない）。Noneの場合はMessageWindow
+
+    Returns:
+        (メッセージのリスト, messages以外のトップレベルの値, 全メッセージ数)
+    """
+    parser = MessagesStreamParser()
+    window = None
+    async for message in _iter_messages(path, parser):
+        if window is None:
+            window = window_factory(parser.metadata) if window_factory else MessageWindow()
+        window.append(message)
+    if not parser.found_messages:
+        raise KeyError("messages")
+    if window is None:
+        window = MessageWindow()
+
+    messages = window.window()
+    if messages is None:
+        # 最後のメッセージに時刻がない場合はすべての会話を取得する
+        logger.debug("最新メッセージに時刻情報がないため、全件を再読み込みします")
+        messages = [message async for message in _iter_messages(path, MessagesStreamParser())]
+
+    return messages, parser.metadata, window.count
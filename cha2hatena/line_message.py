@@ -1,11 +1,16 @@
+import asyncio
+import json
 import logging
-
-import requests
+import random
+import uuid
+from contextlib import asynccontextmanager
 
 logger = logging.getLogger(__name__)
 
 
 def line_messenger(content: str, line_access_token: str):
+    import requests  # 通知時のみ読み込む
+
     URL = r"https://api.line.me/v2/bot/message/broadcast"
 
     logger.debug(f"LINEアクセストークン: ... {line_access_token[-5:]}")
@@ -31,3 +36,141 @@ def line_messenger(content: str, line_access_token: str):
             logger.info(f"{res_dict['details'][0]['message']}")
         except Exception:
             logger.info("レスポンス内容を解析できませんでした。")
+
+
+LINE_API = "https://api.line.me"
+MAX_MESSAGES_PER_REQUEST = 5  # broadcastで1回に送れるメッセージ数の上限
+MAX_TEXT_LENGTH = 5000  # テキストメッセージ1件の最大文字数
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class LineNotifier:
+    """LINEへのbroadcastを共有のhttpx.AsyncClientで非同期に送る
+
+    batch()の間に追加した通知はためておき、終了時に5件ずつまとめて1回のbroadcastで送る。
+    429・5xx・通信エラーはX-Line-Retry-Keyを付けてバックオフしながら再送する（同じリクエストの重複配信を防ぐ）。
+    stub=Trueの場合はLINEに送らず、送信内容をsentに記録する（テスト・ローカル確認用）
+    """
+
+    def __init__(
+        self,
+        access_token: str,
+        endpoint: str = LINE_API,
+        stub: bool = False,
+        max_retries: int = 3,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+        timeout: float = 10.0,
+        transport=None,
+    ):
+        self.access_token = access_token
+        self.url = endpoint.rstrip("/") + "/v2/bot/message/broadcast"
+        self.stub = stub
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.transport = transport
+        self.sent: list[list[dict]] = []  # stub時に送信したリクエストごとのメッセージ
+        self._client = None
+        self._pending: list[str] | None = None  # batch()の間にためている通知
+
+    @property
+    def enabled(self) -> bool:
+        return self.stub or bool(self.access_token)
+
+    def _http(self):
+        if self._client is None:
+            import httpx  # 通知時のみ読み込む
+
+            transport = self.transport
+            if transport is None and self.stub:
+                transport = httpx.MockTransport(self._stub_handler)
+            self._client = httpx.AsyncClient(transport=transport, timeout=self.timeout)
+        return self._client
+
+    def _stub_handler(self, request):
+        import httpx
+
+        messages = json.loads(request.content)["messages"]
+        self.sent.append(messages)
+        logger.warning(f"[LINEスタブ] {len(messages)}件のメッセージを受け付けました。")
+        return httpx.Response(200, json={})
+
+    async def notify(self, text: str) -> None:
+        """通知を送る。batch()の間はためておき、終了時にまとめて送る"""
+        if self._pending is not None:
+            self._pending.append(text)
+            return
+        await self.broadcast([text])
+
+    @asynccontextmanager
+    async def batch(self):
+        """この間の通知を1回（5件ごと）のbroadcastにまとめる。送信の失敗はログに残して呼び出し元には伝えない"""
+        outer, self._pending = self._pending, []
+        try:
+            yield self
+        finally:
+            pending, self._pending = self._pending, outer
+            if pending:
+                try:
+                    await self.broadcast(pending)
+                except Exception as e:
+                    logger.error(f"まとめたLINE通知を送れませんでした: {e!r}")
+                    logger.info("詳細: ", exc_info=True)
+
+    async def broadcast(self, texts: list[str]) -> None:
+        """textsを5件ずつのbroadcastで送る"""
+        if not self.enabled:
+            logger.warning("LINEのアクセストークンがないため、通知を送りません。")
+            return
+        for i in range(0, len(texts), MAX_MESSAGES_PER_REQUEST):
+            messages = [
+                {"type": "text", "text": text[:MAX_TEXT_LENGTH]} for text in texts[i : i + MAX_MESSAGES_PER_REQUEST]
+            ]
+            await self._send(messages)
+        logger.warning(f"✓ LINE通知に成功しました（{len(texts)}件）。")
+
+    async def _send(self, messages: list[dict]) -> None:
+        import httpx
+
+        headers = {"Authorization": f"Bearer {self.access_token}", "X-Line-Retry-Key": str(uuid.uuid4())}
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            try:
+                res = await self._http().post(self.url, headers=headers, json={"messages": messages})
+            except httpx.TransportError as e:
+                if attempt == self.max_retries:
+                    raise
+                logger.warning(f"LINE通知中に通信エラーが発生しました: {e!r}")
+            else:
+                # 409は同じX-Line-Retry-Keyのリクエストが受け付け済み（前回の再送が届いていた）
+                if res.status_code in (200, 409):
+                    return
+                if res.status_code not in RETRYABLE_STATUS or attempt == self.max_retries:
+                    logger.error(f"LINE通知出来ませんでした。ステータスコード：{res.status_code}")
+                    logger.info(f"詳細: {res.text}")
+                    raise RuntimeError(f"LINE通知に失敗しました（ステータス: {res.status_code}）")
+                retry_after = res.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                delay = min(float(retry_after), self.max_delay)
+            else:
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+            logger.warning(f"{delay:.1f}秒後にLINE通知を再送します（{attempt + 1}/{self.max_retries}）")
+            await asyncio.sleep(delay)
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            client, self._client = self._client, None
+            await client.aclose()
+
+
+def line_notifier_from_config(config: dict, access_token: str) -> LineNotifier:
+    """config.yamlのlineから作成"""
+    line_config = config.get("line") or {}
+    return LineNotifier(
+        access_token,
+        endpoint=line_config.get("endpoint") or LINE_API,
+        stub=line_config.get("stub", False),
+        max_retries=line_config.get("max_retries", 3),
+    )
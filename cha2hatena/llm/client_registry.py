@@ -0,0 +1,61 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEEPSEEK_BASE_URL = "https://api.deepseek.com"
+
+
+class ClientRegistry:
+    """プロバイダ・APIキー・ベースURLごとにAPIクライアントを1つだけ作成して使い回す
+
+    リクエストごとのTLSハンドシェイクと接続プールの作り直しを避ける。クライアントは初回利用時に作成し、
+    aclose()でまとめて閉じる（FastAPIのlifespan終了時やCLIの終了時）
+    """
+
+    def __init__(self):
+        self._clients: dict[tuple[str, str, str | None], object] = {}
+
+    def openai(self, api_key: str, base_url: str = DEEPSEEK_BASE_URL):
+        """OpenAI互換API（Deepseek）のAsyncOpenAI"""
+        key = ("openai", api_key, base_url)
+        if key not in self._clients:
+            from openai import AsyncOpenAI
+
+            logger.debug(f"AsyncOpenAIクライアントを作成: {base_url} ...{api_key[-5:]}")
+            self._clients[key] = AsyncOpenAI(api_key=api_key, base_url=base_url)
+        return self._clients[key]
+
+    def genai(self, api_key: str):
+        """Gemini APIのgenai.Client"""
+        key = ("genai", api_key, None)
+        if key not in self._clients:
+            from google import genai
+
+            logger.debug(f"genaiクライアントを作成: ...{api_key[-5:]}")
+            self._clients[key] = genai.Client(api_key=api_key)
+        return self._clients[key]
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    async def aclose(self) -> None:
+        """保持しているクライアントの接続をすべて閉じる
+
+        作成はawaitを挟まないため、先に入れ替えておけば閉じている間に作成されたクライアントは次回に閉じられる
+        """
+        clients, self._clients = self._clients, {}
+        for (provider, _, _), client in clients.items():
+            try:
+                if provider == "openai":
+                    await client.close()
+                else:
+                    await client.aio.aclose()
+                    client.close()
+            except Exception:
+                logger.warning(f"{provider}クライアントを閉じる際にエラーが発生しました。", exc_info=True)
+        if clients:
+            logger.debug(f"{len(clients)}個のAPIクライアントを閉じました。")
+
+
+# アプリケーション全体で共有するレジストリ
+registry = ClientRegistry()
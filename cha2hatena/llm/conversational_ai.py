@@ -1,17 +1,34 @@
 import json
 import logging
-import sys
 import time
 import asyncio
 from abc import ABC, abstractmethod
+from collections.abc import AsyncIterator
 from pathlib import Path
 from typing import List
 
 from pydantic import BaseModel, Field
 from .llm_stats import TokenStats
+from .partial_json import PartialJsonParser
+from .rate_limiter import get_limiter
+from .response_cache import ResponseCache
+from .token_estimator import EXPECTED_OUTPUT_TOKENS, get_estimator
 
 logger = logging.getLogger(__name__)
 
+RATE_LIMIT_BACKOFF = 20  # 429を受けたときの待機秒数（リトライごとに増やす）
+
+
+class ProviderUnavailable(Exception):
+    """5xxやタイムアウトが続き、プロバイダから応答を得られない（別のプロバイダへ切り替え可能）"""
+
+
+class FatalLlmError(Exception):
+    """APIキー・残高・リクエストの誤りや出力の形式の誤り。リトライ・切り替えでは解決しないため要約を中止する
+
+    sys.exitと違いタスクの中で発生しても呼び出し元で捕捉できる（バッチ・ジョブではその項目だけを失敗にする）
+    """
+
 
 class LlmConfig(BaseModel):
     prompt: str = Field(min_length=1, description="AIに送るプロンプト")
@@ -38,6 +55,10 @@ class ConversationalAi(ABC):
         self.api_key = config.api_key
         self.temperature = config.temperature
         self.company_name = "Google" if self.model.startswith("gemini") else "Deepseek"
+        self.provider = "gemini" if self.model.startswith("gemini") else "deepseek"
+        self.limiter = get_limiter(self.provider, self.api_key)
+        self.max_retries = 3  # 5xx・429のリトライ回数（フェイルオーバー時は少なくする）
+        self.stream_stats: TokenStats | None = None
         STATEMENT = (
             f"またその最後には、「この記事は {self.model} により自動生成されています」と目立つように注記してください。"
         )
@@ -47,20 +68,84 @@ class ConversationalAi(ABC):
     async def get_summary(self) -> tuple[dict, TokenStats]:
         pass
 
+    async def summarize(
+        self, cache: ResponseCache | None = None, force_refresh: bool = False
+    ) -> tuple[dict, TokenStats]:
+        """応答キャッシュにあればAPIを呼ばずに返す。force_refresh=Trueの場合は必ず再生成"""
+        if cache is None:
+            return await self.get_summary()
+
+        # get_summaryの中でプロンプトが書き換わる場合があるため先にキーを作る
+        key = cache.make_key(self.prompt, self.model, self.temperature)
+        if not force_refresh and (cached := cache.get(key)) is not None:
+            logger.warning(f"{self.model}の応答をキャッシュから取得しました（API料金は発生しません）。")
+            return cached
+
+        data, stats = await self.get_summary()
+        cache.put(key, data, stats)
+        return data, stats
+
+    @abstractmethod
+    def stream_deltas(self) -> AsyncIterator[str]:
+        """生成されたテキストを差分ごとに返す。終了後はself.stream_statsにTokenStatsを設定"""
+
+    def estimated_stream_stats(self, text: str) -> TokenStats:
+        """ストリームの最後に使用量が届かなかった場合（プロキシ・途中終了など）のTokenStats（見積もり）"""
+        logger.warning(
+            f"{self.company_name}のストリームに使用量が含まれていませんでした。トークン数は見積もりで記録します。"
+        )
+        estimator = get_estimator(self.model)
+        return TokenStats(
+            estimator.count(self.prompt), 0, estimator.count(text), len(self.prompt), len(text), self.model
+        )
+
+    async def stream_summary(
+        self, cache: ResponseCache | None = None, force_refresh: bool = False
+    ) -> AsyncIterator[tuple[str, object]]:
+        """生成途中のBlogPostの辞書を("partial", dict)で順に返し、最後に検証済みの("done", (data, stats))を返す"""
+        key = cache.make_key(self.prompt, self.model, self.temperature) if cache is not None else None
+        if cache is not None and not force_refresh and (cached := cache.get(key)) is not None:
+            logger.warning(f"{self.model}の応答をキャッシュから取得しました（API料金は発生しません）。")
+            yield "done", cached
+            return
+
+        parser = PartialJsonParser()
+        async for delta in self.stream_deltas():
+            if (partial := parser.feed(delta)) is not None:
+                yield "partial", partial
+
+        data = self.check_response(parser.text)
+        if cache is not None:
+            cache.put(key, data, self.stream_stats)
+        yield "done", (data, self.stream_stats)
+
+    def estimated_tokens(self) -> int:
+        """レート制限（TPM）用の見積もり。入力に加えて出力ぶんも見込む"""
+        return get_estimator(self.model).count(self.prompt) + EXPECTED_OUTPUT_TOKENS
+
+    def handle_rate_limit(self, i, max_retries, e: Exception):
+        """429の場合は失敗させず、同じプロバイダへの後続リクエストごと待たせてからリトライ"""
+        if i < max_retries - 1:
+            wait = RATE_LIMIT_BACKOFF * (i + 1)
+            logger.warning(f"{self.company_name}のAPIレート制限。{wait}秒後にリトライします。")
+            self.limiter.backoff(wait)
+        else:
+            logger.error("APIレート制限。しばらく経ってから再実行してください。")
+            raise e
+
     async def handle_server_error(self, i, max_retries):
         if i < max_retries - 1:
             logger.warning(f"{self.company_name}の計算資源が逼迫しているようです。{5 * (i + 1)}秒後にリトライします。")
             await asyncio.sleep(5 * (i + 1))
         else:
             logger.warning(f"{self.company_name}は現在過負荷のようです。少し時間をおいて再実行する必要があります。")
-            logger.warning("実行を中止します。")
-            sys.exit(1)
+            raise ProviderUnavailable(f"{self.model}から応答を得られませんでした。")
 
     def handle_client_error(self, e: Exception):
         logger.error("エラー：APIレート制限。")
         logger.error("詳細はapp.logを確認してください。実行を中止します。")
         logger.info(f"詳細: {e}")
-        sys.exit(1)
+        raise FatalLlmError(f"{self.company_name}のAPIがリクエストを受け付けませんでした: {e}") from e
 
     def handle_unexpected_error(self, e: Exception):
         logger.error("要約取得中に予期せぬエラー発生。詳細はapp.logを確認してください。")
@@ -82,6 +167,6 @@ class ConversationalAi(ABC):
             file_path.write_text(response_text, encoding="utf-8")
 
             logger.error(f"{file_path}へ出力を保存しました。")
-            sys.exit(1)
+            raise FatalLlmError(f"{self.model}の出力をJSONとして読み込めませんでした。") from None
 
         return data
@@ -1,55 +1,62 @@
 import logging
-import sys
 
-from .conversational_ai import BlogPost, ConversationalAi, TokenStats
+from .client_registry import DEEPSEEK_BASE_URL, registry
+from .conversational_ai import BlogPost, ConversationalAi, FatalLlmError, TokenStats
 
 logger = logging.getLogger(__name__)
 
 
 class DeepseekClient(ConversationalAi):
-    async def get_summary(self) -> tuple[dict, TokenStats]:
-        from openai import AsyncOpenAI
-
+    def prompt_with_schema(self) -> str:
+        """JSONのスキーマを先頭に付けたプロンプト。self.promptは変更しない（リトライや再実行で重複させない）"""
         statement = f"次の行から示すプロンプトはこのPydanticモデルに合うJSONで出力してください: {BlogPost.model_json_schema()}\n"
-        self.prompt = statement + self.prompt
+        return statement + self.prompt
+
+    async def handle_api_error(self, i, max_retries, e: Exception):
+        from openai import APITimeoutError
+
+        # https://api-docs.deepseek.com/quick_start/error_codes
+        if isinstance(e, APITimeoutError) or any(str(code) in str(e) for code in [500, 502, 503]):
+            await super().handle_server_error(i, max_retries)
+        elif "429" in str(e):
+            super().handle_rate_limit(i, max_retries, e)
+        elif "401" in str(e):
+            logger.error("エラー：APIキーが誤っているか、入力されていません。")
+            logger.error(f"実行を中止します。詳細：{e}")
+            raise FatalLlmError("DeepseekのAPIキーが誤っているか、入力されていません。") from e
+        elif "402" in str(e):
+            logger.error("残高が不足しているようです。アカウントを確認してください。")
+            logger.error(f"実行を中止します。詳細：{e}")
+            raise FatalLlmError("Deepseekの残高が不足しています。") from e
+        elif "422" in str(e):
+            logger.error("リクエストに無効なパラメータが含まれています。設定を見直してください。")
+            logger.error(f"実行を中止します。詳細：{e}")
+            raise FatalLlmError("Deepseekへのリクエストに無効なパラメータが含まれています。") from e
+        else:
+            super().handle_unexpected_error(e)
+
+    async def get_summary(self) -> tuple[dict, TokenStats]:
+        prompt = self.prompt_with_schema()
 
         logger.warning("Deepseekからの応答を待っています。")
         logger.debug(f"APIリクエスト中。APIキー: ...{self.api_key[-5:]}")
 
-        client = AsyncOpenAI(api_key=self.api_key, base_url="https://api.deepseek.com")
+        client = registry.openai(self.api_key, DEEPSEEK_BASE_URL)
 
-        max_retries = 3
+        max_retries = self.max_retries
         for i in range(max_retries):
             try:
-                response = await client.chat.completions.create(
-                    model=self.model,
-                    temperature=self.temperature,
-                    messages=[{"role": "user", "content": self.prompt}],
-                    response_format={"type": "json_object"},
-                    stream=False,
-                )
+                async with self.limiter.limit(self.estimated_tokens()):
+                    response = await client.chat.completions.create(
+                        model=self.model,
+                        temperature=self.temperature,
+                        messages=[{"role": "user", "content": prompt}],
+                        response_format={"type": "json_object"},
+                        stream=False,
+                    )
                 break
             except Exception as e:
-                # https://api-docs.deepseek.com/quick_start/error_codes
-                if any(code in str(e) for code in [500, 502, 503]):
-                    await super().handle_server_error(i, max_retries)
-                elif "429" in str(e):
-                    logger.error("APIレート制限。しばらく経ってから再実行してください。")
-                    raise
-                elif "401" in str(e):
-                    logger.error("エラー：APIキーが誤っているか、入力されていません。")
-                    logger.error(f"実行を中止します。詳細：{e}")
-                    sys.exit(1)
-                elif "402" in str(e):
-                    logger.error("残高が不足しているようです。アカウントを確認してください。")
-                    logger.error(f"実行を中止します。詳細：{e}")
-                    sys.exit(1)
-                elif "422" in str(e):
-                    logger.error("リクエストに無効なパラメータが含まれています。設定を見直してください。")
-                    logger.error(f"実行を中止します。詳細：{e}")
-                    sys.exit(1)
-                else:
-                    super().handle_unexpected_error(e)
+                await self.handle_api_error(i, max_retries, e)
 
         generated_text = response.choices[0].message.content
         data = super().check_response(generated_text)
@@ -58,9 +65,56 @@ class DeepseekClient(ConversationalAi):
             response.usage.prompt_tokens,
             getattr(response.usage.completion_tokens_details, "reasoning_tokens", 0),
             response.usage.completion_tokens,
-            len(self.prompt),
+            len(prompt),
             len(generated_text),
             self.model,
+            getattr(response.usage, "prompt_cache_hit_tokens", 0) or 0,
         )
 
         return data, stats
+
+    async def stream_deltas(self):
+        prompt = self.prompt_with_schema()
+
+        logger.warning("Deepseekからの応答を待っています（ストリーミング）。")
+        client = registry.openai(self.api_key, DEEPSEEK_BASE_URL)
+
+        max_retries = self.max_retries
+        for i in range(max_retries):
+            deltas = []
+            usage = None
+            try:
+                async with self.limiter.limit(self.estimated_tokens()):
+                    stream = await client.chat.completions.create(
+                        model=self.model,
+                        temperature=self.temperature,
+                        messages=[{"role": "user", "content": prompt}],
+                        response_format={"type": "json_object"},
+                        stream=True,
+                        stream_options={"include_usage": True},
+                    )
+                    async for chunk in stream:
+                        if chunk.usage is not None:
+                            usage = chunk.usage  # 最後のチャンクにだけ含まれる
+                        if chunk.choices and (delta := chunk.choices[0].delta.content):
+                            deltas.append(delta)
+                            yield delta
+                break
+            except Exception as e:
+                if deltas:
+                    raise  # 途中まで返した後はリトライできない
+                await self.handle_api_error(i, max_retries, e)
+
+        text = "".join(deltas)
+        if usage is None:
+            self.stream_stats = self.estimated_stream_stats(text)
+            return
+        self.stream_stats = TokenStats(
+            usage.prompt_tokens,
+            getattr(usage.completion_tokens_details, "reasoning_tokens", 0),
+            usage.completion_tokens,
+            len(prompt),
+            len(text),
+            self.model,
+            getattr(usage, "prompt_cache_hit_tokens", 0) or 0,
+        )
@@ -0,0 +1,153 @@
+import asyncio
+import logging
+from collections.abc import AsyncIterator, Callable
+
+from .conversational_ai import ConversationalAi, LlmConfig, ProviderUnavailable
+from .deepseek_client import DeepseekClient
+from .gemini_client import GeminiClient
+from .llm_stats import TokenStats
+from .response_cache import ResponseCache
+
+logger = logging.getLogger(__name__)
+
+# フェイルオーバーの対象とする例外（5xx・タイムアウト）。APIキーの誤りなどは切り替えても解決しないため対象外
+FAILOVER_ERRORS = (ProviderUnavailable, TimeoutError)
+
+
+def provider_of(model: str) -> str:
+    return "gemini" if model.startswith("gemini") else "deepseek"
+
+
+def create_client(config: LlmConfig) -> ConversationalAi:
+    """モデル名からクライアントを作成"""
+    if config.model.startswith("gemini"):
+        return GeminiClient(config)
+    if config.model.startswith("deepseek"):
+        return DeepseekClient(config)
+    raise ValueError(f"モデル名が正しくありません: {config.model}")
+
+
+class FailoverClient:
+    """モデルの候補を順に試して要約を取得する（ConversationalAiと同じくprompt・summarizeを持つ）
+
+    5xxやタイムアウトで応答がなければ次の候補へ切り替える。hedge_afterを指定した場合は、
+    その秒数までに応答がなければ次の候補にも並行してリクエストし、先に返ってきた応答を使う。
+    TokenStatsは実際に応答したクライアントのものをそのまま返す
+    """
+
+    def __init__(
+        self,
+        config: LlmConfig,
+        client_factory: Callable[[LlmConfig], ConversationalAi] = create_client,
+        fallback_models: list[str] | None = None,
+        api_keys: dict[str, str] | None = None,
+        hedge_after: float | None = None,
+        timeout: float | None = None,
+        retries_per_model: int | None = None,
+    ):
+        self.model = config.model
+        self.hedge_after = hedge_after
+        self.timeout = timeout
+        api_keys = {provider_of(config.model): config.api_key} | {k: v for k, v in (api_keys or {}).items() if v}
+
+        self.clients: list[ConversationalAi] = []
+        for model in dict.fromkeys([config.model, *(fallback_models or [])]):
+            if model == config.model:
+                api_key = config.api_key
+            elif provider_of(model) in api_keys:
+                api_key = api_keys[provider_of(model)]
+            else:
+                logger.warning(f"{model}のAPIキーがないため、フェイルオーバーの候補から外します。")
+                continue
+            client = client_factory(config.model_copy(update={"model": model, "api_key": api_key}))
+            if retries_per_model is not None and fallback_models:
+                client.max_retries = retries_per_model  # 同じプロバイダで粘らず早めに切り替える
+            self.clients.append(client)
+
+    @property
+    def prompt(self) -> str:
+        return self.clients[0].prompt
+
+    @prompt.setter
+    def prompt(self, value: str) -> None:
+        for client in self.clients:
+            client.prompt = value
+
+    async def _request(self, client: ConversationalAi, cache: ResponseCache | None, force_refresh: bool):
+        coro = client.summarize(cache, force_refresh)
+        if self.timeout is None:
+            return await coro
+        try:
+            return await asyncio.wait_for(coro, self.timeout)
+        except TimeoutError:
+            logger.warning(f"{client.model}の応答が{self.timeout}秒以内に返りませんでした。")
+            raise
+
+    async def summarize(
+        self, cache: ResponseCache | None = None, force_refresh: bool = False
+    ) -> tuple[dict, TokenStats]:
+        candidates = iter(self.clients)
+        running: dict[asyncio.Task, ConversationalAi] = {}
+        last_error: BaseException | None = None
+
+        def launch() -> bool:
+            client = next(candidates, None)
+            if client is None:
+                return False
+            if running or last_error is not None:
+                logger.warning(f"{client.model}にリクエストします。")
+            running[asyncio.create_task(self._request(client, cache, force_refresh))] = client
+            return True
+
+        launch()
+        try:
+            while running:
+                # ヘッジは同時に2件まで
+                wait_timeout = self.hedge_after if len(running) == 1 else None
+                done, _ = await asyncio.wait(running, timeout=wait_timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    logger.warning(f"{self.hedge_after}秒以内に応答がないため、並行して次の候補にリクエストします。")
+                    launch()
+                    continue
+
+                for task in done:
+                    client = running.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        data, stats = task.result()
+                        if client is not self.clients[0]:
+                            logger.warning(f"{client.model}の応答を使用します。")
+                        return data, stats
+                    if not isinstance(error, FAILOVER_ERRORS):
+                        raise error
+                    logger.warning(f"{client.model}から応答を得られませんでした: {error!r}")
+                    last_error = error
+
+                if not running and not launch():
+                    break
+        finally:
+            for task in running:
+                task.cancel()  # 使わなかった側のリクエストは中断
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+
+        raise ProviderUnavailable("すべてのモデルで要約を取得できませんでした。") from last_error
+
+    async def stream_summary(
+        self, cache: ResponseCache | None = None, force_refresh: bool = False
+    ) -> AsyncIterator[tuple[str, object]]:
+        """ストリーミングでは、まだ何も返していない間に失敗した場合だけ次の候補へ切り替える（ヘッジは行わない）"""
+        last_error: BaseException | None = None
+        for client in self.clients:
+            started = False
+            try:
+                async for event, payload in client.stream_summary(cache, force_refresh):
+                    started = True
+                    yield event, payload
+                return
+            except FAILOVER_ERRORS as e:
+                if started:
+                    raise
+                logger.warning(f"{client.model}から応答を得られませんでした: {e!r}")
+                last_error = e
+        raise ProviderUnavailable("すべてのモデルで要約を取得できませんでした。") from last_error
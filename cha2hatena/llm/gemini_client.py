@@ -1,5 +1,6 @@
 import logging
 
+from .client_registry import registry
 from .conversational_ai import BlogPost, ConversationalAi
 from .llm_stats import TokenStats
 
@@ -8,35 +9,39 @@ logger = logging.getLogger(__name__)
 
 class GeminiClient(ConversationalAi):
     async def get_summary(self):
-        from google import genai
         from google.genai import types
         from google.genai.errors import ClientError, ServerError
+        from httpx import TimeoutException
 
         logger.warning("Geminiからの応答を待っています。")
         logger.debug(f"APIリクエスト中。APIキー: ...{self.api_key[-5:]}")
 
         # api_key引数なしでも、環境変数"GEMNI_API_KEY"の値を勝手に参照するが、可読性のため代入
-        client = genai.Client(api_key=self.api_key)
+        client = registry.genai(self.api_key)
 
-        max_retries = 3
+        max_retries = self.max_retries
         for i in range(max_retries):
             # generate_contentメソッドは内部的にHTTPレスポンスコード200以外の場合は例外を発生させる
             try:
-                response = await client.aio.models.generate_content(  # リクエスト
-                    model=self.model,
-                    contents=self.prompt,
-                    config=types.GenerateContentConfig(
-                        temperature=self.temperature,
-                        response_mime_type="application/json",  # 構造化出力
-                        response_json_schema=BlogPost.model_json_schema(),
-                    ),
-                )
+                async with self.limiter.limit(self.estimated_tokens()):
+                    response = await client.aio.models.generate_content(  # リクエスト
+                        model=self.model,
+                        contents=self.prompt,
+                        config=types.GenerateContentConfig(
+                            temperature=self.temperature,
+                            response_mime_type="application/json",  # 構造化出力
+                            response_json_schema=BlogPost.model_json_schema(),
+                        ),
+                    )
                 print("Geminiによる要約を受け取りました。")
                 break
-            except ServerError:
+            except (ServerError, TimeoutException):
                 await super().handle_server_error(i, max_retries)
             except ClientError as e:
-                super().handle_client_error(e)
+                if e.code == 429:
+                    super().handle_rate_limit(i, max_retries, e)
+                else:
+                    super().handle_client_error(e)
             except Exception as e:
                 super().handle_unexpected_error(e)
 
@@ -52,3 +57,58 @@ class GeminiClient(ConversationalAi):
         )
 
         return data, stats
+
+    async def stream_deltas(self):
+        from google.genai import types
+        from google.genai.errors import ClientError, ServerError
+        from httpx import TimeoutException
+
+        logger.warning("Geminiからの応答を待っています（ストリーミング）。")
+        client = registry.genai(self.api_key)
+
+        max_retries = self.max_retries
+        for i in range(max_retries):
+            deltas = []
+            usage = None
+            try:
+                async with self.limiter.limit(self.estimated_tokens()):
+                    stream = await client.aio.models.generate_content_stream(
+                        model=self.model,
+                        contents=self.prompt,
+                        config=types.GenerateContentConfig(
+                            temperature=self.temperature,
+                            response_mime_type="application/json",
+                            response_json_schema=BlogPost.model_json_schema(),
+                        ),
+                    )
+                    async for chunk in stream:
+                        if chunk.usage_metadata is not None:
+                            usage = chunk.usage_metadata  # 最後のチャンクが合計値
+                        if delta := chunk.text:
+                            deltas.append(delta)
+                            yield delta
+                break
+            except Exception as e:
+                if deltas:
+                    raise  # 途中まで返した後はリトライできない
+                if isinstance(e, (ServerError, TimeoutException)):
+                    await super().handle_server_error(i, max_retries)
+                elif isinstance(e, ClientError) and e.code == 429:
+                    super().handle_rate_limit(i, max_retries, e)
+                elif isinstance(e, ClientError):
+                    super().handle_client_error(e)
+                else:
+                    super().handle_unexpected_error(e)
+
+        text = "".join(deltas)
+        if usage is None:
+            self.stream_stats = self.estimated_stream_stats(text)
+            return
+        self.stream_stats = TokenStats(
+            usage.prompt_token_count,
+            usage.thoughts_token_count or 0,
+            usage.candidates_token_count,
+            len(self.prompt),
+            len(text),
+            self.model,
+        )
@@ -1,10 +1,156 @@
 import logging
-from abc import ABC, abstractmethod
+from collections.abc import Mapping
+from types import MappingProxyType
+
+from pydantic import BaseModel, ConfigDict
 
 logger = logging.getLogger(__name__)
 
 
+class ModelPrice(BaseModel):
+    """1モデルの料金（$ per 1M tokens）。変更できず、同じ料金のモデルでは1つのインスタンスを共有する
+
+    1リクエストの入力がtier_thresholdを超えると、入力・出力（思考を含む）とも*_overの料金になる（Gemini Pro）
+    """
+
+    model_config = ConfigDict(frozen=True)
+
+    input: float
+    output: float
+    cached_input: float | None = None  # キャッシュヒットした入力の料金（DeepSeek）。Noneの場合はinputと同じ
+    tier_threshold: int | None = None
+    input_over: float | None = None
+    output_over: float | None = None
+
+    def rates(self, over_threshold: bool = False) -> tuple[float, float, float]:
+        """(入力, キャッシュヒットした入力, 出力)の料金"""
+        input_rate = self.input_over if over_threshold and self.input_over is not None else self.input
+        output_rate = self.output_over if over_threshold and self.output_over is not None else self.output
+        cached_rate = self.cached_input if self.cached_input is not None else input_rate
+        return input_rate, cached_rate, output_rate
+
+    def is_over_threshold(self, input_tokens: int) -> bool:
+        return self.tier_threshold is not None and input_tokens > self.tier_threshold
+
+    def fees(
+        self, input_tokens: int, thoughts_tokens: int, output_tokens: int, cached_tokens: int = 0
+    ) -> tuple[float, float, float]:
+        """1リクエストの(入力, 思考, 出力)の料金（USD）。cached_tokensはinput_tokensのうちキャッシュヒットした分"""
+        input_rate, cached_rate, output_rate = self.rates(self.is_over_threshold(input_tokens))
+        return (
+            ((input_tokens - cached_tokens) * input_rate + cached_tokens * cached_rate) / 1_000_000,
+            thoughts_tokens * output_rate / 1_000_000,
+            output_tokens * output_rate / 1_000_000,
+        )
+
+
+_DEEPSEEK = {"input": 0.28, "cached_input": 0.028, "output": 0.42}
+
+# 2025/12/09現在。config.yamlのpricingで項目ごとに上書き・モデルを追加できる
+DEFAULT_PRICES = {
+    "gemini-2.5-flash": {"input": 0.03, "output": 2.5},
+    "gemini-2.5-pro": {
+        "input": 1.25,
+        "output": 10.0,
+        "tier_threshold": 200_000,
+        "input_over": 2.5,
+        "output_over": 15.0,
+    },
+    "deepseek-chat": _DEEPSEEK,
+    "deepseek-reasoner": _DEEPSEEK,
+}
+
+
+class PriceTable:
+    """モデル名からModelPriceを引く変更できない料金表。登録されていないモデルはfallbackの料金で試算する"""
+
+    def __init__(self, prices: Mapping[str, ModelPrice], fallback: str = "gemini-2.5-pro"):
+        self.prices = MappingProxyType(dict(prices))
+        self.fallback = fallback
+        self._warned: set[str] = set()
+
+    @classmethod
+    def from_mapping(cls, prices: Mapping[str, Mapping], fallback: str = "gemini-2.5-pro") -> "PriceTable":
+        """モデル名 -> 料金の辞書（config.yamlの形）から作成"""
+        shared: dict[ModelPrice, ModelPrice] = {}
+        table = {}
+        for model, price in prices.items():
+            price = ModelPrice.model_validate(price)
+            table[model] = shared.setdefault(price, price)
+        return cls(table, fallback)
+
+    def __getitem__(self, model: str) -> ModelPrice:
+        price = self.prices.get(model)
+        if price is None:
+            if model not in self._warned:  # モデルごとに1回だけ警告
+                self._warned.add(model)
+                logger.warning(f"料金表に登録されていないモデルです: {model}（{self.fallback}の料金で試算します）")
+            price = self.prices[self.fallback]
+        return price
+
+    def __contains__(self, model: str) -> bool:
+        return model in self.prices
+
+    def batch_fees(self, models, model_codes, input_tokens, thoughts_tokens, output_tokens, cached_tokens=None) -> dict:
+        """トークン数の配列から各行の料金（USD）をまとめて計算
+
+        modelsはモデル名の一覧、model_codesは各行のモデルのmodelsでの位置（1モデルだけなら0）。
+        戻り値はinput・thoughts・output・totalの料金と、料金区分の閾値を超えたかどうか（over_threshold）の配列
+        """
+        import numpy as np  # 集計するときだけ読み込む
+
+        prices = [self[str(model)] for model in models]
+        thresholds = np.array([np.inf if p.tier_threshold is None else p.tier_threshold for p in prices])
+        # (モデル, 区分)ごとの(入力, キャッシュヒット, 出力)の料金を並べた表から、1回の添字参照で各行の料金を取り出す
+        table = np.array([[p.rates(False), p.rates(True)] for p in prices], dtype=float).reshape(-1, 3)
+        codes = np.asarray(model_codes)
+        input_tokens = np.asarray(input_tokens)
+        cached_tokens = np.zeros_like(input_tokens) if cached_tokens is None else np.asarray(cached_tokens)
+        over = input_tokens > thresholds[codes]
+        rates = table[codes * 2 + over]
+        input_fee = ((input_tokens - cached_tokens) * rates[..., 0] + cached_tokens * rates[..., 1]) / 1_000_000
+        thoughts_fee = np.asarray(thoughts_tokens) * rates[..., 2] / 1_000_000
+        output_fee = np.asarray(output_tokens) * rates[..., 2] / 1_000_000
+        return {
+            "input": input_fee,
+            "thoughts": thoughts_fee,
+            "output": output_fee,
+            "total": input_fee + thoughts_fee + output_fee,
+            "over_threshold": over,
+        }
+
+
+_prices = PriceTable.from_mapping(DEFAULT_PRICES)
+
+
+def configure_pricing(config: dict) -> None:
+    """config.yamlのpricingを反映。登録済みのモデルは指定した項目だけを上書きし、未登録のモデルは追加する"""
+    global _prices
+    if overrides := config.get("pricing"):
+        prices = {model: dict(price) for model, price in DEFAULT_PRICES.items()}
+        for model, price in overrides.items():
+            prices[model] = prices.get(model, {}) | dict(price)
+        _prices = PriceTable.from_mapping(prices)
+
+
+def price_table() -> PriceTable:
+    return _prices
+
+
 class TokenStats:
+    """1回（または合算した複数回）のリクエストのトークン数と料金"""
+
+    __slots__ = (
+        "_fees",
+        "cached_tokens",
+        "input_letter_count",
+        "input_tokens",
+        "model_name",
+        "output_letter_count",
+        "output_tokens",
+        "thoughts_tokens",
+    )
+
     def __init__(
         self,
         input_tokens: int,
@@ -13,6 +159,7 @@ class TokenStats:
         input_letter_count: int,
         output_letter_count: int,
         model: str,
+        cached_tokens: int = 0,
     ):
         self.input_tokens = input_tokens
         self.thoughts_tokens = thoughts_tokens
@@ -20,117 +167,48 @@ class TokenStats:
         self.input_letter_count = input_letter_count
         self.output_letter_count = output_letter_count
         self.model_name = model
-        # 遅延計算用のキャッシュ
-        self._input_fee = None
-        self._thoughts_fee = None
-        self._output_fee = None
+        self.cached_tokens = cached_tokens  # input_tokensのうちキャッシュヒットした分（DeepSeek）
+        self._fees: tuple[float, float, float] | None = None  # 遅延計算用のキャッシュ
+
+    @classmethod
+    def combine(cls, stats_list: list["TokenStats"]) -> "TokenStats":
+        """複数回のリクエストを合算。料金はリクエストごとに計算した値の合計（Geminiの料金区分はリクエスト単位のため）"""
+        combined = cls(
+            sum(s.input_tokens for s in stats_list),
+            sum(s.thoughts_tokens for s in stats_list),
+            sum(s.output_tokens for s in stats_list),
+            sum(s.input_letter_count for s in stats_list),
+            sum(s.output_letter_count for s in stats_list),
+            stats_list[-1].model_name,
+            sum(s.cached_tokens for s in stats_list),
+        )
+        combined._fees = (
+            sum(s.input_fee for s in stats_list),
+            sum(s.thoughts_fee for s in stats_list),
+            sum(s.output_fee for s in stats_list),
+        )
+        return combined
+
+    def fees(self) -> tuple[float, float, float]:
+        """(入力, 思考, 出力)の料金（USD）"""
+        if self._fees is None:
+            self._fees = price_table()[self.model_name].fees(
+                self.input_tokens, self.thoughts_tokens, self.output_tokens, self.cached_tokens
+            )
+        return self._fees
 
     @property
     def input_fee(self) -> float:
-        if self._input_fee is None:
-            self._input_fee = LlmFee(self.model_name).calculate(self.input_tokens, "input")
-        return self._input_fee
+        return self.fees()[0]
 
     @property
     def thoughts_fee(self) -> float:
-        if self._thoughts_fee is None:
-            self._thoughts_fee = LlmFee(self.model_name).calculate(self.thoughts_tokens, "thoughts")
-        return self._thoughts_fee
+        return self.fees()[1]
 
     @property
     def output_fee(self) -> float:
-        if self._output_fee is None:
-            self._output_fee = LlmFee(self.model_name).calculate(self.output_tokens, "output")
-        return self._output_fee
+        return self.fees()[2]
 
     @property
     def total_fee(self) -> float:
-        return self.input_fee + self.thoughts_fee + self.output_fee
-
-
-class BaseLlmFee(ABC):
-    def __init__(self, model: str):
-        self.model = model
-
-    @abstractmethod
-    def fees(self):
-        pass
-
-    @abstractmethod
-    def model_list(self):
-        pass
-
-    @abstractmethod
-    def calculate(self, tokens: int, token_type: str) -> float:
-        pass
-
-
-class LlmFee(BaseLlmFee):
-    """2025/12/09現在"""
-
-    _fees = {
-        "gemini-2.5-flash": {"input": 0.03, "output": 2.5},  # $per 1M tokens
-        "gemini-2.5-pro": {
-            "under_0.2M": {"input": 1.25, "output": 10.00},
-            "over_0.2M": {"input": 2.5, "output": 15.0},
-        },
-        "deepseek": {"input(cache_hit)": 0.028, "input(cache_miss)": 0.28, "output": 0.42},
-    }
-    _model_list = ["gemini-2.5-flash", "gemini-2.5-pro", "deepseek-chat", "deepseek-reasoner"]
-
-    @property
-    def fees(self):
-        return self._fees
-
-    @property
-    def model_list(self):
-        return self._model_list
-
-    def calculate(self, tokens, token_type: str) -> float:
-        model_name = self.model
-        token_type = "output" if token_type == "thoughts" else token_type
-        if self.model not in self.model_list:
-            logger.warning("料金表に登録されていないモデルです")
-            logger.warning("'gemini-2.5-proの料金で試算します")
-            model_name = "gemini-2.5-pro"
-        if model_name.startswith("deepseek"):
-            base_fee = self.fees["deepseek"]
-            token_type = "output" if token_type == "thoughts" else token_type
-            if token_type == "output":
-                dollar_per_1M_tokens = base_fee["output"]
-            else:
-                dollar_per_1M_tokens = base_fee["input(cache_miss)"]
-        elif model_name == "gemini-2.5-flash":
-            dollar_per_1M_tokens = self.fees[self.model][token_type]
-        else:
-            base_fee = self.fees["gemini-2.5-pro"]
-            if tokens <= 200000:
-                dollar_per_1M_tokens = base_fee["under_0.2M"][token_type]
-            else:
-                dollar_per_1M_tokens = base_fee["over_0.2M"][token_type]
-
-        return dollar_per_1M_tokens * tokens / 1000000
-
-
-"""
-class DeepseekFee(LlmFee):
-    _fees = {"input(cache_hit)": 0.028, "input(cache_miss)":0.28, "output": 0.42}
-    _model_list = ["deepseek-chat", "deepseek-reasoner"]
-
-    @property
-    def fees(self):
-        return self._fees
-
-    @property
-    def model_list(self):
-        return self._model_list
-
-    def calculate(self, tokens, token_type):
-        token_type = "output" if token_type == "thoughts" else token_type
-        if token_type == "output":
-            dollar_per_1M_tokens = self.fees["output"]
-        else:
-            dollar_per_1M_tokens = self.fees["input(cache_miss)"]
-        
-        return dollar_per_1M_tokens * tokens / 1000000
-"""
+        return sum(self.fees())
@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import re
+from collections.abc import AsyncIterator, Callable
+
+from .conversational_ai import ConversationalAi, LlmConfig
+from .llm_stats import TokenStats
+from .response_cache import ResponseCache
+from .token_estimator import EXPECTED_OUTPUT_TOKENS, TokenEstimator, get_estimator
+
+logger = logging.getLogger(__name__)
+
+# json_loaderが出力するメッセージ・会話の区切り
+MESSAGE_BOUNDARY = re.compile(r"(?<=-{50}\n)|(?=\n={20} \d+個目の会話 ={20}\n)")
+
+MAP_PROMPT = (
+    "以下は長い会話ログを分割したうちの一部（{index}/{total}）です。"
+    "後でほかの部分と合わせて1つの学習記録にまとめるため、学んだこと・実践した内容・結論を漏れなく箇条書きで要約してください。"
+    "titleには要約の見出し、contentには要約本文を入れてください。\n\n会話ログ（一部）："
+)
+PROMPT_MARGIN_TOKENS = 1_000  # 構造化出力の指示や注記など、プロンプトに追加される分
+MAX_ROUNDS = 3  # 部分要約を繰り返す最大回数
+REDUCE_HEADER = "（以下は長い会話ログを分割して要約したものです）\n\n"
+
+
+def split_messages(conversation: str) -> list[str]:
+    """会話ログをメッセージの境界で分割"""
+    return [part for part in MESSAGE_BOUNDARY.split(conversation) if part]
+
+
+def chunk_conversation(conversation: str, token_budget: int, count: Callable[[str], int] = len) -> list[str]:
+    """メッセージの境界でtoken_budget以内のチャンクにまとめる。1件で超えるメッセージは文字数で分割"""
+    chunks = []
+    current = []
+    current_tokens = 0
+    for part in split_messages(conversation):
+        tokens = count(part)
+        if tokens > token_budget:
+            size = max(1, len(part) * token_budget // tokens)
+            pieces = [part[i : i + size] for i in range(0, len(part), size)]
+        else:
+            pieces = [part]
+        for piece in pieces:
+            piece_tokens = count(piece)
+            if current and current_tokens + piece_tokens > token_budget:
+                chunks.append("".join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += piece_tokens
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
+
+class MapReduceSummarizer:
+    """トークン予算を超える会話を分割して並行要約し、部分要約から最終的なBlogPostを生成"""
+
+    def __init__(
+        self,
+        config: LlmConfig,
+        client_factory: Callable[[LlmConfig], ConversationalAi],
+        token_budget: int = 120_000,
+        max_concurrency: int = 4,
+        estimator: TokenEstimator | None = None,
+        max_fee_usd: float | None = None,
+        response_cache: ResponseCache | None = None,
+        force_refresh: bool = False,
+    ):
+        self.config = config
+        self.client_factory = client_factory
+        self.estimator = estimator or get_estimator(config.model)
+        self.token_budget = self._effective_budget(token_budget)
+        self.max_fee_usd = max_fee_usd
+        self.response_cache = response_cache
+        self.force_refresh = force_refresh
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.stats: list[TokenStats] = []
+
+    def _effective_budget(self, token_budget: int) -> int:
+        """高い料金区分に入らないよう、プロンプト分を除いた会話ログの予算に制限"""
+        tier_limit = self.estimator.tier_limit()
+        if tier_limit is None:
+            return token_budget
+        prompt_tokens = self.estimator.count(self.config.prompt) + PROMPT_MARGIN_TOKENS
+        return max(1, min(token_budget, tier_limit - prompt_tokens))
+
+    def _check_cost(self, request_tokens: list[int]) -> None:
+        """リクエストごとの見積もりトークン数から料金を表示し、上限を超える場合は中止"""
+        fee = sum(self.estimator.estimate_fee(tokens) for tokens in request_tokens)
+        logger.warning(
+            f"推定入力トークン: {sum(request_tokens):,}（{len(request_tokens)}リクエスト） 推定料金: ${fee:.4f}"
+        )
+        if self.max_fee_usd is not None and fee > self.max_fee_usd:
+            raise ValueError(f"推定料金${fee:.4f}が上限${self.max_fee_usd}を超えるため、要約を中止します。")
+
+    async def _summarize_chunk(self, chunk: str, index: int, total: int) -> str:
+        config = self.config.model_copy(update={"conversation": chunk})
+        client = self.client_factory(config)
+        client.prompt = MAP_PROMPT.format(index=index, total=total) + "\n\n" + chunk  # 部分要約には注記を付けない
+        async with self.semaphore:
+            logger.warning(f"部分要約 {index}/{total} をリクエストします。")
+            data, stats = await client.summarize(self.response_cache, self.force_refresh)
+        self.stats.append(stats)
+        return f"## {data['title']}\n{data['content']}"
+
+    async def _map(self, chunks: list[str]) -> str:
+        logger.warning(f"会話ログを{len(chunks)}個に分割して要約します。")
+        summaries = await asyncio.gather(
+            *(self._summarize_chunk(chunk, i, len(chunks)) for i, chunk in enumerate(chunks, 1))
+        )
+        return REDUCE_HEADER + "\n\n".join(summaries)
+
+    def needs_split(self) -> bool:
+        return self.estimator.count(self.config.conversation) > self.token_budget
+
+    async def _reduce_config(self) -> LlmConfig:
+        """料金を確認し、予算を超える場合は部分要約を行って最終要約に使う設定を返す"""
+        count = self.estimator.count
+        conversation = self.config.conversation
+        prompt_tokens = count(self.config.prompt) + PROMPT_MARGIN_TOKENS
+        if not self.needs_split():
+            self._check_cost([prompt_tokens + count(conversation)])
+            return self.config
+
+        chunks = chunk_conversation(conversation, self.token_budget, count)
+        reduce_tokens = prompt_tokens + len(chunks) * EXPECTED_OUTPUT_TOKENS
+        self._check_cost([prompt_tokens + count(chunk) for chunk in chunks] + [reduce_tokens])
+
+        # 部分要約が予算に収まるまで繰り返す
+        for _ in range(MAX_ROUNDS):
+            conversation = await self._map(chunks)
+            if count(conversation) <= self.token_budget:
+                break
+            chunks = chunk_conversation(conversation, self.token_budget, count)
+        else:
+            logger.warning("部分要約がトークン予算に収まりませんでした。そのまま最終要約を試みます。")
+
+        return self.config.model_copy(update={"conversation": conversation})
+
+    async def get_summary(self) -> tuple[dict, TokenStats]:
+        reduce_config = await self._reduce_config()
+        data, stats = await self.client_factory(reduce_config).summarize(self.response_cache, self.force_refresh)
+        self.stats.append(stats)
+        return data, TokenStats.combine(self.stats)
+
+    async def stream_summary(self) -> AsyncIterator[tuple[str, object]]:
+        """最終要約を生成途中から("partial", dict)で返し、最後に("done", (data, stats))を返す
+
+        分割が必要な場合は、部分要約の完了を待ってから最終要約だけをストリーミングする
+        """
+        if self.needs_split():
+            yield "progress", {"message": "会話ログが長いため、分割して要約しています。"}
+        reduce_config = await self._reduce_config()
+        client = self.client_factory(reduce_config)
+        async for event, payload in client.stream_summary(self.response_cache, self.force_refresh):
+            if event == "done":
+                data, stats = payload
+                self.stats.append(stats)
+                payload = (data, TokenStats.combine(self.stats))
+            yield event, payload
@@ -0,0 +1,162 @@
+import copy
+import json
+
+CLOSERS = {"{": "}", "[": "]"}
+ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class PartialJsonParser:
+    """生成途中のJSONテキストを受け取り、その時点で確定している部分を辞書として返す
+
+    追加された差分だけを走査して文字列・括弧の状態を保持する。json.loadsで読み直すのは、閉じていない括弧を補えば
+    読み込める位置（値の区切り）が進んだときだけ。書きかけの値の文字列（titleやcontent）は走査しながらデコードし、
+    読み込み済みの辞書の該当する位置に途中までの内容として入れる
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.length = 0
+        self.stack = []  # 開いている { と [
+        self.expect_key = []  # stackの各階層でオブジェクトのキーを待っているか
+        self.path = []  # stackの各階層で書き込み中の値のキー（配列は添字）
+        self.in_string = False
+        self.string_is_key = False
+        self.escape = False
+        self.unicode: str | None = None  # \uの後に読んだ16進数
+        self.high_surrogate: int | None = None
+        self.string_chars = []  # 書き込み中の文字列のデコード済みの内容
+        self.safe_end = 0  # 括弧を補えば読み込める位置
+        self.safe_closers = ""
+        self.parsed_end = 0  # prefixを読み込んだときのsafe_end
+        self.prefix = None  # safe_endまでを読み込んだ値
+        self.last = None
+
+    def _mark_safe(self, end: int) -> None:
+        self.safe_end = end
+        self.safe_closers = "".join(CLOSERS[c] for c in reversed(self.stack))
+
+    def _emit(self, s: str) -> None:
+        if self.high_surrogate is not None:  # 対になる下位サロゲートが続かなかった
+            self.string_chars.append(chr(self.high_surrogate))
+            self.high_surrogate = None
+        self.string_chars.append(s)
+
+    def _emit_code(self, code: int) -> None:
+        if 0xDC00 <= code < 0xE000 and self.high_surrogate is not None:
+            self.string_chars.append(chr(0x10000 + ((self.high_surrogate - 0xD800) << 10) + (code - 0xDC00)))
+            self.high_surrogate = None
+        elif 0xD800 <= code < 0xDC00:
+            self._emit("")
+            self.high_surrogate = code  # 下位サロゲートが届くまで保留
+        else:
+            self._emit(chr(code))
+
+    def _scan_string(self, ch: str, pos: int) -> None:
+        if self.unicode is not None:
+            self.unicode += ch
+            if len(self.unicode) == 4:
+                try:
+                    self._emit_code(int(self.unicode, 16))
+                except ValueError:
+                    pass  # 不正なエスケープは読み飛ばす（最終的な結果はcheck_responseで検証する）
+                self.unicode = None
+        elif self.escape:
+            self.escape = False
+            if ch == "u":
+                self.unicode = ""
+            else:
+                self._emit(ESCAPES.get(ch, ch))
+        elif ch == "\\":
+            self.escape = True
+        elif ch == '"':
+            self.in_string = False
+            if self.string_is_key:
+                self._emit("")
+                self.path[-1] = "".join(self.string_chars)
+            else:
+                self._mark_safe(pos + 1)
+        else:
+            self._emit(ch)
+
+    def _scan(self, text: str) -> None:
+        for offset, ch in enumerate(text):
+            pos = self.length + offset
+            if self.in_string:
+                self._scan_string(ch, pos)
+                continue
+
+            if ch == '"':
+                self.in_string = True
+                self.string_is_key = bool(self.stack) and self.stack[-1] == "{" and self.expect_key[-1]
+                self.string_chars = []
+                self.high_surrogate = None
+            elif ch in "{[":
+                self.stack.append(ch)
+                self.expect_key.append(ch == "{")
+                self.path.append(None if ch == "{" else 0)
+                self._mark_safe(pos + 1)
+            elif ch in "}]":
+                if self.stack:
+                    self.stack.pop()
+                    self.expect_key.pop()
+                    self.path.pop()
+                self._mark_safe(pos + 1)
+            elif ch == ":":
+                if self.expect_key:
+                    self.expect_key[-1] = False
+            elif ch == ",":
+                self._mark_safe(pos)  # 直前の値（数値などを含む）までは確定
+                if self.stack and self.stack[-1] == "{":
+                    self.expect_key[-1] = True
+                elif self.stack:
+                    self.path[-1] += 1
+        self.length += len(text)
+
+    def _with_partial_string(self, value):
+        """読み込み済みの値のコピーに、書き込み中の文字列を途中までの内容として入れる"""
+        if not self.path or not isinstance(value, (dict, list)):
+            return value
+        root = container = copy.copy(value)
+        for key in self.path[:-1]:
+            child = container.get(key) if isinstance(container, dict) else None
+            if isinstance(container, list) and isinstance(key, int) and key < len(container):
+                child = container[key]
+            if not isinstance(child, (dict, list)):
+                return value  # 想定外の構造。途中までの文字列は入れない
+            child = copy.copy(child)
+            container[key] = child
+            container = child
+
+        key = self.path[-1]
+        text = "".join(self.string_chars)
+        self.string_chars = [text]  # 次回は追加分だけをつなげる
+        if isinstance(container, dict) and isinstance(key, str):
+            container[key] = text
+        elif isinstance(container, list) and key == len(container):
+            container.append(text)
+        return root
+
+    def feed(self, delta: str) -> dict | None:
+        """差分を追加し、読み込める内容が前回から変わっていれば辞書を返す"""
+        if not delta:
+            return None
+        self._scan(delta)
+        self.chunks.append(delta)
+        if self.safe_end != self.parsed_end:
+            self.parsed_end = self.safe_end
+            try:
+                self.prefix = json.loads(self.text[: self.safe_end] + self.safe_closers)
+            except json.JSONDecodeError:
+                self.prefix = None
+
+        value = self.prefix
+        if self.in_string and not self.string_is_key:
+            value = self._with_partial_string(value)
+        if not isinstance(value, dict) or value == self.last:
+            return None
+        self.last = value
+        return value
+
+    @property
+    def text(self) -> str:
+        return "".join(self.chunks)
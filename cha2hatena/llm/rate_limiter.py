@@ -0,0 +1,145 @@
+import asyncio
+import logging
+import statistics
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+# config.yamlのrate_limitsで上書きできる初期値
+DEFAULT_LIMITS = {
+    "deepseek": {"max_concurrency": 8, "rpm": 60, "tpm": 1_000_000},
+    "gemini": {"max_concurrency": 4, "rpm": 15, "tpm": 1_000_000},
+}
+
+
+class TokenBucket:
+    """1分あたりper_minuteずつ補充されるトークンバケット（容量も1分ぶん）"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """amount分がたまるまでの秒数。容量を超える量は容量いっぱいまで待てばよい"""
+        self._refill()
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.tokens) / self.rate)
+
+    def consume(self, amount: float) -> None:
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+
+class ProviderLimiter:
+    """プロバイダ・APIキーごとに同時実行数・RPM・TPMを制限する
+
+    呼び出し元は失敗させずに到着順（FIFO）で待たせる。先頭の呼び出しだけが枠の空きを待ち、後続はその後ろに並ぶ
+    """
+
+    def __init__(self, name: str, max_concurrency: int = 4, rpm: float = 60, tpm: float = 1_000_000):
+        self.name = name
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._queue = asyncio.Lock()  # 待機中のタスクを到着順に起こす
+        self._requests = TokenBucket(rpm)
+        self._tokens = TokenBucket(tpm)
+        self._paused_until = 0.0
+        self.max_concurrency = max_concurrency
+        # メトリクス
+        self.queue_depth = 0
+        self.in_flight = 0
+        self.total_requests = 0
+        self.throttled = 0
+        self._waits = deque(maxlen=1000)
+
+    async def acquire(self, tokens: int) -> None:
+        start = time.monotonic()
+        self.queue_depth += 1
+        try:
+            async with self._queue:
+                await self._slots.acquire()
+                try:
+                    while True:
+                        delay = max(
+                            self._paused_until - time.monotonic(),
+                            self._requests.wait_time(1),
+                            self._tokens.wait_time(tokens),
+                        )
+                        if delay <= 0:
+                            break
+                        await asyncio.sleep(delay)
+                except BaseException:
+                    self._slots.release()  # 待機中にキャンセルされた場合は枠を返す
+                    raise
+                self._requests.consume(1)
+                self._tokens.consume(tokens)
+        finally:
+            self.queue_depth -= 1
+
+        waited = time.monotonic() - start
+        self._waits.append(waited)
+        self.in_flight += 1
+        self.total_requests += 1
+        if waited >= 1:
+            logger.warning(f"{self.name}のレート制限により{waited:.1f}秒待機しました（待機中: {self.queue_depth}件）")
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._slots.release()
+
+    @asynccontextmanager
+    async def limit(self, tokens: int):
+        """見積もりトークン数tokensのリクエスト1件分の枠を確保"""
+        await self.acquire(tokens)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def backoff(self, seconds: float) -> None:
+        """429を受けた場合など、以降のリクエストをseconds秒止める"""
+        self.throttled += 1
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def metrics(self) -> dict:
+        waits = list(self._waits)
+        return {
+            "queue_depth": self.queue_depth,
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "total_requests": self.total_requests,
+            "throttled": self.throttled,
+            "wait_avg_sec": round(statistics.fmean(waits), 3) if waits else 0.0,
+            "wait_p95_sec": round(statistics.quantiles(waits, n=20)[-1], 3) if len(waits) >= 2 else 0.0,
+            "wait_max_sec": round(max(waits), 3) if waits else 0.0,
+        }
+
+
+_limits = {provider: dict(limits) for provider, limits in DEFAULT_LIMITS.items()}
+_limiters: dict[tuple[str, str], ProviderLimiter] = {}
+
+
+def configure_limits(config: dict) -> None:
+    """config.yamlのrate_limitsを反映（作成済みのリミッターには影響しない）"""
+    for provider, limits in (config.get("rate_limits") or {}).items():
+        _limits.setdefault(provider, {}).update(limits or {})
+
+
+def get_limiter(provider: str, api_key: str) -> ProviderLimiter:
+    """プロバイダ・APIキーごとに共有するリミッター"""
+    key = (provider, api_key)
+    if key not in _limiters:
+        _limiters[key] = ProviderLimiter(f"{provider}(...{api_key[-5:]})", **_limits.get(provider, {}))
+    return _limiters[key]
+
+
+def limiter_metrics() -> dict[str, dict]:
+    return {limiter.name: limiter.metrics() for limiter in _limiters.values()}
@@ -0,0 +1,101 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from pathlib import Path
+
+from .llm_stats import TokenStats
+
+logger = logging.getLogger(__name__)
+
+STATS_FIELDS = ("input_tokens", "thoughts_tokens", "output_tokens", "input_letter_count", "output_letter_count")
+
+
+class ResponseCache:
+    """LLMの応答（BlogPostの辞書とTokenStats）をプロンプト・モデル・温度のハッシュで保存するディスクキャッシュ
+
+    要約後の投稿や記録で失敗した場合に、再実行で同じ要約の料金を二重に払わないためのもの
+    """
+
+    def __init__(self, cache_dir: Path, ttl_seconds: float = 7 * 24 * 3600, max_entries: int = 500):
+        self.cache_dir = Path(cache_dir)  # ディレクトリは最初の保存時に作る
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+    @staticmethod
+    def make_key(prompt: str, model: str, temperature: float) -> str:
+        h = hashlib.sha256()
+        for part in (model, repr(float(temperature)), prompt):
+            h.update(part.encode("utf-8"))
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def get(self, key: str) -> tuple[dict, TokenStats] | None:
+        path = self._entry_path(key)
+        try:
+            entry = json.loads(path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        if time.time() - entry["created"] > self.ttl_seconds:
+            logger.debug(f"応答キャッシュの有効期限切れ: {key[:12]}")
+            path.unlink(missing_ok=True)
+            return None
+
+        os.utime(path)  # LRU用に最終利用時刻を更新
+        stats = TokenStats(
+            *(entry["stats"][field] for field in STATS_FIELDS),
+            entry["stats"]["model"],
+            entry["stats"].get("cached_tokens", 0),
+        )
+        return entry["data"], stats
+
+    def put(self, key: str, data: dict, stats: TokenStats) -> None:
+        entry = {
+            "created": time.time(),
+            "data": data,
+            "stats": {field: getattr(stats, field) for field in STATS_FIELDS}
+            | {
+                "model": stats.model_name,
+                "cached_tokens": stats.cached_tokens,
+            },
+        }
+        path = self._entry_path(key)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path.write_text(json.dumps(entry, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp_path, path)
+        except OSError:
+            logger.warning("応答キャッシュを保存できませんでした。", exc_info=True)
+            tmp_path.unlink(missing_ok=True)
+            return
+        self.evict()
+
+    def evict(self) -> None:
+        """件数が上限を超えたら最終利用時刻の古いものから削除"""
+        entries = []
+        for path in self.cache_dir.glob("*.json"):
+            try:
+                entries.append((path.stat().st_mtime, path))
+            except FileNotFoundError:
+                continue  # ほかのプロセスが削除・置き換えた
+        entries.sort()
+        for _, path in entries[: max(0, len(entries) - self.max_entries)]:
+            path.unlink(missing_ok=True)
+
+
+def response_cache_from_config(config: dict) -> ResponseCache | None:
+    """config.yamlのcache.responsesから作成。無効の場合はNone"""
+    cache_config = (config.get("cache") or {}).get("responses") or {}
+    if not cache_config.get("enabled", False):
+        return None
+    return ResponseCache(
+        Path(cache_config.get("dir", "outputs/cache/responses")),
+        ttl_seconds=cache_config.get("ttl_hours", 168) * 3600,
+        max_entries=cache_config.get("max_entries", 500),
+    )
@@ -0,0 +1,85 @@
+import csv
+import logging
+import statistics
+from functools import lru_cache
+from pathlib import Path
+
+from .llm_stats import price_table
+
+logger = logging.getLogger(__name__)
+
+# 1文字あたりのトークン数の初期値 (ASCII, それ以外)
+DEFAULT_RATIOS = {
+    "gemini": (0.25, 0.9),
+    "deepseek": (0.3, 0.7),
+}
+TYPICAL_ASCII_SHARE = 0.3  # record.csvは文字数のみのため、平均的な入力に占めるASCIIの割合を仮定して補正
+EXPECTED_OUTPUT_TOKENS = 2000  # 事前見積もり用の出力（思考を含む）トークン数
+
+
+def char_counts(text: str) -> tuple[int, int]:
+    """(ASCII文字数, それ以外の文字数)。UTF-8のバイト数との差から求めるためPythonのループを使わない"""
+    n = len(text)
+    if text.isascii():
+        return n, 0
+    # 日本語などの3バイト文字は1文字あたり2バイト多い
+    other = min(n, (len(text.encode("utf-8", "surrogatepass")) - n + 1) // 2)
+    return n - other, other
+
+
+class TokenEstimator:
+    """APIを呼ばずに入力トークン数と料金を見積もる"""
+
+    def __init__(self, model: str, scale: float = 1.0):
+        self.model = model
+        self.scale = scale
+        ascii_ratio, other_ratio = DEFAULT_RATIOS["gemini" if model.startswith("gemini") else "deepseek"]
+        self.ascii_ratio = ascii_ratio * scale
+        self.other_ratio = other_ratio * scale
+
+    @classmethod
+    def calibrated(cls, model: str, record_path: Path) -> "TokenEstimator":
+        """record.csvの実績（入力文字数と入力トークン数）から倍率を補正"""
+        ratios = []
+        try:
+            with record_path.open(newline="", encoding="utf-8-sig") as f:
+                for row in csv.DictReader(f):
+                    if row.get("model") != model:
+                        continue
+                    try:
+                        letters, tokens = int(row["input_letter_count"]), int(row["input_tokens"])
+                    except (KeyError, TypeError, ValueError):
+                        continue
+                    if letters > 0 and tokens > 0:
+                        ratios.append(tokens / letters)
+        except FileNotFoundError:
+            return cls(model)
+
+        if not ratios:
+            return cls(model)
+
+        ascii_ratio, other_ratio = DEFAULT_RATIOS["gemini" if model.startswith("gemini") else "deepseek"]
+        typical = ascii_ratio * TYPICAL_ASCII_SHARE + other_ratio * (1 - TYPICAL_ASCII_SHARE)
+        scale = statistics.median(ratios) / typical
+        logger.debug(f"{model}のトークン見積もりを{len(ratios)}件の実績で補正: 倍率{scale:.3f}")
+        return cls(model, scale)
+
+    def count(self, text: str) -> int:
+        ascii_count, other_count = char_counts(text)
+        return int(ascii_count * self.ascii_ratio + other_count * self.other_ratio) + 1
+
+    def tier_limit(self) -> int | None:
+        """高い料金区分に入る手前の入力トークン数"""
+        return price_table()[self.model].tier_threshold
+
+    def estimate_fee(self, input_tokens: int, output_tokens: int = EXPECTED_OUTPUT_TOKENS) -> float:
+        """見積もりトークン数での料金（USD）"""
+        return sum(price_table()[self.model].fees(input_tokens, 0, output_tokens))
+
+
+@lru_cache
+def get_estimator(model: str, record_path: Path | None = None) -> TokenEstimator:
+    """モデルごとの見積もり器（record.csvがあれば補正済み）"""
+    if record_path is None:
+        return TokenEstimator(model)
+    return TokenEstimator.calibrated(model, record_path)
@@ -1,17 +1,28 @@
+import argparse
 import csv
 import logging
 import sys
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
+from functools import cache, partial
 from pathlib import Path
 
-import gspread
-import yfinance as yf
-
-from . import hatenablog_poster, line_message
-from . import json_loader as jl
-from .llm import deepseek_client, gemini_client
-from .llm.conversational_ai import ConversationalAi, LlmConfig
-from .setup import initialization
+from . import batch, hatenablog_poster, line_message, publish_queue
+from .conversation_cache import cache_from_config
+from .fx_rate import fx_rate_from_config
+from .json_loader import ai_names_from_paths, get_conversation_titles, json_loader, shutdown_process_pool
+from .llm.client_registry import registry as llm_clients
+from .llm.failover import FailoverClient, create_client
+from .llm.llm_stats import configure_pricing
+from .llm.map_reduce import MapReduceSummarizer
+from .llm.rate_limiter import configure_limits, limiter_metrics
+from .llm.response_cache import response_cache_from_config
+from .llm.token_estimator import get_estimator
+from .post_index import idempotency_key, post_index_from_config
+from .setup import initialization, provider_api_keys
+from .sheets_sink import sheets_sink_from_config
+from .side_effects import Step, fan_out, format_report, run_in_thread
+from .watermark import WatermarkStore
 
 logger = logging.getLogger(__name__)
 parent_logger = logging.getLogger("cha2hatena")
@@ -24,22 +35,49 @@ except Exception as e:
 
 
 PRESET_CATEGORIES = config["blog"]["preset_category"]
+LOADER_CONFIG = config.get("loader") or {}
+RECORD_PATH = Path(config["paths"]["output_dir"].strip()) / "record.csv"
+CONVERSATION_CACHE = cache_from_config(config)
+RESPONSE_CACHE = response_cache_from_config(config)
+configure_limits(config)
+configure_pricing(config)
+FX_RATES = fx_rate_from_config(config)
+WATERMARKS = (
+    WatermarkStore(Path(LOADER_CONFIG.get("watermark_file", "outputs/watermarks.json")))
+    if LOADER_CONFIG.get("since_last_post", False)
+    else None
+)
+QUEUE_CONFIG = config.get("publish_queue") or {}
+PUBLISH_QUEUE = publish_queue.publish_queue_from_config(config)
+POST_INDEX = post_index_from_config(config)
 LINE_ACCESS_TOKEN = SECRET_KEYS.pop("LINE_CHANNEL_ACCESS_TOKEN")
+LINE = line_message.line_notifier_from_config(config, LINE_ACCESS_TOKEN)
+SHEETS = sheets_sink_from_config(config)  # credentials.jsonがなければNone
+RECORDS_CONFIG = config.get("records") or {}
 HATENA_SECRET_KEYS = SECRET_KEYS
 
 
 ######################################################
 
 
-def create_ai_client(config: LlmConfig):
-    if config.model.startswith("gemini"):
-        client = gemini_client.GeminiClient(config)
-    elif config.model.startswith("deepseek"):
-        client = deepseek_client.DeepseekClient(config)
-    else:
-        logger.error("モデル名が正しくありません。実行を中止します。")
-        logger.error(f"モデル名: {config.model}")
-    return client
+# 5xx・タイムアウト時はfallback_modelsへ切り替える（設定がなければai.modelのみ）
+create_ai_client = partial(
+    FailoverClient,
+    client_factory=create_client,
+    fallback_models=config["ai"].get("fallback_models") or [],
+    api_keys=provider_api_keys(),
+    hedge_after=config["ai"].get("hedge_after_sec"),
+    timeout=config["ai"].get("request_timeout_sec"),
+    retries_per_model=config["ai"].get("retries_per_model"),
+)
+
+
+@cache
+def run_records():
+    """実行記録のDB（SQLAlchemyは記録するときに初めて読み込む）。ブロッキングするためスレッドで呼ぶ"""
+    from .run_records import run_record_store_from_config
+
+    return run_record_store_from_config(config)
 
 
 def append_csv(path: Path, data: dict):
@@ -62,149 +100,316 @@ def append_csv(path: Path, data: dict):
         logger.exception("CSVファイルへの書き込み中にエラーが発生しました。")
 
 
-def to_spreadsheet(new_data: dict, spreadsheet_name: str) -> None:
-    SCOPES = ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive"]
-    if spreadsheet_name:
-        gc = gspread.oauth(scopes=SCOPES, credentials_filename="credentials.json")
-        try:
-            # スプレッドシートを開く（存在チェック）
-            sh = gc.open(spreadsheet_name)
-            worksheet = sh.sheet1
-
-            existing_data = worksheet.get_all_values()
-            if not existing_data:
-                worksheet.update([list(new_data.keys())] + [list(new_data.values())])
-                print(f"新規作成: スプレッドシートにヘッダーとデータを追加しました: {spreadsheet_name}")
-            else:
-                worksheet.append_row(list(new_data.values()))
-                print("追記: スプレッドシートに新しい行を追加しました")
-
-        except gspread.exceptions.SpreadsheetNotFound:
-            # スプレッドシートが存在しない場合、新規作成
-            sh = gc.create("record")
-            worksheet = sh.sheet1
-            worksheet.update([list(new_data.keys())] + [list(new_data.values())])
-            print(f"新規スプレッドシートを作成し、データを追加しました: {spreadsheet_name}")
-
-
-async def main():
-    try:
-        logger.debug("================================================")
-        logger.debug(f"アプリケーションが起動しました。デバッグモード：{DEBUG}")
-
-        if len(sys.argv) > 1:
-            INPUT_PATHS_RAW = sys.argv[1:]
-            logger.warning(f"処理を開始します: {', '.join(INPUT_PATHS_RAW)}")
-        else:
-            logger.error("エラー: 引数を入力する必要があります。実行を終了します")
-            sys.exit(1)
-
-        input_paths = list(map(Path, INPUT_PATHS_RAW))
-
-        # JSONファイルから会話履歴を読み込み、テキストに整形
-        LLM_CONFIG.conversation = jl.json_loader(input_paths)
-
-        # AIオブジェクト作成
-        ai_instance: ConversationalAi = create_ai_client(LLM_CONFIG)
-
-        # AIで要約取得
-        llm_outputs, llm_stats = await ai_instance.get_summary()
-
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="cha2hatena", description="AIとの会話ログを要約してはてなブログへ投稿")
+    parser.add_argument("paths", nargs="*", help="会話ログ（.json/.txt、複数可）")
+    parser.add_argument("--fresh", action="store_true", help="LLMの応答キャッシュを使わずに要約を再生成")
+    parser.add_argument(
+        "--batch", action="store_true", help="paths.input_dirの会話ログをまとめて処理（pathsにディレクトリも指定可）"
+    )
+    parser.add_argument("--group-by", choices=["conversation", "day"], help="バッチで1回の投稿にまとめる単位")
+    parser.add_argument("--concurrency", type=int, help="バッチで同時に処理する件数")
+    parser.add_argument(
+        "--enqueue",
+        action="store_true",
+        help="すぐに投稿せず投稿キューに追加（バッチではspread_minutesおきに公開予約）",
+    )
+    parser.add_argument("--publish", action="store_true", help="投稿キューのエントリーを公開時刻に合わせて投稿")
+    parser.add_argument(
+        "--costs", action="store_true", help="実行記録の料金を集計（pathsにrecord.csvを指定した場合はそのCSVから）"
+    )
+    parser.add_argument("--import-csv", type=Path, metavar="CSV", help="既存のrecord.csvを実行記録のDBに取り込む")
+    return parser.parse_args(argv)
+
+
+async def summarize_and_post(
+    input_paths: list[Path],
+    fresh: bool = False,
+    watermarks: WatermarkStore | None = WATERMARKS,
+    enqueue: bool = False,
+    publish_at: datetime | None = None,
+) -> dict | None:
+    """会話ログの要約・投稿・記録までを行い、record.csvに書いた1行を返す。新しい会話がなければNone
+
+    enqueue=Trueの場合は投稿せずに投稿キューへ追加する（publish_atに公開、Noneの場合は次の投稿処理ですぐに公開）
+    """
+    # JSONファイルから会話履歴を読み込み、テキストに整形
+    conversation = await json_loader(
+        input_paths,
+        streaming=LOADER_CONFIG.get("streaming", False),
+        parallel=LOADER_CONFIG.get("parallel", False),
+        max_workers=LOADER_CONFIG.get("max_workers"),
+        cache=CONVERSATION_CACHE,
+        watermarks=watermarks,
+    )
+    if not conversation:
+        logger.warning("前回の投稿以降の新しい会話がないため、終了します。")
+        return None
+    llm_config = LLM_CONFIG.model_copy(update={"conversation": conversation})
+    # 再実行時に同じ会話・モデルの記事を重複して投稿しないためのキー
+    post_key = idempotency_key(conversation, llm_config.model)
+
+    # AIオブジェクト作成（トークン予算を超える場合は分割して要約）
+    ai_instance = MapReduceSummarizer(
+        llm_config,
+        create_ai_client,
+        token_budget=config["ai"].get("chunk_token_budget", 120_000),
+        max_concurrency=config["ai"].get("max_concurrency", 4),
+        estimator=get_estimator(llm_config.model, RECORD_PATH),
+        max_fee_usd=config["ai"].get("max_fee_usd"),
+        response_cache=RESPONSE_CACHE,
+        force_refresh=fresh,
+    )
+
+    # AIで要約取得
+    llm_outputs, llm_stats = await ai_instance.get_summary()
+    logger.debug(f"LLMリクエストの待機状況: {limiter_metrics()}")
+
+    if enqueue:
+        # 投稿キューへ追加（投稿は--publishで行う）。投稿結果と同じ形式の辞書を返す（status_code 202）
+        blogpost_result = PUBLISH_QUEUE.add(
+            **llm_outputs,
+            preset_categories=PRESET_CATEGORIES,
+            publish_at=publish_at,
+            is_draft=DEBUG,
+            idempotency_key=post_key,
+        ).as_result()
+    else:
         # はてなブログへ投稿 投稿結果を辞書型で返却
-        blogpost_result = hatenablog_poster.blog_post(
+        blogpost_result = await hatenablog_poster.blog_post(
             **llm_outputs,
             preset_categories=PRESET_CATEGORIES,
             hatena_secret_keys=HATENA_SECRET_KEYS,
             author=None,  # str | None   Noneの場合自分のはてなID
             updated=None,  # datetime | None  公開時刻設定。Noneの場合5分後に公開
             is_draft=DEBUG,  # デバッグ時は下書き
+            index=POST_INDEX,  # 投稿済みの場合は新規投稿せずに既存の記事を更新
+            idempotency_key=post_key,
         )
 
-        url = blogpost_result.get("link_alternate", "")
-        url_edit = blogpost_result.get("link_edit_user", "")
-        title = blogpost_result.get("title", "")
-        content = blogpost_result.get("content", "")
-        categories = blogpost_result.get("categories", [])
+    url = blogpost_result.get("link_alternate", "")
+    url_edit = blogpost_result.get("link_edit_user", "")
+    title = blogpost_result.get("title", "")
+    content = blogpost_result.get("content", "")
+    categories = blogpost_result.get("categories", [])
 
+    if blogpost_result["status_code"] == 202:
+        logger.warning("投稿キューに追加しました。")
+    elif blogpost_result["status_code"] == 200:
+        logger.warning("投稿済みのはてなブログの記事を更新しました。")
+        logger.warning(f"URL: {url_edit}")
+    else:
         logger.warning("はてなブログへの投稿に成功しました。")
         logger.warning(f"URL: {url_edit}")
-        print("-" * 50)
-        print(f"投稿タイトル：{title}")
-        print(f"\n{'-' * 20}投稿本文{'-' * 20}")
-        print(f"{content[:100]}")
-        print("-" * 50)
-
-        # LINE通知
-        if blogpost_result["status_code"] == 201:
-            line_text = "投稿完了です。今日も長い時間お疲れさまでした！\n"
-            line_text = (
-                line_text
-                + f"タイトル：{title}\n確認: {url}\n編集: {url_edit}\n下書きモード: {blogpost_result.get('is_draft')}"
-            )
-        else:
-            line_text = "要約の保存完了。ブログ投稿は行われませんでした。今日も長い時間お疲れ様でした。\n"
-            line_text = line_text + f"タイトル：{title}\n本文: \n{content[:200]} ..."
-
+    print("-" * 50)
+    print(f"投稿タイトル：{title}")
+    print(f"\n{'-' * 20}投稿本文{'-' * 20}")
+    print(f"{content[:100]}")
+    print("-" * 50)
+
+    # 投稿できた（キューに追加した）会話のウォーターマークを更新
+    if watermarks is not None and blogpost_result["status_code"] in (200, 201, 202):
+        watermarks.commit()
+
+    # LINE通知
+    if blogpost_result["status_code"] == 202:
+        when = publish_at.strftime("%m/%d %H:%M") if publish_at else "次の投稿処理"
+        line_text = f"要約を投稿キューに追加しました（公開: {when}）。\nタイトル：{title}"
+    elif blogpost_result["status_code"] in (200, 201):
+        line_text = "投稿完了です。今日も長い時間お疲れさまでした！\n"
+        line_text = (
+            line_text
+            + f"タイトル：{title}\n確認: {url}\n編集: {url_edit}\n下書きモード: {blogpost_result.get('is_draft')}"
+        )
+    else:
+        line_text = "要約の保存完了。ブログ投稿は行われませんでした。今日も長い時間お疲れ様でした。\n"
+        line_text = line_text + f"タイトル：{title}\n本文: \n{content[:200]} ..."
+
+    ai_names = ai_names_from_paths(input_paths)
+    conversation_titles = " ".join(get_conversation_titles(input_paths, ai_names))
+
+    csv_data = {
+        "timestamp": datetime.now().isoformat(),
+        "conversation_title": conversation_titles,
+        "AI_name": " ".join(ai_names),
+        "entry_URL": url,
+        "is_draft": blogpost_result.get("is_draft"),
+        "entry_title": title,
+        "entry_content": content[:30],
+        "categories": ",".join(categories),
+        "prompt": llm_config.prompt[:20],
+        "model": llm_stats.model_name,  # フェイルオーバー時は実際に応答したモデル
+        "temperature": llm_config.temperature,
+        "input_letter_count": llm_stats.input_letter_count,
+        "output_letter_count": llm_stats.output_letter_count,
+        "input_tokens": llm_stats.input_tokens,
+        "input_fee": llm_stats.input_fee,
+        "thoughts_tokens": llm_stats.thoughts_tokens,
+        "thoughts_fee": llm_stats.thoughts_fee,
+        "output_tokens": llm_stats.output_tokens,
+        "output_fee": llm_stats.output_fee,
+        "total_fee (USD)": llm_stats.total_fee,
+        "total_fee (JPY)": None,  # 為替レートの取得後に設定
+        "api_key": "..." + llm_config.api_key[-5:],
+    }
+
+    summary_file_name = datetime.now().strftime("%y%m%d") + "-" + title
+
+    csv_dir = Path(config["paths"]["output_dir"].strip())
+    csv_dir.mkdir(exist_ok=True)
+    csv_path = csv_dir / "record.csv"
+    summary_dir = csv_dir / "summary"
+    summary_dir.mkdir(exist_ok=True)
+    summary_path = summary_dir / (f"{summary_file_name.replace('/', ', ')}.txt")
+
+    # 投稿後の処理を並行して実行（ブロッキングするライブラリはスレッドで実行し、処理ごとにタイムアウト）
+    effects_config = config.get("side_effects") or {}
+
+    def step(name: str, key: str, run, timeout: float, required: bool) -> Step:
+        step_config = effects_config.get(key) or {}
+        return Step(name, run, step_config.get("timeout_sec", timeout), step_config.get("required", required))
+
+    async def record_run():
+        # 為替レートはタイムアウト・失敗時もNoneのまま記録する
+        if (dy_rate := await fx.task) is not None:
+            csv_data["total_fee (JPY)"] = llm_stats.total_fee * dy_rate
+        await run_in_thread(lambda: run_records().append(csv_data))  # バッチ中はためておき、終了時にまとめて保存
+        if RECORDS_CONFIG.get("csv_export", True):
+            await run_in_thread(append_csv, csv_path, csv_data)
+
+    async def spreadsheet():
+        await record.task  # 実行記録と同じ行を書き込む
+        await run_in_thread(SHEETS.append, csv_data)  # バッチ中はためておき、終了時にまとめて書き込む
+
+    line = step("LINE通知", "line", lambda: LINE.notify(line_text), 10, True)  # バッチ中は終了時にまとめて送る
+    fx = step("為替レート", "fx", lambda: run_in_thread(FX_RATES.get), 10, False)
+    record = step("実行記録", "csv", record_run, 20, True)
+    summary = step(
+        "要約ファイル", "summary_file", lambda: run_in_thread(summary_path.write_text, content, "utf-8"), 10, True
+    )
+    steps = [line, fx, record, summary]
+    # キャッシュが期限切れなら前回のレートで記録しつつ取り直す（1日1回程度）
+    if FX_RATES.is_stale():
+        steps.append(step("為替レート更新", "fx_refresh", lambda: run_in_thread(FX_RATES.refresh), 10, True))
+    # Googleスプレッドシートへ出力
+    if SHEETS is not None:
+        steps.append(step("スプレッドシート", "sheets", spreadsheet, 30, False))
+
+    await fan_out(steps)
+    logger.warning(format_report(steps))
+
+    return csv_data
+
+
+async def batch_main(args: argparse.Namespace) -> int:
+    """input_dirの会話ログを会話ごと・日ごとにまとめ、並行して要約・投稿する"""
+    batch_config = config.get("batch") or {}
+    input_dir = Path(args.paths[0] if args.paths else config["paths"]["input_dir"].strip())
+    group_by = args.group_by or batch_config.get("group_by", "conversation")
+    concurrency = args.concurrency or batch_config.get("concurrency", 2)
+
+    items = batch.group_exports(batch.scan_exports(input_dir), group_by)
+    if not items:
+        logger.warning(f"会話ログが見つかりませんでした: {input_dir}")
+        return 0
+    logger.warning(f"{input_dir}の会話ログを{len(items)}件にまとめて処理します（同時実行: {concurrency}）。")
+
+    # --enqueueの場合は、項目の順にspread_minutesおきに公開を予約
+    schedule = publish_queue.spread_schedule(
+        len(items), interval=timedelta(minutes=QUEUE_CONFIG.get("spread_minutes", 60))
+    )
+
+    async def pipeline(item: batch.BatchItem) -> dict | None:
+        watermarks = WATERMARKS.scoped() if WATERMARKS is not None else None
+        publish_at = schedule[items.index(item)] if args.enqueue else None
+        return await summarize_and_post(item.paths, args.fresh, watermarks, args.enqueue, publish_at)
+
+    start = time.monotonic()
+    # 各項目のLINE通知は終了時に5件ずつまとめて送り、実行記録とスプレッドシートの行は1回で書き込む
+    records = await run_in_thread(run_records)
+    records.hold = True
+    if SHEETS is not None:
+        SHEETS.hold = True
+    async with LINE.batch():
+        results = await batch.run_batch(items, pipeline, concurrency)
+    try:
+        await run_in_thread(records.flush)
+    except Exception as e:
+        logger.error(f"実行記録{records.pending}件を保存できませんでした: {e!r}")
+        logger.info("詳細: ", exc_info=True)
+        if RECORDS_CONFIG.get("csv_export", True):
+            logger.error(f"record.csvには書き込み済みです。`cha2hatena --import-csv {RECORD_PATH}` で取り込めます。")
+    if SHEETS is not None:
         try:
-            line_message.line_messenger(line_text, LINE_ACCESS_TOKEN)
+            await run_in_thread(SHEETS.flush)
         except Exception as e:
-            logger.error("エラー：LINE通知は行われませんでした。")
-            logger.info(f"詳細: {e}")
+            logger.error(f"スプレッドシートに書き込めませんでした: {e!r}")
+            logger.info("詳細: ", exc_info=True)
+    print(batch.format_summary(results, time.monotonic() - start))
+    return 1 if any(r.status == "failed" for r in results) else 0
+
+
+async def publish_main() -> int:
+    """投稿キューのエントリーを公開時刻に合わせて投稿する（失敗したエントリーも再試行）"""
+    if retried := PUBLISH_QUEUE.retry_failed():
+        logger.warning(f"前回失敗した{retried}件を再試行します。")
+    if not PUBLISH_QUEUE.entries(publish_queue.QUEUED):
+        logger.warning("投稿キューに投稿待ちのエントリーはありません。")
+        return 0
+    processed = await publish_queue.publish(
+        PUBLISH_QUEUE,
+        HATENA_SECRET_KEYS,
+        concurrency=QUEUE_CONFIG.get("concurrency", 2),
+        wait_scheduled=QUEUE_CONFIG.get("wait_scheduled", True),
+        max_retries=QUEUE_CONFIG.get("max_retries", 4),
+        base_delay=QUEUE_CONFIG.get("base_delay_sec", 2.0),
+        max_delay=QUEUE_CONFIG.get("max_delay_sec", 60.0),
+        index=POST_INDEX,
+    )
+    for entry in processed:
+        print(f"{entry.status:<10} {entry.title}  {entry.link_alternate or entry.error}")
+    return 1 if any(entry.status == publish_queue.FAILED for entry in processed) else 0
+
+
+async def costs_main(args: argparse.Namespace) -> int:
+    """実行記録のモデル・AI・日ごとの料金と月額の見込みを表示"""
+    from . import analytics  # NumPyは集計するときだけ読み込む
+
+    if args.paths:
+        history = await run_in_thread(analytics.RunHistory.from_csv, Path(args.paths[0]))
+    else:
+        history = await run_in_thread(lambda: analytics.RunHistory.from_store(run_records()))
+    report = analytics.cost_report(history, RECORDS_CONFIG.get("window_days", 30))
+    print(analytics.format_report(report))
+    return 0
 
-        # 為替レートを取得
-        ticker = "USDJPY=X"
-        try:
-            dy_rate = yf.Ticker(ticker).history(period="1d").Close.iloc[0]
-            total_JPY = llm_stats.total_fee * dy_rate
-        except Exception as e:
-            logger.error("ヤフーファイナンスから為替レートを取得できませんでした。詳細はapp.logを確認してください")
-            logger.info(f"詳細: {e}", exc_info=True)
-            total_JPY = None
-
-        ai_names = jl.ai_names_from_paths(input_paths)
-        conversation_titles = " ".join(jl.get_conversation_titles(input_paths, ai_names))
-
-        csv_data = {
-            "timestamp": datetime.now().isoformat(),
-            "conversation_title": conversation_titles,
-            "AI_name": " ".join(ai_names),
-            "entry_URL": url,
-            "is_draft": blogpost_result.get("is_draft"),
-            "entry_title": title,
-            "entry_content": content[:30],
-            "categories": ",".join(categories),
-            "prompt": LLM_CONFIG.prompt[:20],
-            "model": LLM_CONFIG.model,
-            "temperature": LLM_CONFIG.temperature,
-            "input_letter_count": llm_stats.input_letter_count,
-            "output_letter_count": llm_stats.output_letter_count,
-            "input_tokens": llm_stats.input_tokens,
-            "input_fee": llm_stats.input_fee,
-            "thoughts_tokens": llm_stats.thoughts_tokens,
-            "thoughts_fee": llm_stats.thoughts_fee,
-            "output_tokens": llm_stats.output_tokens,
-            "output_fee": llm_stats.output_fee,
-            "total_fee (USD)": llm_stats.total_fee,
-            "total_fee (JPY)": total_JPY,
-            "api_key": "..." + LLM_CONFIG.api_key[-5:],
-        }
-
-        summary_file_name = datetime.now().strftime("%y%m%d") + "-" + title
-
-        csv_dir = Path(config["paths"]["output_dir"].strip())
-        csv_dir.mkdir(exist_ok=True)
-        csv_path = csv_dir / "record.csv"
-        summary_dir = csv_dir / "summary"
-        summary_dir.mkdir(exist_ok=True)
-        summary_path = summary_dir / (f"{summary_file_name.replace('/', ', ')}.txt")
-        # ファイル出力
-        append_csv(csv_path, csv_data)
-        summary_path.write_text(content, encoding="utf-8")
-
-        # Googleスプレッドシートへ出力
-        SPREADSHEET_NAME = config["google_sheets"].get("spreadsheet_name", "record").strip()
-        if Path("credentials.json").exists():
-            to_spreadsheet(csv_data, SPREADSHEET_NAME)
+
+async def main():
+    try:
+        logger.debug("================================================")
+        logger.debug(f"アプリケーションが起動しました。デバッグモード：{DEBUG}")
+
+        args = parse_args(sys.argv[1:])
+        if args.import_csv:
+            imported = await run_in_thread(lambda: run_records().import_csv(args.import_csv))
+            print(f"{args.import_csv}から{imported}件を取り込みました。")
+            return 0
+        if args.costs:
+            return await costs_main(args)
+        if args.publish:
+            return await publish_main()
+        if args.batch:
+            return await batch_main(args)
+
+        if args.paths:
+            INPUT_PATHS_RAW = args.paths
+            logger.warning(f"処理を開始します: {', '.join(INPUT_PATHS_RAW)}")
+        else:
+            logger.error("エラー: 引数を入力する必要があります。実行を終了します")
+            sys.exit(1)
+
+        input_paths = list(map(Path, INPUT_PATHS_RAW))
+        await summarize_and_post(input_paths, args.fresh, enqueue=args.enqueue)
 
         logger.info("処理が正常に終了しました。")
 
@@ -214,4 +419,8 @@ async def main():
         logger.error("アプリケーションの実行を中止します。")
         logger.info("詳細: ", exc_info=True)
         sys.exit(1)
-        sys.exit(1)
+    finally:
+        await llm_clients.aclose()
+        await hatenablog_poster.atompub.aclose()
+        await LINE.aclose()
+        shutdown_process_pool()
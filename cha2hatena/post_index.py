@@ -0,0 +1,75 @@
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime
+from pathlib import Path
+
+from .file_lock import locked
+
+logger = logging.getLogger(__name__)
+
+
+def idempotency_key(conversation: str, model: str) -> str:
+    """同じ会話を同じモデルで要約した投稿を識別するキー"""
+    digest = hashlib.sha256()
+    digest.update(model.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(conversation.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class PostIndex:
+    """投稿済みの記事（link_edit）をidempotency_keyごとにJSONファイルで記録
+
+    投稿後・記録前にクラッシュして再実行した場合でも、同じキーの記事は新規投稿せずに更新できる。
+    put・discardは隣のロックファイルを排他ロックしてから読み直して書き込むため、
+    並行して投稿するほかのプロセス・スレッドの記録を消さない
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    def _load(self) -> dict[str, dict]:
+        try:
+            return json.loads(self.path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return {}
+        except json.JSONDecodeError:
+            logger.warning(f"投稿済みの索引を読み込めませんでした。空として扱います: {self.path}")
+            return {}
+
+    def _write(self, index: dict[str, dict]) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(index, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp_path, self.path)
+
+    def get(self, key: str) -> dict | None:
+        return self._load().get(key)
+
+    def put(self, key: str, result: dict) -> None:
+        """parse_responseの結果を記録"""
+        with locked(self.path):
+            index = self._load()
+            index[key] = {
+                "link_edit": result.get("link_edit", ""),
+                "link_alternate": result.get("link_alternate", ""),
+                "title": result.get("title", ""),
+                "posted_at": datetime.now().isoformat(),
+            }
+            self._write(index)
+
+    def discard(self, key: str) -> None:
+        with locked(self.path):
+            index = self._load()
+            if index.pop(key, None) is not None:
+                self._write(index)
+
+
+def post_index_from_config(config: dict) -> PostIndex | None:
+    """config.yamlのpost_indexから作成。無効な場合はNone"""
+    index_config = config.get("post_index") or {}
+    if not index_config.get("enabled", True):
+        return None
+    return PostIndex(Path(index_config.get("file", "outputs/post_index.json")))
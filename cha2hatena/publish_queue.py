@@ -0,0 +1,250 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from pydantic import BaseModel, Field
+
+from . import atom, hatenablog_poster
+from .file_lock import locked
+from .post_index import PostIndex
+
+logger = logging.getLogger(__name__)
+
+JST = timezone(timedelta(hours=9))
+
+QUEUED = "queued"
+PUBLISHED = "published"
+FAILED = "failed"
+
+# 時間をおけば成功する見込みがあるステータス（429・5xx）
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class QueuedEntry(BaseModel):
+    """投稿待ちのエントリー。publish_atになったら投稿し、はてなブログの公開時刻（updated）にも使う"""
+
+    id: str = Field(default_factory=lambda: uuid.uuid4().hex)
+    title: str
+    content: str
+    categories: list[str] = Field(default_factory=list)
+    preset_categories: list[str] = Field(default_factory=list)
+    author: str | None = None
+    publish_at: datetime | None = Field(default=None, description="Noneの場合は次の投稿処理ですぐに投稿")
+    is_draft: bool = False
+    idempotency_key: str = Field(default="", description="同じ会話・モデルの要約を重複して投稿しないためのキー")
+    status: str = QUEUED
+    attempts: int = 0
+    link_edit: str = ""
+    link_alternate: str = ""
+    error: str = ""
+    created_at: datetime = Field(default_factory=lambda: datetime.now(JST))
+
+    def is_due(self, now: datetime) -> bool:
+        return self.status == QUEUED and (self.publish_at is None or _aware(self.publish_at) <= now)
+
+    def as_result(self) -> dict:
+        """blog_postの戻り値と同じ形式（予約のみの場合はstatus_code 202）"""
+        return {
+            "status_code": 201 if self.status == PUBLISHED else 202,
+            "title": self.title,
+            "content": self.content,
+            "categories": self.categories + self.preset_categories,
+            "link_edit": self.link_edit,
+            "link_edit_user": self.link_edit.replace("atom/entry/", "edit?entry="),
+            "link_alternate": self.link_alternate,
+            "is_draft": self.is_draft,
+            "time": self.publish_at,
+        }
+
+
+def _aware(value: datetime) -> datetime:
+    return value if value.tzinfo is not None else value.replace(tzinfo=JST)
+
+
+def spread_schedule(count: int, start: datetime | None = None, interval: timedelta = timedelta(hours=1)) -> list:
+    """count件をstartからintervalおきに公開する時刻"""
+    start = _aware(start) if start is not None else datetime.now(JST)
+    return [start + interval * i for i in range(count)]
+
+
+class PublishQueue:
+    """投稿待ちのエントリーをJSONファイルで管理（プロセスを再起動しても続きから投稿できる）
+
+    保存時はロックファイルを排他ロックしてからファイルを読み直し、このインスタンスで変更したエントリーだけを上書きする。
+    要約してキューに追加するプロセスと投稿するプロセスが別でも、互いの変更を消さない
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._entries: dict[str, QueuedEntry] = self._load()
+        self._dirty: set[str] = set()
+
+    def _load(self) -> dict[str, QueuedEntry]:
+        try:
+            raw = json.loads(self.path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return {}
+        except json.JSONDecodeError:
+            logger.warning(f"投稿キューのファイルを読み込めませんでした。空のキューとして扱います: {self.path}")
+            return {}
+        return {item["id"]: QueuedEntry.model_validate(item) for item in raw}
+
+    def save(self) -> None:
+        with locked(self.path):
+            entries = self._load()
+            entries.update({entry_id: self._entries[entry_id] for entry_id in self._dirty})
+            self._entries = entries
+            self._dirty.clear()
+
+            tmp_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+            data = [entry.model_dump(mode="json") for entry in entries.values()]
+            tmp_path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+            os.replace(tmp_path, self.path)
+
+    def update(self, entry: QueuedEntry) -> None:
+        self._entries[entry.id] = entry
+        self._dirty.add(entry.id)
+        self.save()
+
+    def add(self, **fields) -> QueuedEntry:
+        """エントリーを追加。同じidempotency_keyの投稿待ちのエントリーがあれば内容を置き換える"""
+        entry = QueuedEntry(**fields)
+        if entry.idempotency_key:
+            for queued in self.entries(QUEUED):
+                if queued.idempotency_key == entry.idempotency_key:
+                    logger.warning(f"同じ会話・モデルの要約が投稿キューにあるため置き換えます: {queued.title}")
+                    entry = entry.model_copy(update={"id": queued.id, "created_at": queued.created_at})
+                    break
+        self.update(entry)
+        when = entry.publish_at.isoformat() if entry.publish_at else "次の投稿処理"
+        logger.warning(f"投稿キューに追加しました: {entry.title}（公開: {when}）")
+        return entry
+
+    def entries(self, status: str | None = None) -> list[QueuedEntry]:
+        entries = sorted(
+            self._entries.values(), key=lambda e: (e.publish_at is not None, _aware(e.publish_at or e.created_at))
+        )
+        return [entry for entry in entries if status is None or entry.status == status]
+
+    def retry_failed(self) -> int:
+        """失敗したエントリーを投稿待ちに戻す"""
+        failed = self.entries(FAILED)
+        for entry in failed:
+            self.update(entry.model_copy(update={"status": QUEUED, "error": ""}))
+        return len(failed)
+
+
+def retry_delay(attempt: int, base_delay: float, max_delay: float, retry_after: str | None = None) -> float:
+    """待ち時間。Retry-After（秒）があればそれに従い、なければ指数バックオフの範囲でランダム（full jitter）"""
+    if retry_after and retry_after.isdigit():
+        return min(float(retry_after), max_delay)
+    return random.uniform(0, min(max_delay, base_delay * 2**attempt))
+
+
+async def post_entry(
+    entry: QueuedEntry,
+    hatena_secret_keys: dict,
+    client: hatenablog_poster.AtomPubClient | None = None,
+    max_retries: int = 4,
+    base_delay: float = 2.0,
+    max_delay: float = 60.0,
+    index: PostIndex | None = None,
+) -> dict:
+    """エントリーを投稿し、parse_responseの結果を返す。429・5xx・通信エラーはバックオフして再試行"""
+    xml_entry = atom.render_entry(
+        entry.title,
+        entry.content,
+        entry.categories,
+        entry.preset_categories,
+        entry.author,
+        entry.publish_at,
+        entry.is_draft,
+    )
+    transport_errors = (hatenablog_poster.oauth_httpx().TransportError, OSError)
+    for attempt in range(max_retries + 1):
+        retry_after = None
+        try:
+            response = await hatenablog_poster.send_entry(
+                xml_entry, hatena_secret_keys, client, index, entry.idempotency_key
+            )
+        except transport_errors as e:
+            if attempt == max_retries:
+                raise
+            logger.warning(f"投稿中に通信エラーが発生しました: {e!r}")
+        else:
+            if response.status_code in (200, 201):
+                result = atom.parse_entry(response.content, response.status_code)
+                hatenablog_poster.record_post(index, entry.idempotency_key, result)
+                return result
+            if response.status_code not in RETRYABLE_STATUS or attempt == max_retries:
+                raise RuntimeError(f"はてなブログへの投稿に失敗しました（ステータス: {response.status_code}）")
+            retry_after = response.headers.get("Retry-After")
+        delay = retry_delay(attempt, base_delay, max_delay, retry_after)
+        logger.warning(f"{delay:.1f}秒後に再試行します（{attempt + 1}/{max_retries}）: {entry.title}")
+        await asyncio.sleep(delay)
+    raise AssertionError("unreachable")
+
+
+async def publish(
+    queue: PublishQueue,
+    hatena_secret_keys: dict,
+    concurrency: int = 2,
+    wait_scheduled: bool = True,
+    client: hatenablog_poster.AtomPubClient | None = None,
+    index: PostIndex | None = None,
+    **retry_options,
+) -> list[QueuedEntry]:
+    """公開時刻になったエントリーを最大concurrency件まで並行して投稿し、処理したエントリーを返す
+
+    wait_scheduled=Trueの場合は、予約中のエントリーがなくなるまで公開時刻を待って投稿を続ける。
+    indexを指定した場合、投稿済みのidempotency_keyのエントリーは既存の記事を更新する
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    processed: list[QueuedEntry] = []
+
+    async def publish_one(entry: QueuedEntry) -> None:
+        async with semaphore:
+            entry = entry.model_copy(update={"attempts": entry.attempts + 1})
+            try:
+                result = await post_entry(entry, hatena_secret_keys, client, index=index, **retry_options)
+            except Exception as e:
+                logger.error(f"投稿できませんでした: {entry.title}: {e!r}")
+                logger.info("詳細: ", exc_info=True)
+                entry = entry.model_copy(update={"status": FAILED, "error": repr(e)})
+            else:
+                logger.warning(f"✓ 投稿しました: {entry.title} {result['link_alternate']}")
+                entry = entry.model_copy(
+                    update={
+                        "status": PUBLISHED,
+                        "error": "",
+                        "link_edit": result["link_edit"],
+                        "link_alternate": result["link_alternate"],
+                    }
+                )
+            queue.update(entry)
+            processed.append(entry)
+
+    while True:
+        now = datetime.now(JST)
+        due = [entry for entry in queue.entries(QUEUED) if entry.is_due(now)]
+        if due:
+            await asyncio.gather(*(publish_one(entry) for entry in due))
+            continue
+        scheduled = queue.entries(QUEUED)
+        if not scheduled or not wait_scheduled:
+            return processed
+        next_at = min(_aware(entry.publish_at) for entry in scheduled)
+        wait = (next_at - now).total_seconds()
+        logger.warning(f"次の投稿（{next_at.isoformat()}）まで{wait:.0f}秒待ちます。残り{len(scheduled)}件")
+        await asyncio.sleep(max(wait, 0))
+
+
+def publish_queue_from_config(config: dict) -> PublishQueue:
+    """config.yamlのpublish_queueから作成"""
+    queue_config = config.get("publish_queue") or {}
+    return PublishQueue(Path(queue_config.get("file", "outputs/publish_queue.json")))
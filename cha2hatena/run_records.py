@@ -0,0 +1,201 @@
+import csv
+import logging
+import threading
+from datetime import datetime
+from pathlib import Path
+
+from sqlalchemy import Index, String, Text, create_engine, func, insert, select
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, sessionmaker
+
+logger = logging.getLogger(__name__)
+
+
+class Base(DeclarativeBase):
+    pass
+
+
+class RunRecord(Base):
+    """1回の要約・投稿の記録（record.csvの1行）"""
+
+    __tablename__ = "run_records"
+    __table_args__ = (Index("ix_run_records_model_timestamp", "model", "timestamp"),)  # モデルごとの期間集計用
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    timestamp: Mapped[datetime] = mapped_column(index=True)
+    conversation_title: Mapped[str] = mapped_column(Text, default="")
+    ai_name: Mapped[str] = mapped_column(String(100), default="")
+    entry_url: Mapped[str] = mapped_column(String(500), default="", index=True)
+    is_draft: Mapped[bool | None] = mapped_column(nullable=True)
+    entry_title: Mapped[str] = mapped_column(Text, default="")
+    entry_content: Mapped[str] = mapped_column(Text, default="")
+    categories: Mapped[str] = mapped_column(Text, default="")
+    prompt: Mapped[str] = mapped_column(Text, default="")
+    model: Mapped[str] = mapped_column(String(100), default="", index=True)
+    temperature: Mapped[float | None] = mapped_column(nullable=True)
+    input_letter_count: Mapped[int] = mapped_column(default=0)
+    output_letter_count: Mapped[int] = mapped_column(default=0)
+    input_tokens: Mapped[int] = mapped_column(default=0)
+    input_fee: Mapped[float] = mapped_column(default=0.0)
+    thoughts_tokens: Mapped[int] = mapped_column(default=0)
+    thoughts_fee: Mapped[float] = mapped_column(default=0.0)
+    output_tokens: Mapped[int] = mapped_column(default=0)
+    output_fee: Mapped[float] = mapped_column(default=0.0)
+    total_fee_usd: Mapped[float] = mapped_column(default=0.0)
+    total_fee_jpy: Mapped[float | None] = mapped_column(nullable=True)
+    api_key: Mapped[str] = mapped_column(String(20), default="")
+
+    def __repr__(self) -> str:
+        return f"RunRecord(id={self.id!r}, timestamp={self.timestamp!r}, model={self.model!r})"
+
+
+# record.csvの列名 -> RunRecordの属性
+CSV_COLUMNS = {
+    "timestamp": "timestamp",
+    "conversation_title": "conversation_title",
+    "AI_name": "ai_name",
+    "entry_URL": "entry_url",
+    "is_draft": "is_draft",
+    "entry_title": "entry_title",
+    "entry_content": "entry_content",
+    "categories": "categories",
+    "prompt": "prompt",
+    "model": "model",
+    "temperature": "temperature",
+    "input_letter_count": "input_letter_count",
+    "output_letter_count": "output_letter_count",
+    "input_tokens": "input_tokens",
+    "input_fee": "input_fee",
+    "thoughts_tokens": "thoughts_tokens",
+    "thoughts_fee": "thoughts_fee",
+    "output_tokens": "output_tokens",
+    "output_fee": "output_fee",
+    "total_fee (USD)": "total_fee_usd",
+    "total_fee (JPY)": "total_fee_jpy",
+    "api_key": "api_key",
+}
+
+_INT_COLUMNS = {"input_letter_count", "output_letter_count", "input_tokens", "thoughts_tokens", "output_tokens"}
+_FLOAT_COLUMNS = {"temperature", "input_fee", "thoughts_fee", "output_fee", "total_fee_usd", "total_fee_jpy"}
+
+
+def _convert(attr: str, value):
+    """CSVから読んだ文字列（main.pyのcsv_dataの場合はそのままの値）を列の型へ"""
+    if not isinstance(value, str):
+        return value
+    if attr == "timestamp":
+        return datetime.fromisoformat(value)
+    if attr in _INT_COLUMNS:
+        return int(float(value)) if value else 0
+    if attr in _FLOAT_COLUMNS:
+        return float(value) if value else None
+    if attr == "is_draft":
+        return {"True": True, "False": False}.get(value)
+    return value
+
+
+def record_values(row: dict) -> dict:
+    """record.csvの1行（列名はCSV_COLUMNS）をRunRecordの値に変換。知らない列は無視する"""
+    values = {attr: _convert(attr, row[column]) for column, attr in CSV_COLUMNS.items() if column in row}
+    for attr in ("input_fee", "thoughts_fee", "output_fee", "total_fee_usd"):
+        if values.get(attr) is None:
+            values[attr] = 0.0
+    return values
+
+
+class RunRecordStore:
+    """実行記録をSQLAlchemyのDB（既定はローカルのSQLiteファイル）に保存する
+
+    hold=Trueの間はappend()した行をためておき、flush()で1回のINSERTにまとめる（バッチ実行用）。
+    メソッドはブロッキングするためスレッドで呼ぶ
+    """
+
+    def __init__(self, url: str = "sqlite:///outputs/records.db"):
+        if url.startswith("sqlite:///"):
+            Path(url.removeprefix("sqlite:///")).parent.mkdir(parents=True, exist_ok=True)
+        self.engine = create_engine(url)
+        self.session_factory = sessionmaker(bind=self.engine, expire_on_commit=False)
+        Base.metadata.create_all(bind=self.engine)
+        self.hold = False
+        self._rows: list[dict] = []
+        self._lock = threading.Lock()
+
+    def append(self, row: dict) -> None:
+        """1行を記録。hold=Trueの場合はflush()までためておく"""
+        with self._lock:
+            self._rows.append(record_values(row))
+        if not self.hold:
+            self.flush()
+
+    def flush(self) -> int:
+        """ためている行を1回のINSERTで保存し、保存した行数を返す。失敗した場合は行を戻して例外を送出する"""
+        with self._lock:
+            rows, self._rows = self._rows, []
+        if rows:
+            try:
+                self._insert(rows)
+            except Exception:
+                with self._lock:
+                    self._rows = rows + self._rows  # 次回のflushで再試行
+                raise
+            logger.warning(f"実行記録を{len(rows)}件保存しました。")
+        return len(rows)
+
+    @property
+    def pending(self) -> int:
+        """保存していない行数"""
+        return len(self._rows)
+
+    def _insert(self, rows: list[dict]) -> None:
+        with self.session_factory() as db:
+            db.execute(insert(RunRecord), rows)
+            db.commit()
+
+    def import_csv(self, path: Path) -> int:
+        """既存のrecord.csvを取り込み、取り込んだ行数を返す。同じtimestampの行は取り込み済みとして飛ばす"""
+        with Path(path).open(newline="", encoding="utf-8-sig") as f:
+            rows = [record_values(row) for row in csv.DictReader(f) if row.get("timestamp")]
+        with self.session_factory() as db:
+            existing = set(db.scalars(select(RunRecord.timestamp)))
+        new_rows = []
+        for row in rows:
+            if row["timestamp"] not in existing:
+                existing.add(row["timestamp"])
+                new_rows.append(row)
+        if new_rows:
+            self._insert(new_rows)
+        logger.warning(f"{path}から{len(new_rows)}件を取り込みました（取り込み済み {len(rows) - len(new_rows)}件）。")
+        return len(new_rows)
+
+    def rows(self, since: datetime | None = None) -> list[dict]:
+        """記録（RunRecordの属性名の辞書）を時刻順に"""
+        query = select(RunRecord).order_by(RunRecord.timestamp)
+        if since is not None:
+            query = query.where(RunRecord.timestamp >= since)
+        with self.session_factory() as db:
+            return [{attr: getattr(record, attr) for attr in CSV_COLUMNS.values()} for record in db.scalars(query)]
+
+    def export_csv(self, path: Path, since: datetime | None = None) -> int:
+        """record.csvと同じ列でCSVに書き出し、書き出した行数を返す"""
+        rows = self.rows(since)
+        with Path(path).open("w", newline="", encoding="utf-8-sig") as f:
+            writer = csv.writer(f)
+            writer.writerow(CSV_COLUMNS.keys())
+            for row in rows:
+                writer.writerow(
+                    row[attr].isoformat() if attr == "timestamp" else row[attr] for attr in CSV_COLUMNS.values()
+                )
+        return len(rows)
+
+    def spend_by_model(self, since: datetime | None = None) -> dict[str, float]:
+        """モデルごとの料金（USD）の合計"""
+        query = select(RunRecord.model, func.sum(RunRecord.total_fee_usd)).group_by(RunRecord.model)
+        if since is not None:
+            query = query.where(RunRecord.timestamp >= since)
+        with self.session_factory() as db:
+            return {model: total or 0.0 for model, total in db.execute(query)}
+
+
+def run_record_store_from_config(config: dict) -> RunRecordStore:
+    """config.yamlのrecordsから作成"""
+    records_config = config.get("records") or {}
+    return RunRecordStore(records_config.get("database_url", "sqlite:///outputs/records.db"))
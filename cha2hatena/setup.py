@@ -85,6 +85,12 @@ def config_setup() -> tuple[dict, dict]:
     return config, secret_keys
 
 
+def provider_api_keys() -> dict[str, str]:
+    """フェイルオーバー用にプロバイダごとのAPIキーを取得（未設定のものは除く）"""
+    keys = {"deepseek": os.getenv("DEEPSEEK_API_KEY", ""), "gemini": os.getenv("GEMINI_API_KEY", "")}
+    return {provider: key for provider, key in keys.items() if key.strip() and not key.lower().startswith("your")}
+
+
 def log_setup(logger: logging.Logger, initial_level: int, console_format: str) -> tuple:
     """ハンドラー設定"""
 
@@ -0,0 +1,92 @@
+import logging
+import threading
+from collections.abc import Callable
+from functools import lru_cache
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+SCOPES = ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive"]
+
+
+@lru_cache
+def authorize(credentials_filename: str):
+    """認証済みのgspreadクライアント（プロセス内で使い回す）"""
+    import gspread  # スプレッドシートを使う場合のみ読み込む
+
+    return gspread.oauth(scopes=SCOPES, credentials_filename=credentials_filename)
+
+
+class SheetsSink:
+    """record.csvと同じ行をGoogleスプレッドシートに書き込む
+
+    クライアントとワークシートは初回だけ取得して使い回す。ヘッダーの有無はA1の1セルだけで確認し、
+    シート全体は読まない（行数が増えても1回あたりの通信量は一定）。hold=Trueの間はappend()した行をためておき、
+    flush()で1回のappend_rowsにまとめて書き込む（バッチ実行用）。メソッドはブロッキングするためスレッドで呼ぶ
+    """
+
+    def __init__(
+        self,
+        spreadsheet_name: str,
+        credentials_filename: str = "credentials.json",
+        client_factory: Callable[[str], object] = authorize,
+    ):
+        self.spreadsheet_name = spreadsheet_name
+        self.credentials_filename = credentials_filename
+        self.client_factory = client_factory
+        self.hold = False
+        self._worksheet = None
+        self._has_header: bool | None = None
+        self._rows: list[dict] = []
+        self._lock = threading.Lock()
+
+    def _open(self):
+        if self._worksheet is None:
+            import gspread
+
+            gc = self.client_factory(self.credentials_filename)
+            try:
+                self._worksheet = gc.open(self.spreadsheet_name).sheet1
+            except gspread.exceptions.SpreadsheetNotFound:
+                # スプレッドシートが存在しない場合、新規作成
+                self._worksheet = gc.create(self.spreadsheet_name).sheet1
+                self._has_header = False
+                logger.warning(f"新規スプレッドシートを作成しました: {self.spreadsheet_name}")
+        if self._has_header is None:
+            self._has_header = bool(self._worksheet.acell("A1").value)
+        return self._worksheet
+
+    def append(self, row: dict) -> None:
+        """行を追加。hold=Trueの場合はflush()までためておく"""
+        with self._lock:
+            self._rows.append(row)
+        if not self.hold:
+            self.flush()
+
+    def flush(self) -> int:
+        """ためている行を1回のappend_rowsで書き込み、書き込んだ行数を返す"""
+        with self._lock:
+            rows, self._rows = self._rows, []
+            if not rows:
+                return 0
+            try:
+                worksheet = self._open()
+                values = [list(row.values()) for row in rows]
+                if not self._has_header:
+                    values.insert(0, list(rows[0].keys()))
+                worksheet.append_rows(values)
+            except Exception:
+                self._rows = rows + self._rows  # 次回のflushで再試行
+                raise
+            self._has_header = True
+        logger.warning(f"スプレッドシートに{len(rows)}行を追加しました: {self.spreadsheet_name}")
+        return len(rows)
+
+
+def sheets_sink_from_config(config: dict) -> SheetsSink | None:
+    """config.yamlのgoogle_sheetsから作成。credentials.jsonがなければNone"""
+    sheets_config = config.get("google_sheets") or {}
+    credentials_filename = sheets_config.get("credentials_file", "credentials.json")
+    if not Path(credentials_filename).exists():
+        return None
+    return SheetsSink(sheets_config.get("spreadsheet_name", "record").strip(), credentials_filename)
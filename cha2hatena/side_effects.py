@@ -0,0 +1,101 @@
+import asyncio
+import logging
+import threading
+import time
+from collections.abc import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+
+async def run_in_thread(func: Callable, *args):
+    """ブロッキングする関数をデーモンスレッドで実行
+
+    タイムアウトで見切った処理がプロセスの終了を止めないよう、to_threadのスレッドプールではなくデーモンスレッドを使う
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def set_result(result, error):
+        if not future.done():
+            future.set_exception(error) if error is not None else future.set_result(result)
+
+    def target():
+        try:
+            result, error = func(*args), None
+        except Exception as e:
+            result, error = None, e
+        try:
+            loop.call_soon_threadsafe(set_result, result, error)
+        except RuntimeError:
+            pass  # イベントループが終了済み
+
+    threading.Thread(target=target, name=getattr(func, "__name__", "side_effect"), daemon=True).start()
+    return await future
+
+
+class Step:
+    """投稿後に行う1つの処理。runは引数なしで呼ぶとコルーチンを返す
+
+    失敗・タイムアウトは例外にせずstatusに記録する。他のStepの結果を使う場合は`await step.task`で待つ（失敗時はNone）
+    """
+
+    def __init__(self, name: str, run: Callable[[], Awaitable], timeout: float | None = None, required: bool = True):
+        self.name = name
+        self.run = run
+        self.timeout = timeout
+        self.required = required
+        self.task: asyncio.Task | None = None
+        self.status = "pending"  # ok / timeout / error / abandoned
+        self.seconds = 0.0
+        self.value = None
+        self.detail = ""
+
+    def start(self) -> asyncio.Task:
+        self.task = asyncio.create_task(self._timed())
+        return self.task
+
+    async def _timed(self):
+        start = time.monotonic()
+        try:
+            self.value = await asyncio.wait_for(self.run(), self.timeout)
+            self.status = "ok"
+        except TimeoutError:
+            self.status = "timeout"
+            self.detail = f"{self.timeout}秒以内に終わりませんでした"
+            logger.error(f"{self.name}: {self.detail}")
+        except Exception as e:
+            self.status = "error"
+            self.detail = repr(e)
+            logger.error(f"{self.name}に失敗しました: {e!r}")
+            logger.info("詳細: ", exc_info=True)
+        finally:
+            self.seconds = time.monotonic() - start
+        return self.value
+
+
+async def fan_out(steps: list[Step]) -> list[Step]:
+    """stepsを並行して実行し、required=Trueの処理がすべて終わった時点で返す
+
+    その時点で終わっていない任意の処理は打ち切る（スレッドで実行中のものはバックグラウンドで続く）
+    """
+    for step in steps:
+        step.start()
+    required = [step.task for step in steps if step.required]
+    if required:
+        await asyncio.wait(required)
+    for step in steps:
+        if not step.task.done():
+            step.task.cancel()
+            step.status = "abandoned"
+            step.detail = "必須の処理が終わったため待たずに終了"
+    await asyncio.gather(*(step.task for step in steps), return_exceptions=True)
+    return steps
+
+
+def format_report(steps: list[Step]) -> str:
+    """処理ごとの結果と所要時間"""
+    lines = ["投稿後の処理:"]
+    for step in steps:
+        mark = "必須" if step.required else "任意"
+        lines.append(f"  {step.name:<14} [{mark}] {step.status:<9} {step.seconds:6.2f}秒  {step.detail}")
+    return "\n".join(lines)
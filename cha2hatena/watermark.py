@@ -0,0 +1,66 @@
+import copy
+import json
+import logging
+import os
+from datetime import datetime
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+def conversation_key(metadata: dict) -> str | None:
+    """エクスポートのmetadataから会話を識別するキー（link優先、なければtitle）"""
+    if not isinstance(metadata, dict):
+        return None
+    return metadata.get("link") or metadata.get("title") or None
+
+
+class WatermarkStore:
+    """会話ごとに投稿済みの最新メッセージ時刻（ウォーターマーク）をJSONファイルで管理
+
+    読み込み時にstage()した値は、投稿が成功してcommit()するまで保存しない
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._staged: dict[str, datetime] = {}
+        try:
+            raw = json.loads(self.path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            raw = {}
+        except json.JSONDecodeError:
+            logger.warning(f"ウォーターマークファイルを読み込めませんでした。初回として扱います: {self.path}")
+            raw = {}
+        self._marks = {key: datetime.fromisoformat(value) for key, value in raw.items()}
+
+    def get(self, key: str) -> datetime | None:
+        return self._marks.get(key)
+
+    def stage(self, key: str, latest: datetime) -> None:
+        """今回読み込んだ会話の最新時刻を保留"""
+        if key in self._staged:
+            latest = max(latest, self._staged[key])
+        self._staged[key] = latest
+
+    def commit(self) -> None:
+        """保留中のウォーターマークを保存"""
+        if not self._staged:
+            return
+        self._marks.update(self._staged)
+        self._staged.clear()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+        data = {key: value.isoformat() for key, value in self._marks.items()}
+        tmp_path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp_path, self.path)
+        logger.warning(f"ウォーターマークを更新しました: {self.path.name}")
+
+    def scoped(self) -> "WatermarkStore":
+        """保存済みの値を共有し、保留中の値だけを分けたストア（並行して処理する項目ごとにcommitするため）"""
+        child = copy.copy(self)
+        child._staged = {}
+        return child
+
+    def discard(self) -> None:
+        self._staged.clear()
@@ -0,0 +1,145 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app import app
+from app.core.security import get_current_active_user
+from app.routers import analytics as analytics_router
+from cha2hatena import analytics
+from cha2hatena.llm.llm_stats import TokenStats
+from cha2hatena.run_records import RunRecordStore
+
+START = datetime(2025, 1, 1, 9, 0, 0)
+
+
+def history() -> analytics.RunHistory:
+    return analytics.RunHistory(
+        timestamp=[START, START + timedelta(hours=1), START + timedelta(days=1), START + timedelta(days=2)],
+        model=["gemini-2.5-flash", "deepseek-chat", "gemini-2.5-pro", "gemini-2.5-pro"],
+        source=["ChatGPT", "Claude", "ChatGPT", "Gemini"],
+        input_tokens=[10_000, 20_000, 100_000, 300_000],
+        thoughts_tokens=[0, 0, 1_000, 2_000],
+        output_tokens=[1_000, 2_000, 3_000, 4_000],
+        input_letter_count=[20_000, 40_000, 0, 600_000],
+        output_letter_count=[2_000, 4_000, 6_000, 8_000],
+    )
+
+
+def test_fees_match_token_stats_and_apply_gemini_tier_by_input():
+    fee = analytics.fees(history())
+
+    for i, (model, tokens) in enumerate(
+        [("gemini-2.5-flash", (10_000, 0, 1_000)), ("deepseek-chat", (20_000, 0, 2_000))]
+    ):
+        stats = TokenStats(*tokens, 0, 0, model)
+        assert fee["total"][i] == pytest.approx(stats.total_fee)
+    # 入力20万トークン以下は低い区分、超えると入力・出力とも高い区分
+    assert fee["total"][2] == pytest.approx((100_000 * 1.25 + 4_000 * 10.0) / 1e6)
+    assert fee["total"][3] == pytest.approx((300_000 * 2.5 + 6_000 * 15.0) / 1e6)
+    assert fee["over_threshold"].tolist() == [False, False, False, True]
+
+
+def test_cost_report_groups_and_projection():
+    report = analytics.cost_report(history(), window_days=2)
+    fee = analytics.fees(history())["total"]
+
+    assert report["runs"] == 4
+    assert report["total_fee_usd"] == pytest.approx(fee.sum())
+    assert report["by_model"]["gemini-2.5-pro"]["runs"] == 2
+    assert report["by_model"]["gemini-2.5-pro"]["input_tokens_per_letter"] == pytest.approx(0.5)
+    assert report["by_source"]["ChatGPT"]["fee_usd"] == pytest.approx(fee[0] + fee[2])
+    assert report["by_day"] == pytest.approx(
+        {"2025-01-01": fee[0] + fee[1], "2025-01-02": fee[2], "2025-01-03": fee[3]}
+    )
+    assert report["over_tier_threshold"] == {"runs": 1, "fee_usd": pytest.approx(fee[3])}
+    # 最後の実行（1/3 9:00）から48時間以内（1/1 10:00以降）の料金の1日平均×30日
+    assert report["projected_monthly_usd"] == pytest.approx((fee[1] + fee[2] + fee[3]) / 2 * 30)
+    per_letter = analytics.tokens_per_letter(history())["input"]
+    assert per_letter[0] == 0.5 and np.isnan(per_letter[2])  # 文字数が0の行はnan
+
+
+def test_empty_history():
+    report = analytics.cost_report(analytics.RunHistory([], [], [], [], [], [], [], []))
+    assert report["runs"] == 0 and report["total_fee_usd"] == 0.0 and report["projected_monthly_usd"] == 0.0
+
+
+def test_csv_and_store_give_the_same_report(tmp_path):
+    store = RunRecordStore(f"sqlite:///{tmp_path / 'records.db'}")
+    store.hold = True
+    h = history()
+    for i in range(len(h)):
+        store.append(
+            {
+                "timestamp": h.timestamp[i].item(),
+                "AI_name": str(h.sources[h.source_codes[i]]),
+                "model": str(h.models[h.model_codes[i]]),
+                "input_tokens": int(h.input_tokens[i]),
+                "thoughts_tokens": int(h.thoughts_tokens[i]),
+                "output_tokens": int(h.output_tokens[i]),
+                "input_letter_count": int(h.input_letter_count[i]),
+                "output_letter_count": int(h.output_letter_count[i]),
+                "total_fee (USD)": 0.01,
+            }
+        )
+    store.flush()
+    store.export_csv(tmp_path / "record.csv")
+
+    from_store = analytics.cost_report(analytics.RunHistory.from_store(store))
+    from_csv = analytics.cost_report(analytics.RunHistory.from_csv(tmp_path / "record.csv"))
+    assert from_store == from_csv == analytics.cost_report(h) | {"recorded_fee_usd": pytest.approx(0.04)}
+
+
+@pytest.mark.asyncio
+async def test_costs_endpoint(tmp_path, monkeypatch):
+    store = RunRecordStore(f"sqlite:///{tmp_path / 'records.db'}")
+    store.append({"timestamp": START, "AI_name": "Claude", "model": "deepseek-chat", "input_tokens": 1_000_000})
+    monkeypatch.setattr(analytics_router, "run_records", lambda: store)
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://localhost") as client:
+        assert (await client.get("/analytics/costs")).status_code == 401
+        app.dependency_overrides[get_current_active_user] = lambda: object()
+        try:
+            response = await client.get("/analytics/costs", params={"window_days": 7})
+        finally:
+            app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["by_model"]["deepseek-chat"]["fee_usd"] == pytest.approx(0.28)
+    assert body["projected_monthly_usd"] == pytest.approx(0.28 / 7 * 30)
+
+
+def test_vectorized_fees_match_token_stats_per_row():
+    rng = np.random.default_rng(0)
+    n = 5_000
+    models = np.array(["gemini-2.5-flash", "gemini-2.5-pro", "deepseek-chat", "deepseek-reasoner"])
+    input_tokens = rng.integers(1_000, 400_000, n)
+    output_tokens = rng.integers(100, 8_000, n)
+    synthetic = analytics.RunHistory(
+        timestamp=np.datetime64("2024-01-01T00:00:00") + rng.integers(0, 365 * 86400, n).astype("timedelta64[s]"),
+        model=models[rng.integers(0, len(models), n)],
+        source=np.full(n, "Claude"),
+        input_tokens=input_tokens,
+        thoughts_tokens=rng.integers(0, 2_000, n),
+        output_tokens=output_tokens,
+        input_letter_count=input_tokens * 2,
+        output_letter_count=output_tokens * 2,
+    )
+
+    report = analytics.cost_report(synthetic)
+
+    per_row = [
+        TokenStats(
+            int(input_tokens[i]),
+            int(synthetic.thoughts_tokens[i]),
+            int(output_tokens[i]),
+            0,
+            0,
+            str(synthetic.models[synthetic.model_codes[i]]),
+        ).total_fee
+        for i in range(n)
+    ]
+    assert analytics.fees(synthetic)["total"] == pytest.approx(per_row)
+    assert report["runs"] == n and report["total_fee_usd"] == pytest.approx(sum(per_row))
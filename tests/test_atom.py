@@ -0,0 +1,88 @@
+import random
+import xml.etree.ElementTree as ET
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from cha2hatena import atom
+from cha2hatena.hatenablog_poster import parse_response, xml_unparser
+
+# XMLで使える文字のうち、エスケープや空白の扱いが問題になりやすいもの
+TRICKY = ["&", "<", ">", '"', "'", "\n", "\r\n", "\t", " ", "]]>", "&amp;", "日本語", "😀", "　", "\x85"]
+
+
+def random_text(rng: random.Random) -> str:
+    return "".join(
+        rng.choice(TRICKY) if rng.random() < 0.4 else chr(rng.randint(0x20, 0x7E)) for _ in range(rng.randint(0, 12))
+    )
+
+
+def random_entry(rng: random.Random) -> dict:
+    jst = timezone(timedelta(hours=9))
+    updated = rng.choice([datetime(2025, 1, 2, 3, 4, 5), datetime(2025, 6, 1, 12, 0, 0, 123456, tzinfo=jst)])
+    return {
+        "title": random_text(rng),
+        "content": random_text(rng),
+        "categories": [random_text(rng) for _ in range(rng.randint(0, 3))],
+        "preset_categories": [random_text(rng) for _ in range(rng.randint(0, 2))],
+        "author": rng.choice([None, "", random_text(rng)]),
+        "updated": updated,
+        "is_draft": rng.random() < 0.5,
+    }
+
+
+def response_xml(entry: dict, n: int = 1) -> str:
+    """はてなブログの応答に近いentry（リンク付き）"""
+    body = xml_unparser(**entry)
+    links = (
+        f'<link rel="edit" href="https://blog.hatena.ne.jp/u/u.hatenablog.com/atom/entry/{n}"/>'
+        f'<link rel="alternate" type="text/html" href="https://u.hatenablog.com/entry/{n}"/>'
+    )
+    return body.replace("<title", links + "<title", 1)
+
+
+def test_render_entry_matches_element_tree_fuzz():
+    rng = random.Random(20250101)
+    for _ in range(500):
+        entry = random_entry(rng)
+        expected = xml_unparser(**entry)
+        actual = atom.render_entry(**entry)
+        assert actual == expected
+        assert ET.canonicalize(actual) == ET.canonicalize(expected)
+
+
+def test_parse_entry_matches_parse_response_fuzz():
+    rng = random.Random(7)
+    for _ in range(500):
+        text = response_xml(random_entry(rng))
+        expected = parse_response(SimpleNamespace(text=text, status_code=201))
+        assert atom.parse_entry(text, 201) == expected
+        assert atom.parse_entry(text.encode("utf-8"), 201) == expected
+
+
+def test_feed_parser_streams_entries_and_next_link():
+    rng = random.Random(3)
+    entries = [response_xml(random_entry(rng), n).replace(f' xmlns="{atom.ATOM_NS}"', "", 1) for n in range(20)]
+    feed = (
+        f'<?xml version="1.0" encoding="utf-8"?><feed xmlns="{atom.ATOM_NS}" xmlns:app="{atom.APP_NS}">'
+        '<link rel="first" href="https://example.com/atom/entry"/>'
+        '<link rel="next" href="https://example.com/atom/entry?page=2"/>' + "".join(entries) + "</feed>"
+    ).encode("utf-8")
+    chunks = [feed[i : i + 37] for i in range(0, len(feed), 37)]  # マルチバイト文字の途中でも分割
+
+    parser = atom.FeedParser()
+    parsed = [entry for chunk in chunks for entry in parser.feed(chunk)] + parser.close()
+
+    assert [e["link_alternate"] for e in parsed] == [f"https://u.hatenablog.com/entry/{n}" for n in range(20)]
+    assert parser.next_url == "https://example.com/atom/entry?page=2"
+    root = ET.fromstring(feed)
+    assert parsed == [atom.entry_to_dict(e) for e in root.findall(f"{{{atom.ATOM_NS}}}entry")]
+    assert list(atom.iter_entries(chunks)) == parsed
+
+
+def test_feed_parser_rejects_truncated_feed():
+    parser = atom.FeedParser()
+    parser.feed(f'<feed xmlns="{atom.ATOM_NS}"><entry><title>途中')
+    with pytest.raises(ET.ParseError):
+        parser.close()
@@ -0,0 +1,102 @@
+import json
+import os
+
+import pytest
+
+from cha2hatena import json_stream
+from cha2hatena.batch import (
+    BatchItem,
+    export_conversation_key,
+    format_summary,
+    group_exports,
+    run_batch,
+    scan_exports,
+)
+from cha2hatena.llm.conversational_ai import FatalLlmError, LlmConfig
+from cha2hatena.llm.deepseek_client import DeepseekClient
+from cha2hatena.llm.failover import FailoverClient
+
+
+def write_export(path, link, mtime):
+    path.write_text(json.dumps({"metadata": {"link": link}, "messages": []}), encoding="utf-8")
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_group_by_conversation_keeps_latest_export(tmp_path):
+    old = write_export(tmp_path / "Claude-a.json", "https://claude.ai/chat/1", 1_700_000_000)
+    new = write_export(tmp_path / "Claude-a (1).json", "https://claude.ai/chat/1", 1_700_000_100)
+    other = write_export(tmp_path / "ChatGPT-b.json", "https://chatgpt.com/c/2", 1_700_000_000)
+    (tmp_path / "notes.md").write_text("対象外")
+
+    items = group_exports(scan_exports(tmp_path), "conversation")
+
+    assert sorted(item.paths[0] for item in items) == sorted([new, other])
+    assert old not in [p for item in items for p in item.paths]
+
+
+def test_group_by_day(tmp_path):
+    write_export(tmp_path / "Claude-a.json", "a", 1_700_000_000)
+    write_export(tmp_path / "Claude-b.json", "b", 1_700_000_000 + 60)
+    write_export(tmp_path / "Claude-c.json", "c", 1_700_000_000 + 3 * 86400)
+
+    items = group_exports(scan_exports(tmp_path), "day")
+
+    assert [len(item.paths) for item in items] == [2, 1]
+
+
+def test_conversation_key_reads_only_up_to_metadata(tmp_path, monkeypatch):
+    monkeypatch.setattr(json_stream, "CHUNK_SIZE", 64)
+    message = {"role": "user", "content": "x" * 100}
+    head = tmp_path / "head.json"
+    # metadataの後は読まないため、messagesの途中で切れていても問題ない
+    head.write_text('{"metadata": {"link": "https://claude.ai/chat/1"}, "messages": [' + json.dumps(message) * 1000)
+    tail = tmp_path / "tail.json"
+    tail.write_text(json.dumps({"messages": [message] * 50, "metadata": {"title": "後ろ"}}), encoding="utf-8")
+    broken = tmp_path / "broken.json"
+    broken.write_text('{"messages": [', encoding="utf-8")
+
+    assert export_conversation_key(head) == "https://claude.ai/chat/1"
+    assert export_conversation_key(tail) == "後ろ"
+    assert export_conversation_key(broken) == "broken"
+
+
+@pytest.mark.asyncio
+async def test_run_batch_isolates_failures():
+    items = [BatchItem(name=name, paths=[]) for name in ("ok", "broken", "empty")]
+
+    async def pipeline(item):
+        if item.name == "broken":
+            raise RuntimeError("投稿に失敗")
+        if item.name == "empty":
+            return None
+        return {"entry_title": "タイトル", "input_tokens": 100, "output_tokens": 10, "total_fee (USD)": 0.5}
+
+    results = await run_batch(items, pipeline, concurrency=2)
+
+    assert [r.status for r in results] == ["ok", "failed", "skipped"]
+    summary = format_summary(results, elapsed=2.0)
+    assert "成功 1 / 新しい会話なし 1 / 失敗 1" in summary
+    assert "$0.5000" in summary
+
+
+@pytest.mark.asyncio
+async def test_run_batch_isolates_fatal_llm_error_raised_in_task(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # 構造化出力の失敗時はoutputs/__summary.txtに保存される
+
+    async def get_summary(self):
+        return self.check_response("JSONではない出力"), None
+
+    monkeypatch.setattr(DeepseekClient, "get_summary", get_summary)
+    items = [BatchItem(name=name, paths=[]) for name in ("broken", "ok")]
+
+    async def pipeline(item):
+        if item.name == "broken":
+            config = LlmConfig(prompt="p", model="deepseek-chat", api_key="key", conversation=item.name)
+            await FailoverClient(config).summarize()  # 要約はasyncio.create_taskの中で実行される
+        return {"entry_title": item.name}
+
+    results = await run_batch(items, pipeline)
+
+    assert [r.status for r in results] == ["failed", "ok"]
+    assert FatalLlmError.__name__ in results[0].error
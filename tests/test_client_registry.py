@@ -0,0 +1,67 @@
+import openai
+import pytest
+from google import genai
+
+from cha2hatena.llm.client_registry import ClientRegistry
+
+
+class FakeOpenAI:
+    def __init__(self, api_key, base_url):
+        self.api_key, self.base_url, self.closed = api_key, base_url, False
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeGenai:
+    def __init__(self, api_key):
+        self.api_key, self.closed, self.aio_closed = api_key, False, False
+        self.aio = self
+
+    async def aclose(self):
+        self.aio_closed = True
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    monkeypatch.setattr(openai, "AsyncOpenAI", FakeOpenAI)
+    monkeypatch.setattr(genai, "Client", FakeGenai)
+    return ClientRegistry()
+
+
+def test_same_client_per_provider_and_key(registry):
+    first = registry.openai("key-a")
+    assert registry.openai("key-a") is first
+    assert registry.openai("key-b") is not first
+    assert registry.openai("key-a", "https://example.com") is not first
+    assert registry.genai("key-a") is registry.genai("key-a")
+    assert len(registry) == 4
+
+
+@pytest.mark.asyncio
+async def test_aclose_closes_every_client_and_clears(registry):
+    clients = [registry.openai("key-a"), registry.openai("key-b"), registry.genai("key-a")]
+
+    await registry.aclose()
+
+    assert all(c.closed for c in clients) and clients[2].aio_closed
+    assert len(registry) == 0
+    assert registry.openai("key-a") is not clients[0]  # 閉じた後は作り直す
+
+
+@pytest.mark.asyncio
+async def test_aclose_continues_after_a_failing_client(registry):
+    broken = registry.openai("key-a")
+
+    async def fail():
+        raise RuntimeError("closed twice")
+
+    broken.close = fail
+    other = registry.genai("key-a")
+
+    await registry.aclose()
+
+    assert other.closed and len(registry) == 0
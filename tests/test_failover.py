@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from cha2hatena.llm.conversational_ai import LlmConfig, ProviderUnavailable
+from cha2hatena.llm.failover import FailoverClient
+from cha2hatena.llm.llm_stats import TokenStats
+
+
+def make_factory(behaviors: dict):
+    """モデルごとに (遅延秒数, 例外) を指定した偽クライアントを作るファクトリ"""
+
+    class FakeClient:
+        def __init__(self, config: LlmConfig):
+            self.model = config.model
+            self.prompt = config.prompt
+            self.max_retries = 3
+            self.cancelled = False
+
+        async def summarize(self, cache=None, force_refresh=False):
+            delay, error = behaviors[self.model]
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                self.cancelled = True
+                raise
+            if error is not None:
+                raise error
+            return {"title": self.model}, TokenStats(10, 0, 5, 100, 50, self.model)
+
+    return FakeClient
+
+
+def make_config(model="deepseek-chat"):
+    return LlmConfig(prompt="p", model=model, api_key="key", conversation="c")
+
+
+@pytest.mark.asyncio
+async def test_failover_to_next_model_on_server_error():
+    factory = make_factory({"deepseek-chat": (0, ProviderUnavailable("503")), "gemini-2.5-flash": (0, None)})
+    client = FailoverClient(make_config(), factory, fallback_models=["gemini-2.5-flash"], api_keys={"gemini": "gkey"})
+
+    data, stats = await client.summarize()
+
+    assert data == {"title": "gemini-2.5-flash"}
+    assert stats.model_name == "gemini-2.5-flash"
+
+
+@pytest.mark.asyncio
+async def test_failover_on_timeout():
+    factory = make_factory({"deepseek-chat": (1, None), "gemini-2.5-flash": (0, None)})
+    client = FailoverClient(
+        make_config(), factory, fallback_models=["gemini-2.5-flash"], api_keys={"gemini": "gkey"}, timeout=0.05
+    )
+
+    _, stats = await client.summarize()
+
+    assert stats.model_name == "gemini-2.5-flash"
+
+
+@pytest.mark.asyncio
+async def test_hedged_request_uses_first_answer_and_cancels_other():
+    factory = make_factory({"deepseek-chat": (1, None), "gemini-2.5-flash": (0.01, None)})
+    client = FailoverClient(
+        make_config(), factory, fallback_models=["gemini-2.5-flash"], api_keys={"gemini": "gkey"}, hedge_after=0.05
+    )
+
+    _, stats = await client.summarize()
+
+    assert stats.model_name == "gemini-2.5-flash"
+    assert client.clients[0].cancelled
+
+
+@pytest.mark.asyncio
+async def test_non_transient_error_is_not_retried_on_other_models():
+    factory = make_factory({"deepseek-chat": (0, ValueError("bad")), "gemini-2.5-flash": (0, None)})
+    client = FailoverClient(make_config(), factory, fallback_models=["gemini-2.5-flash"], api_keys={"gemini": "gkey"})
+
+    with pytest.raises(ValueError):
+        await client.summarize()
+
+
+@pytest.mark.asyncio
+async def test_all_models_unavailable():
+    factory = make_factory({"deepseek-chat": (0, ProviderUnavailable("503"))})
+    client = FailoverClient(make_config(), factory, fallback_models=["gemini-2.5-flash"])  # GeminiのAPIキーなし
+
+    assert [c.model for c in client.clients] == ["deepseek-chat"]
+    with pytest.raises(ProviderUnavailable):
+        await client.summarize()
@@ -0,0 +1,70 @@
+import json
+import subprocess
+import sys
+import time
+
+from cha2hatena.fx_rate import FxRateProvider
+
+
+class FakeFetcher:
+    def __init__(self, rates):
+        self.rates = list(rates)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        rate = self.rates.pop(0)
+        if isinstance(rate, Exception):
+            raise rate
+        return rate
+
+
+def test_fetches_once_and_uses_cache(tmp_path):
+    fetcher = FakeFetcher([150.0])
+    provider = FxRateProvider(tmp_path / "usdjpy.json", fetcher=fetcher)
+
+    assert provider.get() == 150.0
+    assert FxRateProvider(tmp_path / "usdjpy.json", fetcher=fetcher).get() == 150.0
+    assert fetcher.calls == 1
+
+
+def test_stale_cache_is_served_while_revalidating(tmp_path):
+    path = tmp_path / "usdjpy.json"
+    path.write_text(json.dumps({"rate": 140.0, "fetched_at": time.time() - 2 * 86400}))
+    fetcher = FakeFetcher([155.0])
+    provider = FxRateProvider(path, fetcher=fetcher)
+
+    assert provider.is_stale()
+    assert provider.get() == 140.0  # 取得を待たずに前回の値
+    assert fetcher.calls == 0
+    assert provider.refresh() == 155.0
+    assert provider.get() == 155.0 and not provider.is_stale()
+
+
+def test_failed_refresh_keeps_stale_rate(tmp_path):
+    path = tmp_path / "usdjpy.json"
+    path.write_text(json.dumps({"rate": 140.0, "fetched_at": 0}))
+    provider = FxRateProvider(path, fetcher=FakeFetcher([ConnectionError("offline")]))
+
+    assert provider.refresh() is None
+    assert provider.get() == 140.0
+
+
+def test_no_cache_and_offline(tmp_path):
+    provider = FxRateProvider(tmp_path / "usdjpy.json", fetcher=FakeFetcher([ConnectionError("offline")]))
+
+    assert provider.get() is None
+
+
+def test_fixed_rate(tmp_path):
+    provider = FxRateProvider(tmp_path / "usdjpy.json", fixed_rate=100.0, fetcher=FakeFetcher([]))
+
+    assert provider.get() == 100.0
+    assert not provider.is_stale()
+    assert not (tmp_path / "usdjpy.json").exists()
+
+
+def test_import_does_not_load_yfinance():
+    code = "import sys, cha2hatena.fx_rate; print('yfinance' in sys.modules or 'pandas' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "False"
@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+from cha2hatena.hatenablog_poster import AtomPubClient, blog_post, oauth_httpx
+
+httpx = oauth_httpx()  # AsyncOAuth1Clientと同じhttpxのMockTransportを使う
+
+ENTRY_URL = "https://blog.hatena.ne.jp/user/user.hatenablog.com/atom/entry"
+
+RESPONSE_XML = """<?xml version="1.0" encoding="utf-8"?>
+<entry xmlns="http://www.w3.org/2005/Atom" xmlns:app="http://www.w3.org/2007/app">
+  <link rel="edit" href="https://blog.hatena.ne.jp/user/user.hatenablog.com/atom/entry/1"/>
+  <link rel="alternate" type="text/html" href="https://user.hatenablog.com/entry/1"/>
+  <author><name>user</name></author>
+  <title>タイトル</title>
+  <updated>2025-01-01T09:00:00+09:00</updated>
+  <content type="text/x-markdown">本文</content>
+  <category term="自動投稿" />
+  <app:control><app:draft>yes</app:draft></app:control>
+</entry>"""
+
+
+def secret_keys(token: str = "token") -> dict:
+    return {
+        "client_id": "consumer-key",
+        "client_secret": "consumer-secret",
+        "token": token,
+        "token_secret": "token-secret",
+        "hatena_entry_url": ENTRY_URL,
+    }
+
+
+class FakeHatena:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.requests: list[httpx.Request] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self.delay)
+        self.in_flight -= 1
+        return httpx.Response(201, text=RESPONSE_XML)
+
+
+@pytest.mark.asyncio
+async def test_posts_reuse_one_session_without_mutating_secrets():
+    hatena = FakeHatena()
+    client = AtomPubClient(transport=httpx.MockTransport(hatena))
+    keys = secret_keys()
+
+    for _ in range(2):
+        result = await blog_post("タイトル", "本文", ["テスト"], keys, is_draft=True, client=client)
+
+    assert keys == secret_keys()  # 2回目の投稿でも同じ辞書を使える
+    assert len(client) == 1
+    assert [str(r.url) for r in hatena.requests] == [ENTRY_URL, ENTRY_URL]
+    assert hatena.requests[0].headers["Authorization"].startswith("OAuth ")
+    assert result["link_alternate"] == "https://user.hatenablog.com/entry/1"
+    assert result["is_draft"] is True
+    await client.aclose()
+    assert len(client) == 0
+
+
+@pytest.mark.asyncio
+async def test_concurrent_posts_share_session_per_account():
+    hatena = FakeHatena(delay=0.05)
+    client = AtomPubClient(transport=httpx.MockTransport(hatena))
+
+    await asyncio.gather(
+        *(blog_post("タイトル", "本文", [], secret_keys(), client=client) for _ in range(5)),
+        blog_post("タイトル", "本文", [], secret_keys("another-token"), client=client),
+    )
+
+    assert len(client) == 2  # アカウントごとに1つ
+    assert hatena.max_in_flight == 6
+    await client.aclose()
@@ -0,0 +1,67 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# 起動時の読み込み時間の上限（秒）。実測値（CLI 約0.35秒、app 約0.85秒）の2〜3倍
+# 実行環境の速さで結果が変わるため、環境変数CHA2HATENA_IMPORT_BUDGET=1のときだけ確認する
+CLI_BUDGET = 1.0
+APP_BUDGET = 2.5
+CHECK_BUDGET = os.environ.get("CHA2HATENA_IMPORT_BUDGET") == "1"
+
+# 使うときに初めて読み込むべき依存ライブラリ
+CLI_LAZY_MODULES = [
+    "fastapi",
+    "gspread",
+    "yfinance",
+    "pandas",
+    "authlib",
+    "requests",
+    "requests_oauthlib",
+    "openai",
+    "sqlalchemy",
+    "numpy",
+]
+APP_LAZY_MODULES = ["gspread", "yfinance", "pandas", "authlib", "requests_oauthlib", "openai", "numpy"]
+
+
+def import_time(module: str) -> tuple[float, set[str]]:
+    """`python -X importtime`でmoduleの累積読み込み時間（秒）と、読み込まれたモジュールを取得"""
+    code = f"import {module}"
+    subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, check=True)  # .pycを作成しておく
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code], cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    total, loaded = 0.0, set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue  # ヘッダー行
+        loaded.add(name.strip())
+        if name.strip() == module.split(".")[0]:
+            total = int(cumulative) / 1_000_000
+    return total, loaded
+
+
+@pytest.mark.parametrize(
+    "module, lazy_modules", [("cha2hatena.__main__", CLI_LAZY_MODULES), ("app.main", APP_LAZY_MODULES)]
+)
+def test_startup_skips_lazy_modules(module, lazy_modules):
+    _, loaded = import_time(module)
+
+    assert module.split(".")[0] in loaded
+    assert not loaded & set(lazy_modules)
+
+
+@pytest.mark.skipif(not CHECK_BUDGET, reason="CHA2HATENA_IMPORT_BUDGET=1のときだけ計測する")
+@pytest.mark.parametrize("module, budget", [("cha2hatena.__main__", CLI_BUDGET), ("app.main", APP_BUDGET)])
+def test_startup_import_budget(module, budget):
+    total, _ = import_time(module)
+
+    assert 0 < total < budget, f"{module}の読み込みに{total:.2f}秒かかりました（上限 {budget}秒）"
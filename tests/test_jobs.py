@@ -0,0 +1,155 @@
+import asyncio
+import io
+from datetime import timedelta
+
+import pytest
+from fastapi import UploadFile
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import app
+from app.core import job_crud
+from app.core.job_worker import JobWorkerPool
+from app.models.jobs import FAILED, QUEUED, RUNNING, SUCCEEDED, Job
+from app.models.users import Base, utc_now
+from app.routers.jobs import save_uploads
+from cha2hatena.llm.conversational_ai import FatalLlmError
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}")
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine, expire_on_commit=False)
+
+
+def test_job_is_claimed_only_once(session_factory, tmp_path):
+    with session_factory() as db:
+        job_crud.create_job(db, "a", str(tmp_path), [], False)
+        first = job_crud.claim_next_job(db, "worker-1", 600, 3)
+        second = job_crud.claim_next_job(db, "worker-2", 600, 3)
+
+    assert first.id == "a" and first.status == RUNNING and first.attempts == 1
+    assert second is None
+
+
+def test_stale_running_job_is_requeued(session_factory, tmp_path):
+    with session_factory() as db:
+        job_crud.create_job(db, "a", str(tmp_path), [], False)
+        job = job_crud.claim_next_job(db, "worker-1", 600, 3)
+        job.locked_at = utc_now() - timedelta(seconds=601)  # ワーカーが落ちた
+        db.commit()
+
+        reclaimed = job_crud.claim_next_job(db, "worker-2", 600, 3)
+
+    assert reclaimed.id == "a"
+    assert reclaimed.locked_by == "worker-2"
+    assert reclaimed.attempts == 2
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_runs_jobs_and_retries(session_factory, tmp_path):
+    calls = []
+
+    async def run_job(job):
+        calls.append(job.id)
+        if job.id == "flaky" and job.attempts == 1:
+            raise RuntimeError("一時的なエラー")
+        if job.id == "broken":
+            raise RuntimeError("失敗")
+        return {"title": job.id}
+
+    with session_factory() as db:
+        for job_id in ("ok", "flaky", "broken"):
+            (tmp_path / job_id).mkdir()
+            job_crud.create_job(db, job_id, str(tmp_path / job_id), ["c"], False)
+
+    pool = JobWorkerPool(session_factory, run_job, concurrency=2, poll_interval=0.01, max_attempts=2)
+    pool.start()
+    try:
+        for _ in range(200):
+            await asyncio.sleep(0.02)
+            with session_factory() as db:
+                jobs = {job_id: job_crud.get_job(job_id, db) for job_id in ("ok", "flaky", "broken")}
+            if all(job.status not in (QUEUED, RUNNING) for job in jobs.values()):
+                break
+    finally:
+        await pool.stop()
+
+    assert jobs["ok"].status == SUCCEEDED and jobs["ok"].result == {"title": "ok"}
+    assert jobs["flaky"].status == SUCCEEDED and jobs["flaky"].attempts == 2
+    assert jobs["broken"].status == FAILED and "失敗" in jobs["broken"].error
+    assert not (tmp_path / "ok").exists()  # 完了したジョブのアップロードは削除
+
+
+@pytest.mark.asyncio
+async def test_lost_lease_cancels_running_job(session_factory, tmp_path):
+    cancelled = asyncio.Event()
+
+    async def run_job(job):
+        with session_factory() as db:  # ほかのワーカーがリース切れのジョブを取り直した
+            db.get(Job, job.id).locked_by = "other-worker"
+            db.commit()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+        return {"title": job.id}
+
+    (tmp_path / "a").mkdir()
+    with session_factory() as db:
+        job_crud.create_job(db, "a", str(tmp_path / "a"), [], False)
+        job = job_crud.claim_next_job(db, "worker-1", 0.03, 3)
+
+    pool = JobWorkerPool(session_factory, run_job, lease_seconds=0.03)
+    await asyncio.wait_for(pool._execute(job, "worker-1"), 5)
+
+    assert cancelled.is_set()
+    with session_factory() as db:
+        job = job_crud.get_job("a", db)
+    assert job.status == RUNNING and job.locked_by == "other-worker"  # 失敗・完了として記録しない
+    assert (tmp_path / "a").exists()  # 再実行のためアップロードは残す
+
+
+def test_save_uploads_keeps_order_and_names(tmp_path):
+    data = b"x" * 3_000_000
+    files = [
+        UploadFile(io.BytesIO(data), filename="ChatGPT.json"),
+        UploadFile(io.BytesIO(b"{}"), filename="../Claude.json"),
+    ]
+
+    save_uploads(files, tmp_path / "job")
+
+    assert (tmp_path / "job" / "000" / "ChatGPT.json").read_bytes() == data
+    assert (tmp_path / "job" / "001" / "Claude.json").read_bytes() == b"{}"
+
+
+@pytest.mark.asyncio
+async def test_fatal_llm_error_in_task_fails_job(session_factory, tmp_path):
+    async def run_job(job):
+        async def summarize():
+            raise FatalLlmError("APIキーが誤っています")
+
+        return await asyncio.create_task(summarize())  # 要約はタスクの中で失敗する
+
+    (tmp_path / "a").mkdir()
+    with session_factory() as db:
+        job_crud.create_job(db, "a", str(tmp_path / "a"), [], False)
+        job = job_crud.claim_next_job(db, "worker-1", 600, 1)
+
+    await JobWorkerPool(session_factory, run_job, max_attempts=1)._execute(job, "worker-1")
+
+    with session_factory() as db:
+        job = job_crud.get_job("a", db)
+    assert job.status == FAILED and "APIキー" in job.error
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("method, url", [("POST", "/jobs"), ("GET", "/jobs/a"), ("GET", "/jobs/a/result")])
+async def test_job_endpoints_require_login(method, url):
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="https://test") as client:
+        response = await client.request(method, url)
+
+    assert response.status_code == 401
@@ -0,0 +1,148 @@
+import json
+import os
+import random
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+from cha2hatena import json_stream
+from cha2hatena.conversation_cache import ConversationCache
+from cha2hatena.json_loader import get_process_pool, json_loader, shutdown_process_pool
+from cha2hatena.watermark import WatermarkStore
+
+SAMPLES = [Path("sample/ChatGPT-sample.json"), Path("sample/Claude-sample.json"), Path("sample/sample.txt")]
+
+
+def make_export(tmp_path: Path, seed: int) -> Path:
+    """日付をまたぐ・時間が空く・時刻がないメッセージを含むエクスポートを生成"""
+    rng = random.Random(seed)
+    dt = datetime(2025, 11, 20, 9, 0, 0)
+    messages = []
+    for i in range(rng.randint(1, 60)):
+        dt += timedelta(minutes=rng.choice([1, 30, 120, 200, 600, 1500]))
+        message = {"role": rng.choice(["Prompt", "Response"]), "say": f"メッセージ{i}\n\n{'あ' * rng.randint(0, 50)}"}
+        if rng.random() > 0.1:
+            message["time"] = dt.strftime("%Y/%m/%d %H:%M:%S")
+        messages.append(message)
+    path = tmp_path / f"Claude-export{seed}.json"
+    path.write_text(json.dumps({"metadata": {"title": "t"}, "messages": messages}, ensure_ascii=False), "utf-8")
+    return path
+
+
+@pytest.mark.asyncio
+async def test_streaming_matches_full_load_on_samples():
+    assert await json_loader(SAMPLES, streaming=True) == await json_loader(SAMPLES)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("seed", range(30))
+async def test_streaming_matches_full_load(tmp_path, monkeypatch, seed):
+    monkeypatch.setattr(json_stream, "CHUNK_SIZE", 97)  # 値の途中で断片が切れるように小さくする
+    paths = [make_export(tmp_path, seed)]
+    assert await json_loader(paths, streaming=True) == await json_loader(paths)
+
+
+def test_parser_rejects_non_object():
+    parser = json_stream.MessagesStreamParser()
+    with pytest.raises(json.JSONDecodeError):
+        parser.feed("plain text")
+
+
+@pytest.mark.asyncio
+async def test_parallel_matches_sequential(tmp_path):
+    paths = SAMPLES + [make_export(tmp_path, seed) for seed in range(12)]
+    assert await json_loader(paths, parallel=True, max_workers=3) == await json_loader(paths)
+
+
+@pytest.mark.asyncio
+async def test_shutdown_process_pool_recreates_pool(tmp_path):
+    paths = [make_export(tmp_path, seed) for seed in range(3)]
+    await json_loader(paths, parallel=True, max_workers=2)
+    pool = get_process_pool()
+    shutdown_process_pool()
+    shutdown_process_pool()  # 2回目は何もしない
+    assert await json_loader(paths, parallel=True) == await json_loader(paths)
+    assert get_process_pool() is not pool
+
+
+@pytest.mark.asyncio
+async def test_parallel_keeps_input_order(tmp_path):
+    paths = [make_export(tmp_path, seed) for seed in range(6)]
+    reversed_paths = paths[::-1]
+    assert await json_loader(reversed_paths, parallel=True) == await json_loader(reversed_paths)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode", [{}, {"streaming": True}, {"parallel": True}])
+async def test_cache_returns_same_conversation(tmp_path, mode):
+    cache = ConversationCache(tmp_path / "cache")
+    paths = SAMPLES + [make_export(tmp_path, seed) for seed in range(3)]
+    expected = await json_loader(paths)
+
+    assert await json_loader(paths, cache=cache, **mode) == expected
+    assert cache.hits == 0
+    assert await json_loader(paths, cache=cache, **mode) == expected
+    assert cache.hits == 5  # sample.txtはJSONではないためキャッシュしない
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = ConversationCache(tmp_path, max_bytes=450)  # 3件分まで
+    for i in range(3):
+        cache.put(f"key{i}", ["x" * 100], None)
+        os.utime(tmp_path / f"key{i}.json", (i, i))
+    cache.get("key0")  # 最近使ったものは残る
+    cache.put("key3", ["x" * 100], None)
+
+    assert sorted(p.stem for p in tmp_path.glob("*.json")) == ["key0", "key2", "key3"]
+
+
+def test_cache_creates_dir_on_first_put(tmp_path):
+    cache = ConversationCache(tmp_path / "cache")
+    assert cache.get("key0") is None
+    assert not (tmp_path / "cache").exists()
+
+    cache.put("key0", ["x"], None)
+    assert cache.get("key0") == (["x"], None)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("streaming", [False, True])
+async def test_since_last_post_reads_only_new_messages(tmp_path, streaming):
+    export = tmp_path / "Claude-daily.json"
+
+    def write(count: int):
+        messages = [
+            {"role": "Prompt", "time": f"2025/11/{20 + i // 2:02d} 10:00:{i:02d}", "say": f"msg{i}"}
+            for i in range(count)
+        ]
+        export.write_text(json.dumps({"metadata": {"link": "https://claude.ai/chat/x"}, "messages": messages}), "utf-8")
+
+    watermarks = WatermarkStore(tmp_path / "watermarks.json")
+    write(4)
+    first = await json_loader([export], streaming=streaming, watermarks=watermarks)
+    assert "msg3" in first and "msg1" not in first  # 初回は通常の抽出（当日分）
+    watermarks.commit()
+
+    write(7)
+    second = await json_loader([export], streaming=streaming, watermarks=WatermarkStore(watermarks.path))
+    assert [f"msg{i}" in second for i in range(7)] == [False] * 4 + [True] * 3
+
+    assert await json_loader([export], streaming=streaming, watermarks=watermarks) != ""
+    watermarks.commit()
+    assert await json_loader([export], streaming=streaming, watermarks=watermarks) == ""
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("streaming", [False, True])
+async def test_since_last_post_with_metadata_after_messages(tmp_path, streaming):
+    export = tmp_path / "Claude-daily.json"
+    messages = [{"role": "Prompt", "time": f"2025/11/20 10:00:{i:02d}", "say": f"msg{i}"} for i in range(6)]
+    export.write_text(json.dumps({"messages": messages, "metadata": {"link": "https://claude.ai/chat/x"}}), "utf-8")
+    watermarks = WatermarkStore(tmp_path / "watermarks.json")
+    watermarks.stage("https://claude.ai/chat/x", datetime(2025, 11, 20, 10, 0, 2))
+    watermarks.commit()
+
+    result = await json_loader([export], streaming=streaming, watermarks=WatermarkStore(watermarks.path))
+
+    assert [f"msg{i}" in result for i in range(6)] == [False] * 3 + [True] * 3
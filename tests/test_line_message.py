@@ -0,0 +1,73 @@
+import asyncio
+
+import httpx
+import pytest
+
+from cha2hatena.line_message import LineNotifier
+
+
+class FakeLine:
+    """statusesの順に応答する（使い切ったら200）"""
+
+    def __init__(self, statuses=()):
+        self.statuses = list(statuses)
+        self.requests: list[httpx.Request] = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        return httpx.Response(self.statuses.pop(0) if self.statuses else 200, json={})
+
+
+def notifier(line: FakeLine, **kwargs) -> LineNotifier:
+    return LineNotifier("token", transport=httpx.MockTransport(line), base_delay=0, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_batch_coalesces_into_broadcasts_of_five():
+    stub = LineNotifier("", stub=True)
+
+    async with stub.batch():
+        await asyncio.gather(*(stub.notify(f"投稿{i}") for i in range(12)))
+        assert stub.sent == []  # 終了までは送らない
+
+    assert [len(messages) for messages in stub.sent] == [5, 5, 2]
+    assert [m["text"] for messages in stub.sent for m in messages] == [f"投稿{i}" for i in range(12)]
+    await stub.aclose()
+
+
+@pytest.mark.asyncio
+async def test_retries_with_same_retry_key():
+    line = FakeLine([429, 503])
+    client = notifier(line)
+
+    await client.notify("投稿完了")
+
+    assert len(line.requests) == 3
+    assert {r.headers["X-Line-Retry-Key"] for r in line.requests} == {line.requests[0].headers["X-Line-Retry-Key"]}
+    assert line.requests[0].headers["Authorization"] == "Bearer token"
+    assert str(line.requests[0].url) == "https://api.line.me/v2/bot/message/broadcast"
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_client_error_is_not_retried_and_batch_swallows_it():
+    line = FakeLine([400, 400])
+    client = notifier(line)
+
+    with pytest.raises(RuntimeError):
+        await client.notify("投稿完了")
+    async with client.batch():
+        await client.notify("投稿完了")
+
+    assert len(line.requests) == 2
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_without_token_nothing_is_sent():
+    line = FakeLine()
+    client = LineNotifier("", transport=httpx.MockTransport(line))
+
+    await client.notify("投稿完了")
+
+    assert line.requests == []
@@ -0,0 +1,77 @@
+import logging
+
+import numpy as np
+import pydantic
+import pytest
+
+from cha2hatena.llm import llm_stats
+from cha2hatena.llm.llm_stats import PriceTable, TokenStats, price_table
+
+
+def test_price_table_is_immutable_and_shares_prices():
+    table = price_table()
+    assert table["deepseek-chat"] is table["deepseek-reasoner"]
+    with pytest.raises(TypeError):
+        table.prices["gemini-2.5-flash"] = table["gemini-2.5-pro"]
+    with pytest.raises(pydantic.ValidationError):
+        table["gemini-2.5-flash"].input = 0
+
+
+def test_deepseek_cache_hit_is_cheaper():
+    miss = TokenStats(1_000_000, 0, 0, 0, 0, "deepseek-chat")
+    hit = TokenStats(1_000_000, 0, 0, 0, 0, "deepseek-chat", cached_tokens=750_000)
+    assert miss.input_fee == pytest.approx(0.28)
+    assert hit.input_fee == pytest.approx(0.25 * 0.28 + 0.75 * 0.028)
+
+
+def test_gemini_pro_tier_is_chosen_by_input_tokens():
+    under = TokenStats(200_000, 1_000, 1_000, 0, 0, "gemini-2.5-pro")
+    over = TokenStats(200_001, 1_000, 1_000, 0, 0, "gemini-2.5-pro")
+    assert under.fees() == pytest.approx((0.25, 0.01, 0.01))
+    assert over.fees() == pytest.approx((200_001 * 2.5 / 1e6, 0.015, 0.015))
+    combined = TokenStats.combine([under, over])  # 料金はリクエストごとの合計
+    assert combined.total_fee == pytest.approx(under.total_fee + over.total_fee)
+    assert not hasattr(combined, "__dict__")
+
+
+def test_unknown_model_warns_once(caplog):
+    table = PriceTable.from_mapping(llm_stats.DEFAULT_PRICES)
+    with caplog.at_level(logging.WARNING):
+        for _ in range(3):
+            assert table["gemini-9-ultra"] is table["gemini-2.5-pro"]
+    assert len([r for r in caplog.records if "gemini-9-ultra" in r.message]) == 1
+
+
+def test_configure_pricing_overrides_per_model(monkeypatch):
+    monkeypatch.setattr(llm_stats, "_prices", llm_stats._prices)  # テスト後に元に戻す
+    llm_stats.configure_pricing({"pricing": {"gemini-2.5-flash": {"input": 0.3, "output": 2.5}}})
+    assert TokenStats(1_000_000, 0, 0, 0, 0, "gemini-2.5-flash").input_fee == pytest.approx(0.3)
+    assert price_table()["deepseek-chat"].cached_input == 0.028
+
+
+def test_configure_pricing_merges_fields(monkeypatch):
+    monkeypatch.setattr(llm_stats, "_prices", llm_stats._prices)  # テスト後に元に戻す
+    llm_stats.configure_pricing({"pricing": {"gemini-2.5-pro": {"input": 2.0}, "new-model": {"input": 1, "output": 2}}})
+    pro = price_table()["gemini-2.5-pro"]
+    assert (pro.input, pro.output, pro.tier_threshold, pro.input_over) == (2.0, 10.0, 200_000, 2.5)
+    assert price_table()["new-model"].output == 2
+    assert llm_stats.DEFAULT_PRICES["gemini-2.5-pro"]["input"] == 1.25  # 既定の料金は変更しない
+    with pytest.raises(pydantic.ValidationError):
+        llm_stats.configure_pricing({"pricing": {"other-model": {"input": 1}}})  # 追加するモデルはoutputが必須
+
+
+def test_batch_fees_match_token_stats():
+    rng = np.random.default_rng(0)
+    n = 2_000
+    models = ["gemini-2.5-flash", "gemini-2.5-pro", "deepseek-chat"]
+    codes = rng.integers(0, len(models), n)
+    tokens = [rng.integers(0, 400_000, n), rng.integers(0, 5_000, n), rng.integers(0, 10_000, n)]
+    cached = rng.integers(0, 1_000, n)
+
+    fees = price_table().batch_fees(models, codes, *tokens, cached)
+
+    for i in range(n):
+        stats = TokenStats(*(int(t[i]) for t in tokens), 0, 0, models[codes[i]], int(cached[i]))
+        assert (fees["input"][i], fees["thoughts"][i], fees["output"][i]) == pytest.approx(stats.fees())
+    single = price_table().batch_fees(["gemini-2.5-pro"], 0, [100, 300_000], [0, 0], [10, 10])  # 1モデルだけの場合
+    assert single["over_threshold"].tolist() == [False, True]
@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+
+from cha2hatena.llm.conversational_ai import LlmConfig
+from cha2hatena.llm.llm_stats import TokenStats
+from cha2hatena.llm.map_reduce import REDUCE_HEADER, MapReduceSummarizer, chunk_conversation
+
+SEPARATOR = "-" * 50 + "\n"
+
+
+class FakeEstimator:
+    """1文字1トークン、料金区分なし"""
+
+    def count(self, text: str) -> int:
+        return len(text)
+
+    def tier_limit(self) -> int | None:
+        return None
+
+    def estimate_fee(self, input_tokens: int, output_tokens: int = 0) -> float:
+        return 0.0
+
+
+class FakeClient:
+    """会話ログの先頭のメッセージを見出しにして返す。後のチャンクほど早く応答する"""
+
+    def __init__(self, config: LlmConfig, calls: list[str]):
+        self.config = config
+        self.prompt = config.prompt + config.conversation
+        self.model = config.model
+        self.calls = calls
+
+    async def summarize(self, cache=None, force_refresh=False):
+        conversation = self.config.conversation
+        self.calls.append(conversation)
+        if conversation.startswith(REDUCE_HEADER):
+            return {"title": "最終", "content": conversation}, TokenStats(200_001, 0, 10, 0, 0, "gemini-2.5-pro")
+        await asyncio.sleep(0.01 / (len(self.calls) + 1))
+        first = conversation.split("\n", 1)[0]
+        return {"title": first, "content": "要約"}, TokenStats(len(conversation), 0, 10, 0, 0, "gemini-2.5-pro")
+
+
+def messages(n: int, length: int = 40) -> str:
+    return "".join(f"message{i:02d}".ljust(length, ".") + "\n" + SEPARATOR for i in range(n))
+
+
+def summarizer(conversation: str, token_budget: int, calls: list[str]) -> MapReduceSummarizer:
+    config = LlmConfig(
+        prompt="要約して", model="gemini-2.5-pro", temperature=1.0, api_key="key", conversation=conversation
+    )
+    return MapReduceSummarizer(
+        config, lambda c: FakeClient(c, calls), token_budget=token_budget, estimator=FakeEstimator()
+    )
+
+
+def test_chunks_respect_budget_and_message_boundaries():
+    conversation = messages(10)
+    chunks = chunk_conversation(conversation, 200)
+
+    assert "".join(chunks) == conversation
+    assert all(len(chunk) <= 200 for chunk in chunks)
+    assert all(chunk.endswith(SEPARATOR) for chunk in chunks)  # メッセージの途中で切らない
+    assert len(chunks) == 5  # 1メッセージ92文字、2件ずつ
+
+
+def test_oversized_message_is_split_by_characters():
+    chunks = chunk_conversation("x" * 250, 100)
+    assert [len(chunk) for chunk in chunks] == [100, 100, 50]
+
+
+@pytest.mark.asyncio
+async def test_reduce_combines_partial_summaries_in_order():
+    calls = []
+    s = summarizer(messages(10), 300, calls)
+
+    await s.get_summary()
+
+    reduce_input = calls[-1]
+    assert reduce_input.startswith(REDUCE_HEADER)
+    headings = [line for line in reduce_input.splitlines() if line.startswith("## ")]
+    assert headings == [f"## message{i:02d}".ljust(3 + 40, ".") for i in (0, 3, 6, 9)]  # 応答順ではなくチャンク順
+    assert len(calls) == 5
+
+
+@pytest.mark.asyncio
+async def test_combined_stats_sum_fees_per_request():
+    calls = []
+    s = summarizer(messages(10), 300, calls)
+
+    _, stats = await s.get_summary()
+
+    # 最終要約だけが高い料金区分。合計の入力トークンで計算し直さない
+    assert stats.total_fee == pytest.approx(sum(part.total_fee for part in s.stats))
+    assert stats.input_tokens == sum(part.input_tokens for part in s.stats)
+    recomputed = TokenStats(stats.input_tokens, 0, stats.output_tokens, 0, 0, "gemini-2.5-pro").total_fee
+    assert stats.total_fee < recomputed
+
+
+@pytest.mark.asyncio
+async def test_short_conversation_is_not_split():
+    calls = []
+    s = summarizer(messages(2), 10_000, calls)
+
+    _, stats = await s.get_summary()
+
+    assert len(calls) == 1 and not calls[0].startswith(REDUCE_HEADER)
+    assert stats.input_tokens == len(messages(2))
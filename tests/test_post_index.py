@@ -0,0 +1,117 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from cha2hatena.hatenablog_poster import AtomPubClient, blog_post, oauth_httpx
+from cha2hatena.post_index import PostIndex, idempotency_key
+from cha2hatena.publish_queue import PUBLISHED, PublishQueue, publish
+
+httpx = oauth_httpx()
+
+ENTRY_URL = "https://blog.hatena.ne.jp/user/user.hatenablog.com/atom/entry"
+LINK_EDIT = f"{ENTRY_URL}/1"
+
+SECRET_KEYS = {
+    "client_id": "consumer-key",
+    "client_secret": "consumer-secret",
+    "token": "token",
+    "token_secret": "token-secret",
+    "hatena_entry_url": ENTRY_URL,
+}
+
+RESPONSE_XML = f"""<entry xmlns="http://www.w3.org/2005/Atom" xmlns:app="http://www.w3.org/2007/app">
+  <link rel="edit" href="{LINK_EDIT}"/>
+  <link rel="alternate" type="text/html" href="https://user.hatenablog.com/entry/1"/>
+  <title>タイトル</title>
+  <updated>2025-01-01T09:00:00+09:00</updated>
+</entry>"""
+
+
+class FakeHatena:
+    """POSTは201、PUTはmissingでなければ200で応答し、リクエストを記録する"""
+
+    def __init__(self, missing: bool = False):
+        self.missing = missing
+        self.requests = []
+
+    def __call__(self, request):
+        self.requests.append((request.method, str(request.url)))
+        if request.method == "PUT":
+            return httpx.Response(404 if self.missing else 200, text="Not Found" if self.missing else RESPONSE_XML)
+        return httpx.Response(201, text=RESPONSE_XML)
+
+
+def test_key_depends_on_conversation_and_model():
+    key = idempotency_key("会話", "deepseek-chat")
+    assert key == idempotency_key("会話", "deepseek-chat")
+    assert key != idempotency_key("会話", "gemini-2.5-flash")
+    assert key != idempotency_key("別の会話", "deepseek-chat")
+
+
+def test_concurrent_puts_keep_every_key(tmp_path):
+    path = tmp_path / "post_index.json"
+
+    def put(n: int):
+        PostIndex(path).put(f"key{n}", {"link_edit": f"{LINK_EDIT}{n}"})  # 別々のインスタンス（別プロセス相当）
+
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(put, range(40)))
+    PostIndex(path).discard("key0")
+
+    index = PostIndex(path)
+    assert index.get("key0") is None
+    assert all(index.get(f"key{n}")["link_edit"] == f"{LINK_EDIT}{n}" for n in range(1, 40))
+
+
+@pytest.mark.asyncio
+async def test_rerun_updates_existing_entry_instead_of_posting(tmp_path):
+    hatena = FakeHatena()
+    client = AtomPubClient(transport=httpx.MockTransport(hatena))
+    index = PostIndex(tmp_path / "post_index.json")
+    key = idempotency_key("会話", "deepseek-chat")
+
+    first = await blog_post("タイトル", "本文", [], SECRET_KEYS, client=client, index=index, idempotency_key=key)
+    # 記録前にクラッシュしたとして、別プロセスで再実行
+    second = await blog_post(
+        "タイトル", "本文", [], SECRET_KEYS, client=client, index=PostIndex(index.path), idempotency_key=key
+    )
+
+    assert hatena.requests == [("POST", ENTRY_URL), ("PUT", LINK_EDIT)]
+    assert (first["status_code"], second["status_code"]) == (201, 200)
+    assert index.get(key)["link_edit"] == LINK_EDIT
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_deleted_entry_is_posted_again(tmp_path):
+    hatena = FakeHatena(missing=True)
+    client = AtomPubClient(transport=httpx.MockTransport(hatena))
+    index = PostIndex(tmp_path / "post_index.json")
+    index.put("key", {"link_edit": LINK_EDIT, "link_alternate": "", "title": "削除済み"})
+
+    result = await blog_post("タイトル", "本文", [], SECRET_KEYS, client=client, index=index, idempotency_key="key")
+
+    assert hatena.requests == [("PUT", LINK_EDIT), ("POST", ENTRY_URL)]
+    assert result["status_code"] == 201
+    assert index.get("key")["title"] == "タイトル"
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_queue_deduplicates_and_updates_published_entries(tmp_path):
+    hatena = FakeHatena()
+    client = AtomPubClient(transport=httpx.MockTransport(hatena))
+    index = PostIndex(tmp_path / "post_index.json")
+    queue = PublishQueue(tmp_path / "queue.json")
+
+    queue.add(title="1回目", content="本文", idempotency_key="key")
+    queue.add(title="2回目", content="本文", idempotency_key="key")  # 同じ会話の再実行は置き換え
+    assert [e.title for e in queue.entries()] == ["2回目"]
+    await publish(queue, SECRET_KEYS, client=client, index=index)
+
+    queue.add(title="3回目", content="本文", idempotency_key="key")  # 投稿済みの場合は更新
+    [entry] = await publish(queue, SECRET_KEYS, client=client, index=index)
+
+    assert entry.status == PUBLISHED
+    assert hatena.requests == [("POST", ENTRY_URL), ("PUT", LINK_EDIT)]
+    await client.aclose()
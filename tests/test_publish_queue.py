@@ -0,0 +1,135 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pytest
+
+from cha2hatena import publish_queue
+from cha2hatena.hatenablog_poster import AtomPubClient, oauth_httpx
+from cha2hatena.publish_queue import FAILED, JST, PUBLISHED, QUEUED, PublishQueue, publish, spread_schedule
+
+httpx = oauth_httpx()
+
+SECRET_KEYS = {
+    "client_id": "consumer-key",
+    "client_secret": "consumer-secret",
+    "token": "token",
+    "token_secret": "token-secret",
+    "hatena_entry_url": "https://blog.hatena.ne.jp/user/user.hatenablog.com/atom/entry",
+}
+
+RESPONSE_XML = """<entry xmlns="http://www.w3.org/2005/Atom" xmlns:app="http://www.w3.org/2007/app">
+  <link rel="edit" href="https://blog.hatena.ne.jp/user/user.hatenablog.com/atom/entry/1"/>
+  <link rel="alternate" type="text/html" href="https://user.hatenablog.com/entry/1"/>
+  <title>タイトル</title>
+  <updated>2025-01-01T09:00:00+09:00</updated>
+</entry>"""
+
+NO_DELAY = {"base_delay": 0.0, "max_delay": 0.0}
+
+
+class FakeHatena:
+    """statusesの順に応答する（使い切ったら201）"""
+
+    def __init__(self, statuses=(), delay: float = 0.0):
+        self.statuses = list(statuses)
+        self.delay = delay
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def __call__(self, request):
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self.delay)
+        self.in_flight -= 1
+        status = self.statuses.pop(0) if self.statuses else 201
+        return httpx.Response(status, text=RESPONSE_XML if status == 201 else "error", headers={"Retry-After": "0"})
+
+
+def make_client(hatena: FakeHatena) -> AtomPubClient:
+    return AtomPubClient(transport=httpx.MockTransport(hatena))
+
+
+@pytest.mark.asyncio
+async def test_publishes_with_bounded_concurrency_and_records_links(tmp_path):
+    queue = PublishQueue(tmp_path / "queue.json")
+    for i in range(5):
+        queue.add(title=f"タイトル{i}", content="本文", is_draft=True)
+    hatena = FakeHatena(delay=0.02)
+
+    processed = await publish(queue, SECRET_KEYS, concurrency=2, client=make_client(hatena), **NO_DELAY)
+
+    assert [e.status for e in processed] == [PUBLISHED] * 5
+    assert hatena.max_in_flight == 2
+    reloaded = PublishQueue(tmp_path / "queue.json")  # 再起動後も結果が残る
+    assert {e.link_alternate for e in reloaded.entries(PUBLISHED)} == {"https://user.hatenablog.com/entry/1"}
+    assert reloaded.entries(PUBLISHED)[0].link_edit.endswith("/atom/entry/1")
+
+
+@pytest.mark.asyncio
+async def test_retries_429_and_5xx_then_gives_up_on_4xx(tmp_path):
+    queue = PublishQueue(tmp_path / "queue.json")
+    queue.add(title="再試行", content="本文")
+    hatena = FakeHatena([429, 503])
+
+    [entry] = await publish(queue, SECRET_KEYS, client=make_client(hatena), **NO_DELAY)
+    assert entry.status == PUBLISHED
+    assert hatena.calls == 3
+
+    queue.add(title="失敗", content="本文")
+    hatena = FakeHatena([400])
+    [entry] = await publish(queue, SECRET_KEYS, client=make_client(hatena), **NO_DELAY)
+    assert entry.status == FAILED
+    assert "400" in entry.error
+    assert hatena.calls == 1
+
+    assert queue.retry_failed() == 1
+    assert [e.title for e in queue.entries(QUEUED)] == ["失敗"]
+
+
+@pytest.mark.asyncio
+async def test_waits_for_scheduled_entries(tmp_path):
+    queue = PublishQueue(tmp_path / "queue.json")
+    later = datetime.now(JST) + timedelta(seconds=0.2)
+    queue.add(title="予約", content="本文", publish_at=later)
+    queue.add(title="すぐ", content="本文")
+
+    processed = await publish(queue, SECRET_KEYS, client=make_client(FakeHatena()), wait_scheduled=False)
+    assert [e.title for e in processed] == ["すぐ"]
+
+    processed = await publish(queue, SECRET_KEYS, client=make_client(FakeHatena()))
+    assert [e.title for e in processed] == ["予約"]
+    assert datetime.now(JST) >= later
+
+
+def test_save_keeps_entries_added_by_another_process(tmp_path):
+    path = tmp_path / "queue.json"
+    publisher = PublishQueue(path)
+    entry = publisher.add(title="1件目", content="本文")
+    enqueuer = PublishQueue(path)
+    enqueuer.add(title="2件目", content="本文")
+
+    publisher.update(entry.model_copy(update={"status": PUBLISHED}))
+
+    assert {(e.title, e.status) for e in PublishQueue(path).entries()} == {("1件目", PUBLISHED), ("2件目", QUEUED)}
+
+
+def test_concurrent_saves_keep_every_entry(tmp_path):
+    path = tmp_path / "queue.json"
+
+    def add(n: int):
+        PublishQueue(path).add(title=f"{n}件目", content="本文")  # 別々のインスタンス（別プロセス相当）
+
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(add, range(40)))
+
+    assert {e.title for e in PublishQueue(path).entries()} == {f"{n}件目" for n in range(40)}
+
+
+def test_spread_schedule_and_retry_delay():
+    start = datetime(2025, 1, 1, 9, 0)
+    assert spread_schedule(3, start, timedelta(minutes=30))[-1] == datetime(2025, 1, 1, 10, 0, tzinfo=JST)
+    assert publish_queue.retry_delay(0, 2.0, 60.0, "5") == 5.0
+    assert all(0 <= publish_queue.retry_delay(10, 2.0, 60.0) <= 60.0 for _ in range(100))
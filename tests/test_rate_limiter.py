@@ -0,0 +1,110 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app import app
+from cha2hatena.llm import rate_limiter
+from cha2hatena.llm.conversational_ai import RATE_LIMIT_BACKOFF, ConversationalAi
+from cha2hatena.llm.rate_limiter import ProviderLimiter
+
+
+class FakeClock:
+    """time.monotonicとasyncio.sleepの代わり。sleepは待たずに時刻を進める"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps: list[float] = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+        await asyncio.sleep(0)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter, "time", SimpleNamespace(monotonic=clock.monotonic))
+    monkeypatch.setattr(
+        rate_limiter, "asyncio", SimpleNamespace(sleep=clock.sleep, Semaphore=asyncio.Semaphore, Lock=asyncio.Lock)
+    )
+    return clock
+
+
+async def request(limiter: ProviderLimiter, tokens: int, clock: FakeClock) -> float:
+    async with limiter.limit(tokens):
+        return clock.now
+
+
+@pytest.mark.asyncio
+async def test_rpm_admits_a_minute_of_requests_then_paces(clock):
+    limiter = ProviderLimiter("test", max_concurrency=10, rpm=6, tpm=1_000_000)
+
+    starts = [await request(limiter, 1, clock) for _ in range(8)]
+
+    assert starts[:6] == [1000.0] * 6  # 容量（1分ぶん）まではすぐに通す
+    assert starts[6:] == pytest.approx([1010.0, 1020.0])  # 以降は10秒に1件
+    assert limiter.metrics()["total_requests"] == 8
+
+
+@pytest.mark.asyncio
+async def test_tpm_waits_for_token_budget(clock):
+    limiter = ProviderLimiter("test", max_concurrency=10, rpm=1000, tpm=60_000)
+
+    assert await request(limiter, 50_000, clock) == 1000.0
+    assert await request(limiter, 40_000, clock) == pytest.approx(1030.0)  # 残り1万 -> 4万まで毎秒1000補充
+    assert await request(limiter, 200_000, clock) == pytest.approx(1090.0)  # 容量を超える量は満杯まで待つ
+
+
+@pytest.mark.asyncio
+async def test_handle_rate_limit_pauses_the_provider(clock):
+    limiter = ProviderLimiter("test", max_concurrency=10, rpm=1000, tpm=1_000_000)
+    client = SimpleNamespace(company_name="Deepseek", limiter=limiter)
+
+    ConversationalAi.handle_rate_limit(client, 0, 3, RuntimeError("429"))
+    assert await request(limiter, 1, clock) == pytest.approx(1000.0 + RATE_LIMIT_BACKOFF)
+
+    ConversationalAi.handle_rate_limit(client, 1, 3, RuntimeError("429"))  # リトライごとに長く待つ
+    assert await request(limiter, 1, clock) == pytest.approx(1000.0 + RATE_LIMIT_BACKOFF * 3)
+
+    with pytest.raises(RuntimeError):
+        ConversationalAi.handle_rate_limit(client, 2, 3, RuntimeError("429"))
+    assert limiter.metrics()["throttled"] == 2
+
+
+@pytest.mark.asyncio
+async def test_concurrency_and_metrics(clock, monkeypatch):
+    monkeypatch.setattr(rate_limiter, "_limiters", {})
+    limiter = rate_limiter.get_limiter("deepseek", "sk-abcdef12345")
+    assert rate_limiter.get_limiter("deepseek", "sk-abcdef12345") is limiter
+    limiter._slots = asyncio.Semaphore(1)
+    release = asyncio.Event()
+
+    async def hold():
+        async with limiter.limit(1):
+            await release.wait()
+
+    first = asyncio.create_task(hold())
+    second = asyncio.create_task(request(limiter, 1, clock))
+    await asyncio.sleep(0)
+    metrics = rate_limiter.limiter_metrics()["deepseek(...12345)"]
+    assert (metrics["in_flight"], metrics["queue_depth"]) == (1, 1)
+
+    release.set()
+    await asyncio.gather(first, second)
+    metrics = rate_limiter.limiter_metrics()["deepseek(...12345)"]
+    assert (metrics["in_flight"], metrics["queue_depth"], metrics["total_requests"]) == (0, 0, 2)
+    assert metrics["max_concurrency"] == rate_limiter.DEFAULT_LIMITS["deepseek"]["max_concurrency"]
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_requires_login():
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="https://test") as client:
+        response = await client.get("/metrics/llm")
+
+    assert response.status_code == 401
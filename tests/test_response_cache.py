@@ -0,0 +1,121 @@
+import json
+import os
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from cha2hatena.llm.conversational_ai import ConversationalAi
+from cha2hatena.llm.llm_stats import TokenStats
+from cha2hatena.llm.response_cache import ResponseCache
+
+
+def fake_client(prompt="プロンプト", model="deepseek-chat", temperature=1.0):
+    """summarizeが呼ぶ属性だけを持つクライアント"""
+    client = SimpleNamespace(prompt=prompt, model=model, temperature=temperature, calls=0)
+
+    async def get_summary():
+        client.calls += 1
+        return {"title": f"要約{client.calls}"}, TokenStats(100, 5, 20, 300, 40, model, cached_tokens=30)
+
+    client.get_summary = get_summary
+    return client
+
+
+def test_key_depends_on_prompt_model_and_temperature():
+    key = ResponseCache.make_key("p", "deepseek-chat", 1.0)
+    assert key == ResponseCache.make_key("p", "deepseek-chat", 1)  # 1と1.0は同じ
+    assert (
+        len(
+            {
+                key,
+                *(
+                    ResponseCache.make_key(*a)
+                    for a in [("q", "deepseek-chat", 1.0), ("p", "gemini-2.5-pro", 1.0), ("p", "deepseek-chat", 1.1)]
+                ),
+            }
+        )
+        == 4
+    )
+    assert ResponseCache.make_key("a\0b", "m", 1.0) != ResponseCache.make_key("a", "b\0m", 1.0)  # 区切りがずれない
+
+
+@pytest.mark.asyncio
+async def test_hit_miss_and_force_refresh(tmp_path):
+    cache = ResponseCache(tmp_path)
+    client = fake_client()
+
+    data, stats = await ConversationalAi.summarize(client, cache)  # miss
+    assert data == {"title": "要約1"} and client.calls == 1
+
+    cached_data, cached_stats = await ConversationalAi.summarize(client, cache)  # hit
+    assert client.calls == 1
+    assert cached_data == data
+    assert (cached_stats.input_tokens, cached_stats.cached_tokens, cached_stats.model_name) == (
+        100,
+        30,
+        "deepseek-chat",
+    )
+    assert cached_stats.total_fee == pytest.approx(stats.total_fee)
+
+    refreshed, _ = await ConversationalAi.summarize(client, cache, force_refresh=True)
+    assert refreshed == {"title": "要約2"} and client.calls == 2
+    assert (await ConversationalAi.summarize(client, cache))[0] == refreshed  # 再生成した結果で上書き
+
+    await ConversationalAi.summarize(fake_client(temperature=0.5), cache)
+    assert len(list(tmp_path.glob("*.json"))) == 2
+
+
+def test_expired_entry_is_a_miss(tmp_path):
+    cache = ResponseCache(tmp_path, ttl_seconds=60)
+    cache.put("k", {"title": "t"}, TokenStats(1, 0, 1, 1, 1, "deepseek-chat"))
+    assert cache.get("k") is not None
+
+    path = tmp_path / "k.json"
+    entry = json.loads(path.read_text(encoding="utf-8"))
+    path.write_text(json.dumps(entry | {"created": entry["created"] - 61}), encoding="utf-8")
+    assert cache.get("k") is None
+    assert not path.exists()
+
+
+def test_evict_removes_least_recently_used(tmp_path):
+    cache = ResponseCache(tmp_path, max_entries=3)
+    now = time.time()
+    for i in range(3):
+        cache.put(f"k{i}", {"title": str(i)}, TokenStats(1, 0, 1, 1, 1, "deepseek-chat"))
+        os.utime(tmp_path / f"k{i}.json", (now - 100 + i, now - 100 + i))
+    assert cache.get("k0") is not None  # 利用すると新しくなる
+
+    cache.put("k3", {"title": "3"}, TokenStats(1, 0, 1, 1, 1, "deepseek-chat"))
+
+    assert sorted(p.stem for p in tmp_path.glob("*.json")) == ["k0", "k2", "k3"]
+
+
+def test_evict_skips_files_removed_concurrently(tmp_path, monkeypatch):
+    cache = ResponseCache(tmp_path, max_entries=1)
+    for i in range(3):
+        (tmp_path / f"k{i}.json").write_text("{}", encoding="utf-8")
+
+    stat = Path.stat
+
+    def vanishing_stat(self, *args, **kwargs):
+        if self.name == "k1.json":
+            self.unlink(missing_ok=True)  # ほかのプロセスが先に削除した
+            raise FileNotFoundError(self)
+        return stat(self, *args, **kwargs)
+
+    monkeypatch.setattr(Path, "stat", vanishing_stat)
+    cache.evict()
+
+    assert len(list(tmp_path.glob("*.json"))) == 1
+
+
+def test_creates_dir_on_first_put(tmp_path):
+    cache = ResponseCache(tmp_path / "responses")
+    assert cache.get("k") is None
+    cache.evict()
+    assert not (tmp_path / "responses").exists()
+
+    cache.put("k", {"title": "t"}, TokenStats(1, 0, 1, 1, 1, "deepseek-chat"))
+    assert cache.get("k") is not None
@@ -0,0 +1,97 @@
+import csv
+from datetime import datetime
+
+import pytest
+from sqlalchemy import inspect
+
+from cha2hatena.run_records import CSV_COLUMNS, RunRecordStore
+
+
+def csv_row(n: int, model: str = "gemini-2.5-flash", fee: float = 0.01) -> dict:
+    """main.pyのcsv_dataと同じ形の1行"""
+    row = dict.fromkeys(CSV_COLUMNS, "")
+    return row | {
+        "timestamp": datetime(2025, 1, n, 12, 0, 0).isoformat(),
+        "entry_URL": f"https://u.hatenablog.com/entry/{n}",
+        "is_draft": False,
+        "model": model,
+        "temperature": 1.0,
+        "input_tokens": 1000 * n,
+        "output_tokens": 100,
+        "input_fee": fee,
+        "total_fee (USD)": fee,
+        "total_fee (JPY)": None,
+    }
+
+
+def store(tmp_path) -> RunRecordStore:
+    return RunRecordStore(f"sqlite:///{tmp_path / 'db' / 'records.db'}")
+
+
+def test_indexes_on_timestamp_model_and_entry_url(tmp_path):
+    records = store(tmp_path)
+    indexed = {tuple(index["column_names"]) for index in inspect(records.engine).get_indexes("run_records")}
+    assert {("timestamp",), ("model",), ("entry_url",), ("model", "timestamp")} <= indexed
+
+
+def test_hold_buffers_rows_into_one_insert(tmp_path):
+    records = store(tmp_path)
+    records.append(csv_row(1))
+    records.hold = True
+    for n in range(2, 6):
+        records.append(csv_row(n, model="deepseek-chat", fee=0.002))
+    assert len(records.rows()) == 1  # flushまでは保存しない
+
+    assert records.flush() == 4
+    assert records.flush() == 0
+    rows = records.rows()
+    assert [row["input_tokens"] for row in rows] == [1000, 2000, 3000, 4000, 5000]
+    assert rows[0]["timestamp"] == datetime(2025, 1, 1, 12, 0, 0)
+    assert rows[0]["is_draft"] is False
+    assert records.spend_by_model() == {"gemini-2.5-flash": 0.01, "deepseek-chat": pytest.approx(0.008)}
+    assert records.spend_by_model(since=datetime(2025, 1, 4)) == {"deepseek-chat": pytest.approx(0.004)}
+
+
+def test_failed_flush_keeps_rows_for_retry(tmp_path, monkeypatch):
+    records = store(tmp_path)
+    records.hold = True
+    for n in range(1, 4):
+        records.append(csv_row(n))
+    insert = records._insert
+
+    def broken_insert(rows):
+        raise OSError("database is locked")
+
+    monkeypatch.setattr(records, "_insert", broken_insert)
+    with pytest.raises(OSError):
+        records.flush()
+    assert records.pending == 3
+
+    monkeypatch.setattr(records, "_insert", insert)
+    assert records.flush() == 3
+    assert records.pending == 0
+    assert [row["input_tokens"] for row in records.rows()] == [1000, 2000, 3000]
+
+
+def test_import_csv_once_and_export_round_trip(tmp_path):
+    legacy = tmp_path / "record.csv"
+    with legacy.open("w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.DictWriter(f, fieldnames=[*CSV_COLUMNS, "old_column"])  # 知らない列は無視する
+        writer.writeheader()
+        for n in range(1, 4):
+            writer.writerow(csv_row(n) | {"old_column": "x", "total_fee (JPY)": 1.5 if n == 1 else ""})
+
+    records = store(tmp_path)
+    assert records.import_csv(legacy) == 3
+    assert records.import_csv(legacy) == 0  # 取り込み済みの行は飛ばす
+
+    rows = records.rows()
+    assert [row["entry_url"] for row in rows] == [f"https://u.hatenablog.com/entry/{n}" for n in range(1, 4)]
+    assert [row["total_fee_jpy"] for row in rows] == [1.5, None, None]
+    assert rows[2]["input_tokens"] == 3000 and rows[2]["temperature"] == 1.0
+
+    exported = tmp_path / "export.csv"
+    assert records.export_csv(exported) == 3
+    other = RunRecordStore(f"sqlite:///{tmp_path / 'other.db'}")
+    assert other.import_csv(exported) == 3
+    assert other.rows() == rows
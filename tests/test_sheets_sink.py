@@ -0,0 +1,92 @@
+from types import SimpleNamespace
+
+import gspread
+import pytest
+
+from cha2hatena.sheets_sink import SheetsSink
+
+
+class FakeWorksheet:
+    def __init__(self, rows=None):
+        self.rows = [list(r) for r in rows or []]
+        self.calls = []
+
+    def acell(self, label):
+        self.calls.append(("acell", label))
+        return SimpleNamespace(value=self.rows[0][0] if self.rows else None)
+
+    def append_rows(self, values):
+        self.calls.append(("append_rows", len(values)))
+        self.rows += values
+
+    def get_all_values(self):
+        raise AssertionError("シート全体は読まない")
+
+
+class FakeClient:
+    def __init__(self, worksheet: FakeWorksheet | None):
+        self.worksheet = worksheet
+        self.opened = 0
+        self.created = []
+
+    def open(self, name):
+        self.opened += 1
+        if self.worksheet is None:
+            raise gspread.exceptions.SpreadsheetNotFound(name)
+        return SimpleNamespace(sheet1=self.worksheet)
+
+    def create(self, name):
+        self.created.append(name)
+        self.worksheet = FakeWorksheet()
+        return SimpleNamespace(sheet1=self.worksheet)
+
+
+def row(n: int) -> dict:
+    return {"timestamp": f"2025-01-0{n}", "entry_title": f"タイトル{n}"}
+
+
+def test_writes_header_once_and_reuses_worksheet():
+    worksheet = FakeWorksheet()
+    client = FakeClient(worksheet)
+    sink = SheetsSink("record", client_factory=lambda _: client)
+
+    sink.append(row(1))
+    sink.append(row(2))
+
+    assert worksheet.rows == [["timestamp", "entry_title"], ["2025-01-01", "タイトル1"], ["2025-01-02", "タイトル2"]]
+    assert worksheet.calls == [("acell", "A1"), ("append_rows", 2), ("append_rows", 1)]
+    assert client.opened == 1
+
+
+def test_hold_buffers_rows_into_one_append():
+    worksheet = FakeWorksheet([["timestamp", "entry_title"]])
+    sink = SheetsSink("record", client_factory=lambda _: FakeClient(worksheet))
+    sink.hold = True
+
+    for n in range(1, 6):
+        sink.append(row(n))
+    assert worksheet.calls == []
+
+    assert sink.flush() == 5
+    assert sink.flush() == 0
+    assert worksheet.calls == [("acell", "A1"), ("append_rows", 5)]
+    assert len(worksheet.rows) == 6
+
+
+def test_creates_missing_spreadsheet_and_keeps_rows_on_failure():
+    client = FakeClient(None)
+    sink = SheetsSink("record", client_factory=lambda _: client)
+
+    sink.append(row(1))
+    assert client.created == ["record"]
+    assert client.worksheet.rows[0] == ["timestamp", "entry_title"]
+
+    def fail(values):
+        raise RuntimeError("quota")
+
+    client.worksheet.append_rows = fail
+    sink.hold = True
+    sink.append(row(2))
+    with pytest.raises(RuntimeError):
+        sink.flush()
+    assert sink._rows == [row(2)]  # 次回のflushで再試行
@@ -0,0 +1,50 @@
+import asyncio
+import time
+
+import pytest
+
+from cha2hatena.side_effects import Step, fan_out, format_report, run_in_thread
+
+
+@pytest.mark.asyncio
+async def test_fan_out_runs_concurrently_and_reports():
+    async def slow_blocking():
+        return await run_in_thread(time.sleep, 0.2)
+
+    async def fail():
+        raise RuntimeError("通知に失敗")
+
+    steps = [
+        Step("a", slow_blocking, timeout=1),
+        Step("b", slow_blocking, timeout=1),
+        Step("timeout", slow_blocking, timeout=0.05),
+        Step("error", fail),
+    ]
+    start = time.monotonic()
+    await fan_out(steps)
+
+    assert time.monotonic() - start < 0.35  # 直列なら0.4秒以上
+    assert [s.status for s in steps] == ["ok", "ok", "timeout", "error"]
+    assert "通知に失敗" in format_report(steps)
+
+
+@pytest.mark.asyncio
+async def test_optional_steps_do_not_delay_exit():
+    async def fx():
+        await asyncio.sleep(0.01)
+        return 150.0
+
+    fx_step = Step("fx", fx, required=False)
+
+    async def record():
+        return await fx_step.task * 2
+
+    record_step = Step("record", record)
+    sheets = Step("sheets", lambda: run_in_thread(time.sleep, 5), required=False)
+
+    start = time.monotonic()
+    await fan_out([fx_step, record_step, sheets])
+
+    assert time.monotonic() - start < 1
+    assert record_step.value == 300.0
+    assert sheets.status == "abandoned"
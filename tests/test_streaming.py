@@ -0,0 +1,134 @@
+import json
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from cha2hatena.llm import deepseek_client
+from cha2hatena.llm.conversational_ai import LlmConfig
+from cha2hatena.llm.deepseek_client import DeepseekClient
+from cha2hatena.llm.llm_stats import TokenStats
+from cha2hatena.llm.partial_json import PartialJsonParser
+
+POST = {
+    "title": 'タイトル "引用" \\ 😀',
+    "content": "本文\n- 箇条書き\tタブ あ 🐍/",
+    "categories": ["学習", "Python", "😀絵文字"],
+}
+
+
+@pytest.mark.parametrize("ensure_ascii", [True, False])
+@pytest.mark.parametrize("seed", range(20))
+def test_partial_json_prefixes(ensure_ascii, seed):
+    text = json.dumps(POST, ensure_ascii=ensure_ascii)
+    rng = random.Random(seed)
+    parser = PartialJsonParser()
+    partials = []
+    i = 0
+    while i < len(text):
+        size = rng.randint(1, 8)
+        if (partial := parser.feed(text[i : i + size])) is not None:
+            partials.append(partial)
+        i += size
+
+    assert partials[-1] == POST
+    for partial in partials:
+        for key in ("title", "content"):
+            assert POST[key].startswith(partial.get(key, ""))
+        categories = partial.get("categories", [])
+        assert len(categories) <= len(POST["categories"])
+        assert all(final.startswith(category) for category, final in zip(categories, POST["categories"]))
+
+
+def test_partial_json_parses_only_when_a_value_completes(monkeypatch):
+    post = POST | {"content": "長い本文\n" * 5_000}
+    text = json.dumps(post, ensure_ascii=False)
+    calls = []
+    loads = json.loads
+    monkeypatch.setattr(json, "loads", lambda s: calls.append(len(s)) or loads(s))
+
+    parser = PartialJsonParser()
+    partials = [partial for ch in text if (partial := parser.feed(ch)) is not None]
+
+    assert partials[-1] == post
+    assert len(partials) > len(post["content"])  # 本文は1文字ごとに途中までの内容を返す
+    assert len(calls) < 20  # 読み直すのは値の区切りに達したときだけ
+
+
+@pytest.mark.asyncio
+async def test_stream_summary_yields_partials_then_validated_result(monkeypatch):
+    text = json.dumps(POST, ensure_ascii=False)
+
+    async def fake_stream_deltas(self):
+        for i in range(0, len(text), 5):
+            yield text[i : i + 5]
+        self.stream_stats = TokenStats(10, 0, 20, len(self.prompt), len(text), self.model)
+
+    monkeypatch.setattr(DeepseekClient, "stream_deltas", fake_stream_deltas)
+    client = DeepseekClient(LlmConfig(prompt="p", model="deepseek-chat", api_key="key", conversation="c"))
+
+    events = [event async for event in client.stream_summary()]
+
+    assert {event for event, _ in events[:-1]} == {"partial"}
+    assert events[0][1] == {} or POST["title"].startswith(events[0][1].get("title", ""))
+    event, (data, stats) = events[-1]
+    assert event == "done"
+    assert data == POST
+    assert stats.output_tokens == 20
+
+
+@pytest.mark.asyncio
+async def test_stream_deltas_without_usage_estimates_tokens(monkeypatch, caplog):
+    text = json.dumps(POST, ensure_ascii=False)
+
+    async def fake_stream():
+        for i in range(0, len(text), 5):
+            delta = SimpleNamespace(content=text[i : i + 5])
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)], usage=None)
+
+    async def create(**kwargs):
+        return fake_stream()
+
+    fake_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    monkeypatch.setattr(deepseek_client.registry, "openai", lambda api_key, base_url: fake_client)
+    client = DeepseekClient(LlmConfig(prompt="p", model="deepseek-chat", api_key="key", conversation="c"))
+
+    events = [event async for event in client.stream_summary()]
+
+    event, (data, stats) = events[-1]
+    assert event == "done"
+    assert data == POST
+    assert stats.output_letter_count == len(text)
+    assert stats.output_tokens > 0 and stats.input_tokens > 0
+    assert "使用量が含まれていませんでした" in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_schema_statement_is_not_added_to_prompt_repeatedly(monkeypatch):
+    text = json.dumps(POST, ensure_ascii=False)
+    sent = []
+
+    async def fake_stream():
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))], usage=None)
+
+    async def create(**kwargs):
+        sent.append(kwargs["messages"][0]["content"])
+        if kwargs["stream"]:
+            return fake_stream()
+        usage = SimpleNamespace(prompt_tokens=10, completion_tokens=20, completion_tokens_details=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))], usage=usage)
+
+    fake_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    monkeypatch.setattr(deepseek_client.registry, "openai", lambda api_key, base_url: fake_client)
+    client = DeepseekClient(LlmConfig(prompt="p", model="deepseek-chat", api_key="key", conversation="c"))
+    prompt = client.prompt
+
+    for _ in range(2):
+        data, stats = await client.get_summary()
+        assert data == POST
+        assert stats.input_letter_count == len(sent[-1])
+        [event async for event in client.stream_summary()]
+
+    assert client.prompt == prompt
+    assert len(set(sent)) == 1
+    assert sent[0].endswith(prompt) and sent[0].count("Pydanticモデル") == 1
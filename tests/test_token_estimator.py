@@ -0,0 +1,70 @@
+import csv
+
+import pytest
+
+from cha2hatena.llm.token_estimator import (
+    DEFAULT_RATIOS,
+    TYPICAL_ASCII_SHARE,
+    TokenEstimator,
+    char_counts,
+)
+
+
+def write_record(path, rows):
+    with path.open("w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.DictWriter(f, fieldnames=["model", "input_letter_count", "input_tokens"])
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def test_char_counts():
+    assert char_counts("abc") == (3, 0)
+    assert char_counts("abあい") == (2, 2)
+    assert char_counts("") == (0, 0)
+
+
+def test_fallback_ratio_without_history(tmp_path):
+    estimator = TokenEstimator.calibrated("deepseek-chat", tmp_path / "missing.csv")
+    assert estimator.scale == 1.0
+    assert (estimator.ascii_ratio, estimator.other_ratio) == DEFAULT_RATIOS["deepseek"]
+    assert estimator.count("a" * 100 + "あ" * 100) == int(100 * 0.3 + 100 * 0.7) + 1
+
+    write_record(
+        tmp_path / "record.csv", [{"model": "gemini-2.5-flash", "input_letter_count": 100, "input_tokens": 50}]
+    )
+    assert (
+        TokenEstimator.calibrated("deepseek-chat", tmp_path / "record.csv").scale == 1.0
+    )  # 別のモデルの実績は使わない
+
+
+def test_calibration_uses_median_ratio_of_the_model(tmp_path):
+    path = tmp_path / "record.csv"
+    write_record(
+        path,
+        [
+            {"model": "deepseek-chat", "input_letter_count": 1000, "input_tokens": 500},
+            {"model": "deepseek-chat", "input_letter_count": 1000, "input_tokens": 600},
+            {"model": "deepseek-chat", "input_letter_count": 1000, "input_tokens": 5000},  # 外れ値
+            {"model": "deepseek-chat", "input_letter_count": 0, "input_tokens": 10},  # 文字数なしは無視
+            {"model": "deepseek-chat", "input_letter_count": "", "input_tokens": "x"},  # 壊れた行は無視
+            {"model": "gemini-2.5-pro", "input_letter_count": 1000, "input_tokens": 100},
+        ],
+    )
+
+    estimator = TokenEstimator.calibrated("deepseek-chat", path)
+
+    ascii_ratio, other_ratio = DEFAULT_RATIOS["deepseek"]
+    typical = ascii_ratio * TYPICAL_ASCII_SHARE + other_ratio * (1 - TYPICAL_ASCII_SHARE)
+    assert estimator.scale == pytest.approx(0.6 / typical)
+    assert estimator.ascii_ratio == pytest.approx(ascii_ratio * estimator.scale)
+
+
+def test_tier_limit_and_fee_at_the_boundary():
+    pro = TokenEstimator("gemini-2.5-pro")
+    assert pro.tier_limit() == 200_000
+    assert TokenEstimator("gemini-2.5-flash").tier_limit() is None
+
+    at_limit = pro.estimate_fee(200_000, 1_000)
+    over_limit = pro.estimate_fee(200_001, 1_000)
+    assert at_limit == pytest.approx((200_000 * 1.25 + 1_000 * 10.0) / 1e6)
+    assert over_limit == pytest.approx((200_001 * 2.5 + 1_000 * 15.0) / 1e6)